@@ -23,7 +23,8 @@ except locale.Error:
         pass  # Use default locale if others fail
 
 from django.db.models import Sum
-from transactions.models import Transaction, Category
+from transactions.models import SpendingFact
+from transactions.services.facts_service import MINOR_UNITS
 
 
 def format_number(value):
@@ -60,29 +61,22 @@ def calculate_category_averages(start_date, end_date, months_count=3):
     Returns:
         List of tuples with category name and average monthly spending
     """
-    # Filter transactions by date range
-    transactions = Transaction.objects.filter(
+    # Sum expenses per category from the fact table. is_expense excludes
+    # internal transfers only; wage and tax transfers stay included.
+    category_spending = SpendingFact.objects.filter(
         date__gte=start_date,
         date__lt=end_date,
-        # Exclude internal transfers as they don't represent actual spending
-        is_internal_transfer=False,
-        # Only include negative amounts (expenses)
-        amount__lt=0
-        # Keep wage and tax transfers included
-    ).exclude(
-        category=None  # Exclude transactions without a category
-    )
-    
-    # Group transactions by category and sum amounts
-    category_spending = transactions.values('category__name').annotate(
-        total=Sum('amount')
-    )
+        is_expense=True,
+        category__isnull=False
+    ).values('category__name').annotate(
+        total=Sum('amount_minor')
+    ).order_by()
     
     # Calculate monthly averages and sort by absolute amount (highest first)
     category_averages = []
     for item in category_spending:
         category_name = item['category__name']
-        total_amount = item['total']
+        total_amount = Decimal(item['total']) / MINOR_UNITS
         monthly_average = abs(total_amount) / months_count
         category_averages.append((category_name, total_amount, monthly_average))
     
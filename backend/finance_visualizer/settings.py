@@ -59,6 +59,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'transactions.middleware.PerformanceMiddleware',
+    'transactions.middleware.RequestGenerationsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -99,6 +101,18 @@ DATABASES = {
     }
 }
 
+# Applied to every new SQLite connection (see transactions.signals).
+# WAL lets dashboard reads run while an import is writing, and busy_timeout
+# makes a second writer wait for the lock instead of failing immediately.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': env.int('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024),
+    'cache_size': env.int('SQLITE_CACHE_SIZE', default=-64 * 1024),  # Negative values are KiB
+    'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT', default=20000),  # Milliseconds
+    'temp_store': 'MEMORY',
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -180,6 +194,7 @@ CORS_ALLOW_HEADERS = [
     'authorization',
     'content-type',
     'dnt',
+    'if-none-match',
     'origin',
     'user-agent',
     'x-csrftoken',
@@ -187,7 +202,8 @@ CORS_ALLOW_HEADERS = [
 ]
 CORS_EXPOSE_HEADERS = [
     'content-length', 
-    'content-type'
+    'content-type',
+    'etag'
 ]
 
 # REST Framework settings
@@ -247,8 +263,17 @@ if not os.path.exists(LOGS_DIR):
     os.makedirs(LOGS_DIR)
 
 # Cache configuration
-CACHES = {
-    'default': {
+# The default cache is a bounded in-process LRU in front of a shared backend.
+# The shared backend is Redis when REDIS_URL is set in the environment,
+# otherwise a file-based cache shared by all processes on this host.
+if os.environ.get('REDIS_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': env('REDIS_URL'),
+        'TIMEOUT': 86400,  # 24 hours
+    }
+else:
+    SHARED_CACHE = {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': '/var/tmp/django_cache',
         'TIMEOUT': 86400,  # 24 hours
@@ -256,8 +281,36 @@ CACHES = {
             'MAX_ENTRIES': 10000
         }
     }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'transactions.utils.cache_backends.TieredCache',
+        'TIMEOUT': 86400,  # 24 hours
+        'OPTIONS': {
+            'SHARED_ALIAS': 'shared',
+            'LOCAL_MAX_BYTES': env.int('LOCAL_CACHE_MAX_BYTES', default=64 * 1024 * 1024),
+            'LOCAL_TIMEOUT': env.int('LOCAL_CACHE_TIMEOUT', default=300),
+        }
+    },
+    'shared': SHARED_CACHE,
 }
 
+# Answer dashboard aggregations from an in-memory NumPy snapshot of the
+# transactions (see transactions.services.snapshot_service). numpy is in
+# requirements.txt; without it callers fall back to the database.
+TRANSACTION_SNAPSHOT_ENABLED = env.bool('TRANSACTION_SNAPSHOT_ENABLED', default=True)
+
+# Run the independent summary aggregates on separate connections in a
+# thread pool when they are answered from the database.
+SUMMARY_CONCURRENT_QUERIES = env.bool('SUMMARY_CONCURRENT_QUERIES', default=True)
+
+# Per-request SQL, cache and serializer metrics, sent as a Server-Timing
+# header and aggregated per endpoint at /api/v1/_perf/
+PERF_INSTRUMENTATION_ENABLED = env.bool('PERF_INSTRUMENTATION_ENABLED', default=True)
+# Requests slower than this are logged with their slowest queries
+PERF_SLOW_REQUEST_MS = env.int('PERF_SLOW_REQUEST_MS', default=500)
+PERF_TOP_QUERIES = 5
+
 # Cache key prefix to avoid collisions
 CACHE_KEY_PREFIX = 'finance_visualizer'
 
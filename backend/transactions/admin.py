@@ -1,14 +1,26 @@
 """
 Admin interface for the transactions app.
 """
+from decimal import Decimal
+
 from django.contrib import admin
+from django.contrib.admin.options import IS_POPUP_VAR, TO_FIELD_VAR
+from django.contrib.admin.utils import lookup_spawns_duplicates, prepare_lookup_value
+from django.contrib.admin.views.main import ALL_VAR, ERROR_FLAG, ORDER_VAR, PAGE_VAR, SEARCH_VAR
+from django.contrib.admin.exceptions import DisallowedModelAdminLookup
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import JsonResponse
+from django.urls import path, reverse
 from django.utils.html import format_html
-from django.db.models import Sum
+from django.db.models import Sum, Count, Avg, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from .models import (
     Transaction, Category, BankStatement, BankAccount, 
     Supplier, Account, LedgerPosting, CategorySupplierMap, 
     TransactionAccount, CloseGroup, CloseGroupPosting
 )
+from .utils.pagination import CachedCountPaginator
+from .utils.search import fts_available
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -17,8 +29,13 @@ class CategoryAdmin(admin.ModelAdmin):
     ordering = ('name',)
     
     def transaction_count(self, obj):
-        return obj.transactions.count()
+        return obj._transaction_count
     transaction_count.short_description = 'Transactions'
+    transaction_count.admin_order_field = '_transaction_count'
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.annotate(_transaction_count=Count('transactions'))
 
 @admin.register(BankAccount)
 class BankAccountAdmin(admin.ModelAdmin):
@@ -28,8 +45,13 @@ class BankAccountAdmin(admin.ModelAdmin):
     ordering = ('name',)
     
     def transaction_count(self, obj):
-        return obj.transactions.count()
+        return obj._transaction_count
     transaction_count.short_description = 'Transactions'
+    transaction_count.admin_order_field = '_transaction_count'
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.annotate(_transaction_count=Count('transactions'))
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
@@ -39,8 +61,13 @@ class SupplierAdmin(admin.ModelAdmin):
     ordering = ('name',)
     
     def transaction_count(self, obj):
-        return obj.transactions.count()
+        return obj._transaction_count
     transaction_count.short_description = 'Transactions'
+    transaction_count.admin_order_field = '_transaction_count'
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.annotate(_transaction_count=Count('transactions'))
 
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
@@ -50,8 +77,13 @@ class AccountAdmin(admin.ModelAdmin):
     ordering = ('account_number', 'name')
     
     def transaction_count(self, obj):
-        return obj.transactions.count()
+        return obj._transaction_count
     transaction_count.short_description = 'Transactions'
+    transaction_count.admin_order_field = '_transaction_count'
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.annotate(_transaction_count=Count('transactions'))
 
 class TransactionAccountInline(admin.TabularInline):
     model = TransactionAccount
@@ -82,8 +114,111 @@ class BankStatementAdmin(admin.ModelAdmin):
         return format_html('<span style="color: {};">{}</span>', color, f'{obj.amount:.2f}')
     formatted_amount.short_description = 'Amount'
 
+# Changelist query string parameters that are not field lookups
+SUMMARY_IGNORED_PARAMS = (
+    ALL_VAR, ORDER_VAR, PAGE_VAR, SEARCH_VAR, IS_POPUP_VAR, TO_FIELD_VAR, ERROR_FLAG, '_changelist_filters',
+)
+
+class ChangelistSummaryMixin:
+    """
+    Adds a total/count/average summary of the filtered rows to a changelist.
+    
+    The summary is one aggregate query. With lazy_summary the changelist
+    skips it and the template fetches it from the summary/ endpoint after
+    the page has rendered. Large counts are cached by CachedCountPaginator,
+    and the unfiltered total count is not computed.
+    """
+    summary_field = 'amount'
+    lazy_summary = False
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    
+    def get_summary_data(self, queryset):
+        """
+        Compute the summary of a changelist queryset in one query.
+        """
+        # The ordering and display annotations don't affect the totals
+        queryset = queryset.order_by().values(self.summary_field)
+        summary = queryset.aggregate(
+            total_amount=Sum(self.summary_field),
+            count=Count('*'),
+            average=Avg(self.summary_field)
+        )
+        return {
+            'total_amount': summary['total_amount'] or 0,
+            'count': summary['count'],
+            'average': summary['average'] or 0
+        }
+    
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('summary/', self.admin_site.admin_view(self.summary_view), name='%s_%s_summary' % info),
+        ] + super().get_urls()
+    
+    def get_summary_queryset(self, request):
+        """
+        Filter the changelist queryset by the query string, without a ChangeList.
+        
+        Building a ChangeList would also load the choices of every list
+        filter and count the rows for the paginator; the aggregate already
+        returns the count. The list filters here are all field filters, whose
+        parameters are plain lookups.
+        """
+        lookups = {}
+        may_have_duplicates = False
+        for key, value in request.GET.items():
+            if key in SUMMARY_IGNORED_PARAMS:
+                continue
+            if not self.lookup_allowed(key, value):
+                raise DisallowedModelAdminLookup(f"Filtering by {key} not allowed")
+            lookups[key] = prepare_lookup_value(key, value)
+            may_have_duplicates |= lookup_spawns_duplicates(self.model._meta, key)
+        queryset = self.get_queryset(request).filter(**lookups)
+        
+        queryset, search_may_have_duplicates = self.get_search_results(
+            request, queryset, request.GET.get(SEARCH_VAR, '')
+        )
+        if may_have_duplicates or search_may_have_duplicates:
+            queryset = self.get_queryset(request).filter(pk__in=queryset.order_by().values('pk'))
+        return queryset
+    
+    def summary_view(self, request):
+        """
+        Return the changelist summary for the filters in the query string as JSON.
+        """
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        try:
+            queryset = self.get_summary_queryset(request)
+        except (ValidationError, ValueError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        summary = self.get_summary_data(queryset)
+        return JsonResponse({key: float(value) if isinstance(value, Decimal) else value for key, value in summary.items()})
+    
+    def changelist_view(self, request, extra_context=None):
+        """
+        Add summary data to changelist view
+        """
+        response = super().changelist_view(request, extra_context)
+        
+        # Only execute if we're showing the changelist view
+        if hasattr(response, 'context_data') and 'cl' in response.context_data:
+            if self.lazy_summary:
+                info = self.model._meta.app_label, self.model._meta.model_name
+                response.context_data['summary_url'] = reverse(
+                    'admin:%s_%s_summary' % info, current_app=self.admin_site.name
+                )
+            else:
+                response.context_data['summary_data'] = self.get_summary_data(
+                    response.context_data['cl'].queryset
+                )
+        
+        return response
+
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ChangelistSummaryMixin, admin.ModelAdmin):
+    lazy_summary = True
     list_display = ('formatted_date', 'description', 'formatted_amount', 'category', 'bank_account', 'supplier', 'ledger_account', 'related_account_count', 'is_internal_transfer')
     list_filter = ('date', 'category', 'bank_account', 'supplier', 'ledger_account', 'is_internal_transfer', 'is_wage_transfer', 'is_tax_transfer', 'is_forbidden', 'should_process')
     search_fields = ('description', 'tripletex_id', 'legacy_bank_account_id', 'account_id')
@@ -127,38 +262,40 @@ class TransactionAdmin(admin.ModelAdmin):
     formatted_amount.short_description = 'Amount'
     
     def related_account_count(self, obj):
-        return obj.transaction_accounts.count()
+        return obj._related_account_count
     related_account_count.short_description = 'Related Accounts'
+    related_account_count.admin_order_field = '_related_account_count'
+    
+    # Identifier search fields, matched exactly next to the full-text index
+    exact_search_fields = ('tripletex_id', 'legacy_bank_account_id', 'account_id')
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of LIKE scans over every search
+        # field. The index doesn't cover the legacy ids, so those (and pasted
+        # Tripletex ids) are looked up exactly through their own indexes.
+        search_term = search_term.strip()
+        if search_term and fts_available(queryset.db):
+            matches = Q(id__in=Transaction.objects.search(search_term).values('id'))
+            for field in self.exact_search_fields:
+                matches |= Q(**{field: search_term})
+            return queryset.filter(matches), False
+        return super().get_search_results(request, queryset, search_term)
     
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.select_related('category', 'bank_account', 'supplier', 'ledger_account')
+        queryset = queryset.select_related('category', 'bank_account', 'supplier', 'ledger_account')
+        # A correlated subquery avoids grouping the changelist by every selected column
+        related_account_counts = TransactionAccount.objects.filter(
+            transaction=OuterRef('pk')
+        ).order_by().values('transaction').annotate(count=Count('id')).values('count')
+        queryset = queryset.annotate(
+            _related_account_count=Coalesce(Subquery(related_account_counts), Value(0))
+        )
+        if request.resolver_match and request.resolver_match.url_name == 'transactions_transaction_changelist':
+            # The changelist never displays raw_data
+            queryset = queryset.defer('raw_data')
+        return queryset
     
-    def changelist_view(self, request, extra_context=None):
-        """
-        Add summary data to changelist view
-        """
-        response = super().changelist_view(request, extra_context)
-        
-        # Only execute if we're showing the changelist view
-        if hasattr(response, 'context_data'):
-            # Get queryset from response
-            queryset = response.context_data['cl'].queryset
-            
-            # Calculate totals
-            total_amount = queryset.aggregate(total=Sum('amount'))['total'] or 0
-            count = queryset.count()
-            
-            # Add extra context
-            response.context_data.update({
-                'summary_data': {
-                    'total_amount': total_amount,
-                    'count': count,
-                    'average': total_amount / count if count > 0 else 0
-                }
-            })
-        
-        return response
 
 @admin.register(TransactionAccount)
 class TransactionAccountAdmin(admin.ModelAdmin):
@@ -214,7 +351,7 @@ class TransactionAccountAdmin(admin.ModelAdmin):
         return queryset.select_related('transaction', 'account')
 
 @admin.register(LedgerPosting)
-class LedgerPostingAdmin(admin.ModelAdmin):
+class LedgerPostingAdmin(ChangelistSummaryMixin, admin.ModelAdmin):
     list_display = ('posting_id', 'formatted_date', 'description', 'formatted_amount', 'supplier', 'account', 'closeGroup', 'account_close_group', 'voucher_number', 'voucher_type')
     list_filter = ('date', 'supplier', 'account', 'voucher_type', 'account__closeGroup', 'closeGroup')
     search_fields = ('posting_id', 'description', 'voucher_number', 'account__closeGroup', 'closeGroup')
@@ -261,33 +398,12 @@ class LedgerPostingAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.select_related('supplier', 'account')
+        queryset = queryset.select_related('supplier', 'account')
+        if request.resolver_match and request.resolver_match.url_name == 'transactions_ledgerposting_changelist':
+            # The changelist never displays raw_data
+            queryset = queryset.defer('raw_data')
+        return queryset
     
-    def changelist_view(self, request, extra_context=None):
-        """
-        Add summary data to changelist view
-        """
-        response = super().changelist_view(request, extra_context)
-        
-        # Only execute if we're showing the changelist view
-        if hasattr(response, 'context_data'):
-            # Get queryset from response
-            queryset = response.context_data['cl'].queryset
-            
-            # Calculate totals
-            total_amount = queryset.aggregate(total=Sum('amount'))['total'] or 0
-            count = queryset.count()
-            
-            # Add extra context
-            response.context_data.update({
-                'summary_data': {
-                    'total_amount': total_amount,
-                    'count': count,
-                    'average': total_amount / count if count > 0 else 0
-                }
-            })
-        
-        return response
 
 @admin.register(CategorySupplierMap)
 class CategorySupplierMapAdmin(admin.ModelAdmin):
@@ -0,0 +1,127 @@
+"""
+Streaming file exports of transactions.
+
+Exports read values_list() tuples through a server-side iterator and write
+them straight to the response, so memory use does not grow with the number
+of rows and the download starts before the query has finished.
+"""
+import csv
+import io
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from ..utils.xlsx import STYLE_AMOUNT, STYLE_DEFAULT, stream_xlsx
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Header -> column, in export order
+EXPORT_COLUMNS = (
+    ('ID', 'id'),
+    ('Date', 'date'),
+    ('Description', 'description'),
+    ('Amount', 'amount'),
+    ('Category', 'category__name'),
+    ('Supplier', 'supplier__name'),
+    ('Bank account', 'bank_account__name'),
+    ('Ledger account', 'ledger_account__account_number'),
+    ('Ledger account name', 'ledger_account__name'),
+    ('Internal transfer', 'is_internal_transfer'),
+    ('Wage transfer', 'is_wage_transfer'),
+    ('Tax transfer', 'is_tax_transfer'),
+    ('Should process', 'should_process'),
+    ('Tripletex ID', 'tripletex_id'),
+)
+EXPORT_HEADERS = [header for header, _ in EXPORT_COLUMNS]
+
+# Leading characters that make a spreadsheet evaluate a text cell
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def neutralize_formula(value):
+    """
+    Quote text that a spreadsheet would read as a formula (CSV injection).
+
+    Descriptions come from the bank, so a cell like '=HYPERLINK(...)' is
+    written as "'=HYPERLINK(...)". Numbers, dates and booleans are kept.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def export_rows(queryset):
+    """
+    Iterate over the export columns of a transaction queryset.
+
+    Text cells go through neutralize_formula, for both file formats.
+
+    Args:
+        queryset (QuerySet): Filtered and ordered transactions
+
+    Returns:
+        iterator: Tuples in EXPORT_COLUMNS order
+    """
+    rows = queryset.prefetch_related(None).values_list(
+        *(column for _, column in EXPORT_COLUMNS)
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    return (tuple(neutralize_formula(value) for value in row) for row in rows)
+
+
+def stream_csv(rows):
+    """
+    Generate a CSV file as a stream of byte chunks.
+
+    The file starts with a UTF-8 byte order mark so Excel detects the
+    encoding of non-ASCII descriptions.
+
+    Yields:
+        bytes: Consecutive parts of the file, one per EXPORT_CHUNK_SIZE rows
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_HEADERS)
+    # Send the header right away so the download starts before any row is read
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    written = 0
+    for row in rows:
+        writer.writerow(row)
+        written += 1
+        if written % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def export_response(queryset, file_format):
+    """
+    Build a streaming download of a transaction queryset.
+
+    Args:
+        queryset (QuerySet): Filtered and ordered transactions
+        file_format (str): 'csv' or 'xlsx'
+
+    Returns:
+        StreamingHttpResponse: The file as an attachment
+    """
+    rows = export_rows(queryset)
+    if file_format == 'xlsx':
+        styles = [STYLE_AMOUNT if column == 'amount' else STYLE_DEFAULT for _, column in EXPORT_COLUMNS]
+        content = stream_xlsx(EXPORT_HEADERS, rows, styles=styles, sheet_name='Transactions')
+    else:
+        content = stream_csv(rows)
+
+    filename = f"transactions-{timezone.localdate().isoformat()}.{file_format}"
+    response = StreamingHttpResponse(content, content_type=EXPORT_CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
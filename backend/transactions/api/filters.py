@@ -0,0 +1,26 @@
+"""
+Filter backends for the transactions API.
+"""
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from ..utils.search import fts_available
+
+
+class TransactionSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter backed by the transaction full-text index.
+
+    Every search word is matched as a prefix against the description, the
+    grouped-posting descriptions and the Tripletex id. Results are ordered
+    by relevance unless the client asks for an explicit ordering. Without
+    the index this behaves like the regular SearchFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms or not fts_available(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+
+        ordering_requested = bool(request.query_params.get(api_settings.ORDERING_PARAM))
+        return queryset.search(' '.join(search_terms), rank=not ordering_requested)
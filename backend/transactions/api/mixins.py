@@ -0,0 +1,83 @@
+"""
+View mixins for the transactions API.
+"""
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from ..utils.cache import versioned_etag
+
+
+class NotModified(Exception):
+    """
+    Raised when the client's cached copy is still current.
+    """
+
+    def __init__(self, etag):
+        super().__init__(etag)
+        self.etag = etag
+
+
+class ConditionalGetMixin:
+    """
+    Answer conditional GETs from cache generation counters.
+
+    Views declare the models each action reads in `etag_models`. The ETag
+    is computed from their generations, the request path and the query
+    string, so a matching If-None-Match returns 304 Not Modified before the
+    handler runs any query or serializer.
+
+    Usage:
+        class CategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
+            etag_models = {'list': (Category, Transaction)}
+    """
+    etag_models = {}
+
+    def get_etag_models(self):
+        """
+        Get the models the current action depends on, or None to skip ETags.
+        """
+        return self.etag_models.get(getattr(self, 'action', None))
+
+    def get_etag(self, request):
+        """
+        Compute the ETag for the current request.
+
+        Returns:
+            str: Quoted ETag, or None if the action does not support ETags
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        models = self.get_etag_models()
+        if not models:
+            return None
+        return versioned_etag(f'etag:{request.path}', models, request.query_params)
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication and permissions run first, so a 304 never leaks anything
+        super().initial(request, *args, **kwargs)
+        self.etag = self.get_etag(request)
+        if self.etag is None:
+            return
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            # If-None-Match uses weak comparison
+            client_etags = {etag.removeprefix('W/') for etag in parse_etags(if_none_match)}
+            if '*' in client_etags or self.etag in client_etags:
+                raise NotModified(self.etag)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': exc.etag})
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, 'etag', None)
+        if etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            # Let browsers keep the response but revalidate it on every use
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,54 @@
+"""
+Renderers for the transactions API.
+"""
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+_drf_encoder = encoders.JSONEncoder()
+
+
+def _default(obj):
+    # Fall back to DRF's encoder for everything orjson does not handle
+    # natively, so Decimals, datetimes and lazy strings render identically.
+    return _drf_encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON renderer backed by orjson.
+
+    Produces the same JSON as DRF's JSONRenderer for compact output and
+    falls back to it when orjson is not installed or indentation is requested.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+        )
+        # Match JSONRenderer: escape U+2028/U+2029 so the output is valid JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ExportRenderer(FastJSONRenderer):
+    """
+    Accepts any media type for streaming file downloads.
+
+    The download itself bypasses rendering; this renderer only lets content
+    negotiation succeed for clients asking for text/csv and friends, and
+    renders error responses as JSON.
+    """
+    media_type = '*/*'
+    format = 'export'
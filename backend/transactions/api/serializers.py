@@ -3,8 +3,19 @@ Serializers for the transactions API.
 """
 from rest_framework import serializers
 from ..models import Transaction, Category, BankStatement, BankAccount, Supplier
+from ..utils.perf import span
 
-class CategorySerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """
+    Serializer mixin that adds representation time to the request's
+    'serialize' span (see utils.perf).
+    """
+    
+    def to_representation(self, instance):
+        with span('serialize'):
+            return super().to_representation(instance)
+
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Category model.
     """
@@ -16,9 +27,13 @@ class CategorySerializer(serializers.ModelSerializer):
     
     def get_transaction_count(self, obj):
         """Get the number of transactions associated with this category."""
-        return obj.transactions.count()
+        # List querysets annotate the count; fall back for single objects
+        count = getattr(obj, 'transaction_count', None)
+        if count is None:
+            count = obj.transactions.count()
+        return count
 
-class BankAccountSerializer(serializers.ModelSerializer):
+class BankAccountSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the BankAccount model.
     """
@@ -31,9 +46,13 @@ class BankAccountSerializer(serializers.ModelSerializer):
     
     def get_transaction_count(self, obj):
         """Get the number of transactions associated with this bank account."""
-        return obj.transactions.count()
+        # List querysets annotate the count; fall back for single objects
+        count = getattr(obj, 'transaction_count', None)
+        if count is None:
+            count = obj.transactions.count()
+        return count
 
-class BankStatementSerializer(serializers.ModelSerializer):
+class BankStatementSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the BankStatement model.
     """
@@ -57,7 +76,38 @@ class BankStatementSerializer(serializers.ModelSerializer):
             return obj.bank_account.name
         return None
 
-class TransactionSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Serializer mixin for sparse fieldsets and optional expansions.
+    
+    Pass `fields` to keep only the named fields and `expand` to add fields
+    listed in Meta.expandable_fields, which are left out by default.
+    Without either argument the serializer renders its default fields.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        
+        expandable = set(getattr(self.Meta, 'expandable_fields', ()))
+        expand = set(expand or ()) & expandable
+        
+        if fields is not None:
+            keep = set(fields) | expand
+        else:
+            keep = (set(self.fields) - expandable) | expand
+        
+        for field_name in list(self.fields):
+            if field_name not in keep:
+                self.fields.pop(field_name)
+    
+    @classmethod
+    def get_available_fields(cls):
+        """Get the names of all fields that can be requested."""
+        return set(cls.Meta.fields) | set(getattr(cls.Meta, 'expandable_fields', ()))
+
+class TransactionSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for the Transaction model.
     """
@@ -65,6 +115,7 @@ class TransactionSerializer(serializers.ModelSerializer):
     bank_account_name = serializers.CharField(source='bank_account.name', read_only=True, allow_null=True)
     supplier_name = serializers.CharField(source='supplier.name', read_only=True, allow_null=True)
     related_accounts = serializers.SerializerMethodField()
+    ledger_account_detail = serializers.SerializerMethodField()
     
     class Meta:
         model = Transaction
@@ -73,7 +124,21 @@ class TransactionSerializer(serializers.ModelSerializer):
                  'is_internal_transfer', 'is_wage_transfer', 'is_tax_transfer',
                  'is_forbidden', 'should_process',
                  'category', 'category_name', 'supplier', 'supplier_name', 
-                 'related_accounts', 'imported_at', 'updated_at']
+                 'related_accounts', 'imported_at', 'updated_at',
+                 'ledger_account_detail']
+        # Only rendered when requested with ?expand=
+        expandable_fields = ['ledger_account_detail']
+    
+    def get_ledger_account_detail(self, obj):
+        """Get the main ledger account of the transaction."""
+        account = obj.ledger_account
+        if account is None:
+            return None
+        return {
+            'id': account.id,
+            'name': account.name,
+            'account_number': account.account_number
+        }
     
     def get_related_accounts(self, obj):
         """Get the related accounts through the M2M relationship."""
@@ -112,7 +177,28 @@ class TransactionCategoryUpdateSerializer(serializers.Serializer):
                 raise serializers.ValidationError("Category does not exist")
         return value
 
-class TransactionSummarySerializer(serializers.Serializer):
+class CategoryAssignmentSerializer(serializers.Serializer):
+    """
+    One category assignment: a transaction or a supplier, and a category.
+    """
+    transaction_id = serializers.IntegerField(required=False)
+    supplier_id = serializers.IntegerField(required=False)
+    category_id = serializers.IntegerField(allow_null=True)
+    
+    def validate(self, data):
+        """Require exactly one of transaction_id and supplier_id."""
+        if ('transaction_id' in data) == ('supplier_id' in data):
+            raise serializers.ValidationError("Provide exactly one of transaction_id and supplier_id")
+        return data
+
+class BulkCategorizeSerializer(serializers.Serializer):
+    """
+    Serializer for categorizing many transactions and suppliers at once.
+    """
+    assignments = CategoryAssignmentSerializer(many=True, allow_empty=False, max_length=10000)
+    propagate = serializers.BooleanField(default=True)
+
+class TransactionSummarySerializer(TimedSerializerMixin, serializers.Serializer):
     """
     Serializer for transaction summary data.
     """
@@ -122,7 +208,7 @@ class TransactionSummarySerializer(serializers.Serializer):
     bank_accounts = serializers.DictField(child=serializers.DictField())
     related_accounts = serializers.DictField(child=serializers.DictField())
 
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = ['id', 'tripletex_id', 'name', 'organization_number', 'email', 'phone_number', 'address', 'url', 'created_at', 'updated_at'] 
\ No newline at end of file
@@ -2,18 +2,26 @@
 API views for the transactions app.
 """
 import logging
+from datetime import date
+from decimal import Decimal, InvalidOperation
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.core.cache import cache
 from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Count
 
-from ..models import Transaction, Category, BankStatement, BankAccount, Supplier
+from ..models import (
+    Transaction, Category, BankStatement, BankAccount, Supplier,
+    Account, TransactionAccount, CategorySupplierMap
+)
 from .serializers import (
     TransactionSerializer,
     TransactionDetailSerializer,
@@ -22,46 +30,206 @@ from .serializers import (
     BankAccountSerializer,
     TransactionSummarySerializer,
     TransactionCategoryUpdateSerializer,
+    BulkCategorizeSerializer,
     SupplierSerializer
 )
+from .filters import TransactionSearchFilter
+from .mixins import ConditionalGetMixin
+from .exports import export_response
+from .renderers import FastJSONRenderer, ExportRenderer
+from .row_builders import TransactionRowBuilder
 from ..services.transaction_service import (
     get_transaction_summary,
     update_transaction_category,
+    bulk_categorize,
     import_transactions_from_tripletex,
     update_all_internal_transfers,
     get_monthly_budget_data
 )
+from ..services.analytics_service import (
+    get_transaction_timeseries,
+    get_transaction_treemap
+)
+from ..services.similarity_service import (
+    find_similar_transactions,
+    index_transactions
+)
 from ..services.category_service import (
     initialize_default_categories
 )
+from ..utils.cache import versioned_cache_key, bump_generation
+from ..utils import perf
+from ..utils.timing import timed, server_timing_header
+from ..constants import (
+    API_CACHE_TIMEOUT, TIMESERIES_GRANULARITIES, ANALYTICS_GROUP_BY_FIELDS, TIMESERIES_MAX_TOP,
+    TREEMAP_LEVELS, TREEMAP_DEFAULT_TOP, TREEMAP_MAX_TOP
+)
 
 logger = logging.getLogger('transactions')
 
-class TransactionViewSet(viewsets.ModelViewSet):
+# Models whose writes invalidate cached transaction list and summary responses
+TRANSACTION_CACHE_MODELS = (Transaction, Category, BankAccount, Supplier, Account, TransactionAccount)
+
+# Models whose writes invalidate cached budget responses
+BUDGET_CACHE_MODELS = (Transaction, Category)
+
+class TransactionViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing transactions.
     """
     queryset = Transaction.objects.all()  # Base queryset for DRF to determine model
     serializer_class = TransactionSerializer
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     permission_classes = [AllowAny]  # Update this based on your security requirements
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'date', 'is_internal_transfer', 'is_wage_transfer', 'is_tax_transfer', 'should_process']
+    filter_backends = [DjangoFilterBackend, TransactionSearchFilter, filters.OrderingFilter]
+    filterset_fields = ['category', 'bank_account', 'date', 'is_internal_transfer', 'is_wage_transfer', 'is_tax_transfer', 'should_process']
     search_fields = ['description', 'tripletex_id', 'bank_account_id']
     ordering_fields = ['date', 'amount', 'description']
+    etag_models = {
+        'list': TRANSACTION_CACHE_MODELS,
+        'retrieve': TRANSACTION_CACHE_MODELS,
+        'summary': TRANSACTION_CACHE_MODELS,
+        'timeseries': TRANSACTION_CACHE_MODELS,
+        'treemap': TRANSACTION_CACHE_MODELS,
+        'similar': TRANSACTION_CACHE_MODELS,
+        'export': TRANSACTION_CACHE_MODELS,
+    }
 
     def get_queryset(self):
         """
         Get the base queryset for the viewset.
+        
+        Only single-transaction actions load raw_data; lists use the list shape.
         """
-        # Get base queryset with all necessary relations
-        return Transaction.objects.select_related(
-            'category',
-            'bank_account',
-            'supplier',
-            'ledger_account'
-        ).prefetch_related(
-            'transaction_accounts__account'
-        ).order_by('-date')
+        if self.action in ('retrieve', 'detail_with_raw_data', 'update', 'partial_update'):
+            queryset = Transaction.objects.detail_shape()
+            rendered_fields = None
+        else:
+            rendered_fields = self.get_rendered_fields()
+            queryset = Transaction.objects.list_shape(rendered_fields)
+        
+        # Related accounts are the most expensive part of a row; only fetch them when rendered
+        if rendered_fields is None or 'related_accounts' in rendered_fields:
+            queryset = queryset.prefetch_related('transaction_accounts__account')
+        
+        return queryset.order_by('-date')
+    
+    def get_transaction_filters(self):
+        """
+        Get the transaction filters shared by the analytics actions.
+        
+        Returns:
+            dict: Filters in the format accepted by get_all_transactions
+        """
+        params = self.request.query_params
+        filters = {}
+        # Parsed here, so bad input is a 400 rather than an error in the query
+        for name, parse in (
+            ('date_from', self._get_date_param),
+            ('date_to', self._get_date_param),
+            ('category', self._get_int_param),
+            ('bank_account', self._get_int_param),
+            ('amount_min', self._get_decimal_param),
+            ('amount_max', self._get_decimal_param),
+        ):
+            value = parse(name)
+            if value is not None:
+                filters[name] = value
+        if params.get('search'):
+            filters['search'] = params['search']
+        if filters.get('date_from') and filters.get('date_to') and filters['date_from'] > filters['date_to']:
+            raise ValidationError({'date_to': "Must not be before date_from"})
+        
+        for name in ('internal_transfer', 'should_process'):
+            value = params.get(name)
+            if value is not None:
+                filters[name] = value.lower() == 'true'
+        
+        return filters
+    
+    def _get_int_param(self, name, default=None, minimum=1, maximum=None):
+        """
+        Parse an integer query parameter, raising ValidationError when it is out of range.
+        """
+        value = self.request.query_params.get(name)
+        if value is None or value == '':
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValidationError({name: "Must be an integer"})
+        if value < minimum or (maximum is not None and value > maximum):
+            raise ValidationError({name: f"Must be between {minimum} and {maximum}" if maximum else f"Must be at least {minimum}"})
+        return value
+    
+    def _get_date_param(self, name):
+        """
+        Parse a YYYY-MM-DD query parameter, raising ValidationError when it is not a date.
+        """
+        value = self.request.query_params.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({name: "Must be a date in YYYY-MM-DD format"})
+    
+    def _get_decimal_param(self, name):
+        """
+        Parse a decimal query parameter, raising ValidationError when it is not a finite number.
+        """
+        value = self.request.query_params.get(name)
+        if value is None or value == '':
+            return None
+        try:
+            value = Decimal(value)
+        except InvalidOperation:
+            raise ValidationError({name: "Must be a number"})
+        if not value.is_finite():
+            raise ValidationError({name: "Must be a number"})
+        return value
+    
+    def _get_list_param(self, name):
+        """
+        Parse a comma-separated query parameter into a sorted list of names.
+        """
+        value = self.request.query_params.get(name) if self.request else None
+        if value is None:
+            return None
+        return sorted({item.strip() for item in value.split(',') if item.strip()})
+    
+    def get_rendered_fields(self):
+        """
+        Get the serializer fields requested with ?fields= and ?expand=.
+        
+        Returns:
+            list: Field names to render, or None for the default field set
+        """
+        fields = self._get_list_param('fields')
+        expand = self._get_list_param('expand')
+        if fields is None and expand is None:
+            return None
+        
+        serializer_class = self.get_serializer_class()
+        requested = set(fields or ()) | set(expand or ())
+        unknown = requested - serializer_class.get_available_fields()
+        if unknown:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        
+        if fields is None:
+            # Default fields plus the requested expansions
+            expandable = set(serializer_class.Meta.expandable_fields)
+            fields = [field for field in serializer_class.Meta.fields if field not in expandable]
+        return sorted(set(fields) | set(expand or ()))
+    
+    def get_serializer(self, *args, **kwargs):
+        """
+        Pass the requested sparse fieldset and expansions to the serializer.
+        """
+        if self.request is not None and self.action in ('list', 'retrieve'):
+            kwargs.setdefault('fields', self._get_list_param('fields'))
+            kwargs.setdefault('expand', self._get_list_param('expand'))
+        return super().get_serializer(*args, **kwargs)
     
     def get_serializer_class(self):
         """
@@ -84,6 +252,45 @@ class TransactionViewSet(viewsets.ModelViewSet):
         serializer = TransactionDetailSerializer(transaction)
         return Response(serializer.data)
     
+    @swagger_auto_schema(
+        operation_description="Get the transactions with the most similar descriptions",
+        manual_parameters=[
+            openapi.Parameter(
+                'limit',
+                openapi.IN_QUERY,
+                description="Number of similar transactions to return (max 50)",
+                type=openapi.TYPE_INTEGER,
+                default=10
+            )
+        ],
+        responses={200: openapi.Response(description="Similar transactions, most similar first")}
+    )
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Get the nearest neighbours of a transaction by description n-grams.
+        """
+        limit = self._get_int_param('limit', default=10, maximum=50)
+        transaction = self.get_object()
+        if not transaction.ngrams.exists():
+            index_transactions(Transaction.objects.filter(id=transaction.id))
+        
+        neighbours = find_similar_transactions(transaction, limit=limit)
+        similarity = dict(neighbours)
+        
+        builder = TransactionRowBuilder(self.get_rendered_fields())
+        queryset = builder.project(Transaction.objects.list_shape().filter(id__in=similarity))
+        # Projected tuples start with the id
+        tuples = sorted(queryset, key=lambda values: (-similarity[values[0]], values[0]))
+        rows = builder.build(tuples)
+        for values, row in zip(tuples, rows):
+            row['similarity'] = similarity[values[0]]
+        
+        return Response({
+            'transaction_id': transaction.id,
+            'results': rows
+        })
+    
     @swagger_auto_schema(
         operation_description="Get transaction summary statistics",
         responses={200: TransactionSummarySerializer}
@@ -93,31 +300,169 @@ class TransactionViewSet(viewsets.ModelViewSet):
         """
         Get summary statistics for transactions.
         """
-        # Get query parameters for filtering
-        filters = {}
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        category_id = request.query_params.get('category')
-        bank_account_id = request.query_params.get('bank_account')
-        
-        if date_from:
-            filters['date_from'] = date_from
-        
-        if date_to:
-            filters['date_to'] = date_to
-            
-        if category_id:
-            filters['category'] = category_id
-            
-        if bank_account_id:
-            filters['bank_account'] = bank_account_id
-        
-        # Get summary data
-        summary_data = get_transaction_summary(filters)
+        filters = self.get_transaction_filters()
+        timings = {}
+        
+        cache_key = versioned_cache_key('transactions:summary', TRANSACTION_CACHE_MODELS, filters)
+        with timed(timings, 'cache'):
+            cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            return Response(cached_data, headers={'Server-Timing': server_timing_header(timings)})
+        
+        # Get summary data; the aggregates record their own durations
+        with timed(timings, 'summary'):
+            summary_data = get_transaction_summary(filters, timings=timings)
         
         # Serialize and return
         serializer = TransactionSummarySerializer(summary_data)
-        return Response(serializer.data)
+        cache.set(cache_key, serializer.data, timeout=API_CACHE_TIMEOUT)
+        return Response(serializer.data, headers={'Server-Timing': server_timing_header(timings)})
+    
+    @swagger_auto_schema(
+        operation_description="Get zero-filled transaction totals per period",
+        manual_parameters=[
+            openapi.Parameter(
+                'granularity',
+                openapi.IN_QUERY,
+                description="Period length",
+                type=openapi.TYPE_STRING,
+                enum=TIMESERIES_GRANULARITIES,
+                default='month'
+            ),
+            openapi.Parameter(
+                'group_by',
+                openapi.IN_QUERY,
+                description="Split the totals into one series per group",
+                type=openapi.TYPE_STRING,
+                enum=ANALYTICS_GROUP_BY_FIELDS
+            ),
+            openapi.Parameter(
+                'top',
+                openapi.IN_QUERY,
+                description=f"Keep the N largest series and merge the rest into 'Other' (at most {TIMESERIES_MAX_TOP})",
+                type=openapi.TYPE_INTEGER
+            )
+        ],
+        responses={200: openapi.Response(description="Time series retrieved successfully")}
+    )
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """
+        Get transaction totals per day, week, month or quarter.
+        """
+        granularity = request.query_params.get('granularity', 'month')
+        group_by = request.query_params.get('group_by') or None
+        top = self._get_int_param('top', maximum=TIMESERIES_MAX_TOP)
+        
+        if granularity not in TIMESERIES_GRANULARITIES:
+            raise ValidationError({'granularity': f"Must be one of: {', '.join(TIMESERIES_GRANULARITIES)}"})
+        if group_by is not None and group_by not in ANALYTICS_GROUP_BY_FIELDS:
+            raise ValidationError({'group_by': f"Must be one of: {', '.join(ANALYTICS_GROUP_BY_FIELDS)}"})
+        
+        filters = self.get_transaction_filters()
+        cache_key = versioned_cache_key(
+            'transactions:timeseries',
+            TRANSACTION_CACHE_MODELS,
+            dict(filters, granularity=granularity, group_by=group_by, top=top)
+        )
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            return Response(cached_data)
+        
+        try:
+            timeseries_data = get_transaction_timeseries(filters, granularity, group_by, top)
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+        
+        cache.set(cache_key, timeseries_data, timeout=API_CACHE_TIMEOUT)
+        return Response(timeseries_data)
+    
+    @swagger_auto_schema(
+        operation_description="Get nested sums for category, supplier and ledger account",
+        manual_parameters=[
+            openapi.Parameter(
+                'depth',
+                openapi.IN_QUERY,
+                description="Number of levels: 1 = category, 2 = + supplier, 3 = + ledger account",
+                type=openapi.TYPE_INTEGER,
+                default=len(TREEMAP_LEVELS)
+            ),
+            openapi.Parameter(
+                'top',
+                openapi.IN_QUERY,
+                description=f"Children kept per node; the rest are merged into 'Other' (at most {TREEMAP_MAX_TOP})",
+                type=openapi.TYPE_INTEGER,
+                default=TREEMAP_DEFAULT_TOP
+            ),
+            openapi.Parameter(
+                'direction',
+                openapi.IN_QUERY,
+                description="Which amounts to include",
+                type=openapi.TYPE_STRING,
+                enum=['expense', 'income', 'all'],
+                default='expense'
+            ),
+            openapi.Parameter(
+                'include_transfers',
+                openapi.IN_QUERY,
+                description="Include transfers and transactions marked as not to be processed",
+                type=openapi.TYPE_BOOLEAN,
+                default=False
+            )
+        ],
+        responses={200: openapi.Response(description="Treemap retrieved successfully")}
+    )
+    @action(detail=False, methods=['get'])
+    def treemap(self, request):
+        """
+        Get a bounded category -> supplier -> ledger account hierarchy of sums.
+        """
+        depth = self._get_int_param('depth', default=len(TREEMAP_LEVELS), maximum=len(TREEMAP_LEVELS))
+        top = self._get_int_param('top', default=TREEMAP_DEFAULT_TOP, maximum=TREEMAP_MAX_TOP)
+        direction = request.query_params.get('direction', 'expense')
+        include_transfers = request.query_params.get('include_transfers', 'false').lower() == 'true'
+        
+        if direction not in ('expense', 'income', 'all'):
+            raise ValidationError({'direction': "Must be one of: expense, income, all"})
+        
+        filters = self.get_transaction_filters()
+        cache_key = versioned_cache_key(
+            'transactions:treemap',
+            TRANSACTION_CACHE_MODELS,
+            dict(filters, depth=depth, top=top, direction=direction, include_transfers=include_transfers)
+        )
+        cached_data = cache.get(cache_key)
+        if cached_data is not None:
+            return Response(cached_data)
+        
+        treemap_data = get_transaction_treemap(
+            filters,
+            depth=depth,
+            top=top,
+            include_transfers=include_transfers,
+            direction=direction
+        )
+        
+        cache.set(cache_key, treemap_data, timeout=API_CACHE_TIMEOUT)
+        return Response(treemap_data)
+    
+    @swagger_auto_schema(
+        operation_description="Download the filtered transactions as CSV or XLSX. "
+                              "Accepts the same filter, search and ordering parameters as the list.",
+        responses={200: openapi.Response(description="File download")}
+    )
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path=r'export\.(?P<file_format>csv|xlsx)',
+        renderer_classes=[FastJSONRenderer, ExportRenderer]
+    )
+    def export(self, request, file_format='csv'):
+        """
+        Stream the filtered transactions as a file, without pagination.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(queryset, file_format)
     
     @swagger_auto_schema(
         operation_description="Update transaction category",
@@ -152,46 +497,81 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @swagger_auto_schema(
+        operation_description="Assign categories to many transactions and suppliers in one request",
+        request_body=BulkCategorizeSerializer,
+        responses={
+            200: openapi.Response(description="Counts of updated transactions, suppliers and mappings"),
+            400: openapi.Response(description="Invalid request or unknown ids")
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def bulk_categorize(self, request):
+        """
+        Apply many (transaction or supplier, category) assignments at once.
+        """
+        serializer = BulkCategorizeSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            result = bulk_categorize(
+                serializer.validated_data['assignments'],
+                propagate=serializer.validated_data['propagate']
+            )
+        except ValueError as e:
+            raise ValidationError({'detail': str(e)})
+        
+        return Response(result)
+
     def list(self, request, *args, **kwargs):
         """
         Override list method to handle pagination with caching.
-        """
-        # Get the page number from query parameters
-        page = self.request.query_params.get('page', '1')
         
-        # Generate a cache key that includes query parameters to handle filters
-        cache_key = f'transactions_page_{page}'
-        if request.query_params:
-            param_string = "_".join(f"{k}:{v}" for k, v in sorted(request.query_params.items()))
-            cache_key = f'transactions_page_{page}_{param_string}'
+        The cache key embeds the generations of every model the page reads,
+        so any write to those models makes the cached pages unreachable.
+        """
+        # Normalize the field set so equivalent ?fields= orderings share an entry
+        params = request.query_params.copy()
+        for name in ('fields', 'expand'):
+            if name in params:
+                params[name] = ','.join(self._get_list_param(name))
+        cache_key = versioned_cache_key('transactions:list', TRANSACTION_CACHE_MODELS, params)
         
         # Try to get from cache first
         cached_data = cache.get(cache_key)
         if cached_data is not None:
             return Response(cached_data)
         
-        # If not in cache, generate the response
-        response = super().list(request, *args, **kwargs)
+        # If not in cache, build the rows straight from values_list() tuples
+        builder = TransactionRowBuilder(self.get_rendered_fields())
+        queryset = builder.project(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(builder.build(page))
+        else:
+            response = Response(builder.build(queryset))
         
         # Cache the response data
         if response.status_code == 200:
-            cache.set(cache_key, response.data, timeout=3600)  # Cache for 1 hour
-        
-        # Cache invalidation logic for create/update/delete operations
-        if request.method in ['POST', 'PUT', 'PATCH', 'DELETE']:
-            cache.clear()  # Clear all cache since we can't know which pages are affected
+            cache.set(cache_key, response.data, timeout=API_CACHE_TIMEOUT)
         
         return response
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing categories.
     """
-    queryset = Category.objects.all().order_by('name')
+    queryset = Category.objects.annotate(transaction_count=Count('transactions')).order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]  # Update this based on your security requirements
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description']
+    etag_models = {
+        'list': (Category, Transaction),
+        'retrieve': (Category, Transaction),
+        'budget': BUDGET_CACHE_MODELS,
+    }
     
     @swagger_auto_schema(
         operation_description="Initialize default categories",
@@ -242,23 +622,37 @@ class CategoryViewSet(viewsets.ModelViewSet):
         year = request.query_params.get('year')
         month = request.query_params.get('month')
         
+        cache_key = versioned_cache_key(
+            'categories:budget',
+            BUDGET_CACHE_MODELS,
+            {'exclude_salary': exclude_salary, 'year': year, 'month': month}
+        )
+        budget_data = cache.get(cache_key)
+        if budget_data is not None:
+            return Response(budget_data)
+        
         budget_data = get_monthly_budget_data(
             exclude_salary=exclude_salary,
             year=year,
             month=month
         )
         
+        cache.set(cache_key, budget_data, timeout=API_CACHE_TIMEOUT)
         return Response(budget_data)
 
-class BankAccountViewSet(viewsets.ModelViewSet):
+class BankAccountViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """
     API endpoint for viewing and editing bank accounts.
     """
-    queryset = BankAccount.objects.all().order_by('name')
+    queryset = BankAccount.objects.annotate(transaction_count=Count('transactions')).order_by('name')
     serializer_class = BankAccountSerializer
     permission_classes = [AllowAny]  # Update this based on your security requirements
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'account_number', 'bank_name']
+    etag_models = {
+        'list': (BankAccount, Transaction),
+        'retrieve': (BankAccount, Transaction),
+    }
 
 class BankStatementViewSet(viewsets.ModelViewSet):
     """
@@ -356,9 +750,9 @@ def analyze_transfers(request):
 
 @swagger_auto_schema(
     method='post',
-    operation_description="Clear the application cache",
+    operation_description="Invalidate all cached API responses",
     responses={
-        200: openapi.Response(description="Cache cleared successfully", schema=openapi.Schema(
+        200: openapi.Response(description="Cache invalidated successfully", schema=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
                 'status': openapi.Schema(type=openapi.TYPE_STRING, description="Status of the operation"),
@@ -371,10 +765,13 @@ def analyze_transfers(request):
 @permission_classes([AllowAny])
 def clear_cache(request):
     """
-    Clear the application cache.
+    Invalidate all cached API responses.
+    
+    Bumps the generation of every tracked model instead of wiping the whole
+    cache, so unrelated cache entries survive.
     """
     try:
-        cache.clear()
+        bump_generation(*TRANSACTION_CACHE_MODELS, CategorySupplierMap)
         return Response({
             "status": "success",
             "message": "Cache cleared successfully"
@@ -384,4 +781,27 @@ def clear_cache(request):
         return Response(
             {"status": "error", "message": f"Failed to clear cache: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        ) 
\ No newline at end of file
+        ) 
+
+
+@swagger_auto_schema(
+    method='get',
+    operation_description="Per-endpoint latency histograms, query counts and cache reads of this process"
+)
+@api_view(['GET', 'DELETE'])
+@permission_classes([AllowAny])
+def perf_stats(request):
+    """
+    Report or reset the request metrics collected by PerformanceMiddleware.
+    
+    Statistics are kept in each worker process's memory, so with several
+    workers every response only covers the worker that served it.
+    """
+    if request.method == 'DELETE':
+        perf.registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    data = perf.registry.snapshot()
+    if hasattr(cache, 'stats'):
+        data['cache'] = cache.stats()
+    return Response(data)
@@ -22,6 +22,23 @@ TRIPLETEX_API_TRANSACTION_ENDPOINT = '/bank/transaction'
 # Cache settings
 CACHE_EXPIRY_DAYS = 7
 DEFAULT_CACHE_DIR = 'cache'
+# Cached API responses use versioned keys, so they never go stale and can live long
+API_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Analytics aggregation
+TIMESERIES_GRANULARITIES = ['day', 'week', 'month', 'quarter']
+ANALYTICS_GROUP_BY_FIELDS = ['category', 'bank_account', 'supplier', 'ledger_account']
+TREEMAP_LEVELS = ['category', 'supplier', 'ledger_account']
+TREEMAP_DEFAULT_TOP = 10
+# Upper bounds for top, which sizes the response: a treemap holds up to
+# top ** depth leaves, a time series top series of one value per period
+TREEMAP_MAX_TOP = 25
+TIMESERIES_MAX_TOP = 50
+# Upper bound for the period axis of a time series, e.g. ~2.7 years of days
+TIMESERIES_MAX_PERIODS = 1000
+
+# Default category of imported transactions; supplier mappings may replace it
+UNCATEGORIZED_CATEGORY_NAME = 'Uncategorized'
 
 # Transfer detection
 INTERNAL_TRANSFER_KEYWORDS = [
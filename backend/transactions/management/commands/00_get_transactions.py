@@ -18,6 +18,9 @@ django.setup()
 
 # Import models after Django setup
 from transactions.models import Transaction, Category, BankStatement, BankAccount, Supplier, Account, TransactionAccount, LedgerPosting, CloseGroup, CloseGroupPosting
+from transactions.utils.cache import bump_generation
+from transactions.services.category_service import get_supplier_category_map, mapped_category_id
+from transactions.constants import UNCATEGORIZED_CATEGORY_NAME
 
 # Todos: 
 # - Add automatic rolling of files_to_combine_with, now this has to be done manually
@@ -652,10 +655,16 @@ def save_transactions_to_database(data, debug=False):
     
     # Get or create a default category for uncategorized transactions
     default_category, _ = Category.objects.get_or_create(
-        name="Uncategorized",
+        name=UNCATEGORIZED_CATEGORY_NAME,
         defaults={"description": "Default category for uncategorized transactions"}
     )
     
+    # Load the supplier -> category map once; transactions from mapped
+    # suppliers are categorized as they are saved instead of landing in
+    # the default category
+    category_map = get_supplier_category_map()
+    transactions_mapped = 0
+    
     # Define account mappings for special transaction handling
     # Format: Account ID -> [{keyword pattern, description pattern}, ...]
     SPECIAL_ACCOUNT_MAPPINGS = {
@@ -776,8 +785,13 @@ def save_transactions_to_database(data, debug=False):
                 existing_transaction.raw_data = raw_data
                 
                 # Don't update category if it was already set to something other than the default
-                if existing_transaction.category_id is None:
-                    existing_transaction.category = default_category
+                category_id = mapped_category_id(
+                    category_map, existing_transaction.supplier_id,
+                    existing_transaction.category_id, default_category.id
+                )
+                if category_id != existing_transaction.category_id and category_id != default_category.id:
+                    transactions_mapped += 1
+                existing_transaction.category_id = category_id
                 
                 existing_transaction.save()
                 
@@ -863,13 +877,17 @@ def save_transactions_to_database(data, debug=False):
                     is_tax_transfer=processed_data.get("is_tax_transfer", False),
                     is_forbidden=processed_data.get("is_forbidden", False),
                     should_process=processed_data.get("should_process", False),
-                    category=default_category,
+                    category_id=mapped_category_id(
+                        category_map, supplier.id if supplier else None, None, default_category.id
+                    ),
                     raw_data=raw_data,
                     bank_account=bank_account,  # Set the bank account
                     supplier=supplier,  # Set the supplier
                     ledger_account=ledger_account  # Set the ledger account
                 )
                 new_transaction.save()
+                if new_transaction.category_id != default_category.id:
+                    transactions_mapped += 1
                 
                 # Create account postings for this transaction
                 for posting in account_postings:
@@ -932,9 +950,13 @@ def save_transactions_to_database(data, debug=False):
             if (transactions_saved + transactions_updated) % 100 == 0 and (transactions_saved + transactions_updated) > 0:
                 print(f"Processed {transactions_saved + transactions_updated} transactions ({transactions_saved} new, {transactions_updated} updated)...")
     
+    # Invalidate cached API responses built from the imported tables
+    bump_generation(Transaction, BankAccount, Supplier, Account, TransactionAccount)
+    
     print(f"Database import complete. Saved {transactions_saved} new transactions. Updated {transactions_updated} existing transactions. Skipped {transactions_skipped} transactions.")
     print(f"Linked {accounts_linked} regular accounts and {special_links_created} special accounts to transactions.")
     print(f"Skipped {duplicate_entries_skipped} duplicate account entries.")
+    print(f"Categorized {transactions_mapped} transactions from the supplier category map.")
     return transactions_saved, transactions_skipped, transactions_updated
 
 def apply_special_account_rules(transaction, special_accounts, account_mappings, debug=False):
@@ -75,13 +75,7 @@ class Command(BaseCommand):
         dry_run = options['dry_run']
         
         # Get all transactions without suppliers
-        query = Transaction.objects.filter(
-            supplier__isnull=True,
-            is_internal_transfer=False,  # Skip internal transfers
-            is_wage_transfer=False,      # Skip wage transfers
-            is_tax_transfer=False,       # Skip tax transfers
-            is_forbidden=False,          # Skip forbidden transactions
-        )
+        query = Transaction.objects.needs_supplier()
         
         if limit:
             query = query.order_by('-date')[:limit]
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+import json
+import math
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.utils.ann_index import HAS_NUMPY, IVFIndex
+from transactions.utils.vector_search import group_starts, top_k_groups
+
+if HAS_NUMPY:
+    import numpy as np
+
+# Spread of the synthetic embeddings, as the weight of a random unit vector
+# added at each level: topic -> supplier -> description variant -> row.
+# Gives cosine ~0.65 between rows of the same variant, as sentence
+# embeddings of similar bank descriptions typically have.
+TOPICS = 40
+VARIANTS_PER_SUPPLIER = 4
+SUPPLIER_SPREAD = 0.9
+VARIANT_SPREAD = 0.5
+ROW_SPREAD = 0.6
+
+
+def _unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def synthetic_embeddings(rows, queries, suppliers, dimension, seed):
+    """
+    Clustered unit vectors standing in for reference and query embeddings.
+
+    Returns:
+        tuple: (references, labels, queries) with references ordered by label
+    """
+    rng = np.random.default_rng(seed)
+
+    def spread(centers, weight):
+        return _unit(centers + weight * _unit(rng.normal(size=centers.shape))).astype(np.float32)
+
+    topics = _unit(rng.normal(size=(TOPICS, dimension)))
+    supplier_centers = spread(topics[rng.integers(0, TOPICS, suppliers)], SUPPLIER_SPREAD)
+    variants = spread(np.repeat(supplier_centers, VARIANTS_PER_SUPPLIER, axis=0), VARIANT_SPREAD)
+
+    row_variants = np.sort(rng.integers(0, len(variants), rows))
+    references = spread(variants[row_variants], ROW_SPREAD)
+    labels = row_variants // VARIANTS_PER_SUPPLIER
+    query_vectors = spread(variants[rng.integers(0, len(variants), queries)], ROW_SPREAD)
+    return references, labels, query_vectors
+
+
+def _recall(found, expected):
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, expected)]))
+
+
+class Command(BaseCommand):
+    help = 'Measure recall@k and latency of the ANN index against brute-force search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=str, default='100000,400000',
+                          help='Comma-separated reference set sizes')
+        parser.add_argument('--queries', type=int, default=256,
+                          help='Queries per measurement, searched as one batch like the matcher does')
+        parser.add_argument('--k', type=int, default=3,
+                          help='Suppliers returned per query')
+        parser.add_argument('--suppliers', type=int, default=10000,
+                          help='Number of suppliers the references belong to')
+        parser.add_argument('--dimension', type=int, default=384,
+                          help='Embedding dimension (384 for all-MiniLM-L6-v2)')
+        parser.add_argument('--lists-per-sqrt', type=str, default='1,2,4',
+                          help='Comma-separated list counts to try, per sqrt(rows)')
+        parser.add_argument('--nprobe', type=str, default='8,16,32,64',
+                          help='Comma-separated numbers of lists probed per query')
+        parser.add_argument('--insert-fraction', type=float, default=0.05,
+                          help='Share of rows inserted after building, so searches include an uncompacted tail')
+        parser.add_argument('--repeat', type=int, default=3,
+                          help='Timed runs per measurement; the fastest is reported')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', type=str, default=None,
+                          help='Write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if not HAS_NUMPY:
+            raise CommandError('benchmark_ann_index requires numpy')
+
+        k = options['k']
+        nprobes = [int(value) for value in options['nprobe'].split(',') if value]
+        list_factors = [float(value) for value in options['lists_per_sqrt'].split(',') if value]
+        results = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'cpu_count': os.cpu_count(),
+            },
+            'settings': {
+                'queries': options['queries'],
+                'k': k,
+                'suppliers': options['suppliers'],
+                'dimension': options['dimension'],
+                'insert_fraction': options['insert_fraction'],
+                'repeat': options['repeat'],
+            },
+            'sizes': {},
+        }
+
+        for rows in (int(value) for value in options['rows'].split(',') if value):
+            references, labels, queries = synthetic_embeddings(
+                rows, options['queries'], options['suppliers'], options['dimension'], options['seed']
+            )
+            starts, suppliers = group_starts(labels)
+
+            brute_ms, (_, groups, _) = self._time(
+                lambda: top_k_groups(queries, references, starts, k), len(queries), options['repeat']
+            )
+            expected = suppliers[groups]
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{rows:,} references"))
+            self.stdout.write(f"  brute force                    {brute_ms:8.3f} ms/query")
+            size_results = {'brute_force_ms': round(brute_ms, 3), 'indexes': []}
+
+            for factor in list_factors:
+                size_results['indexes'].append(
+                    self._measure(references, labels, queries, expected, factor, nprobes, k, brute_ms, options)
+                )
+            results['sizes'][str(rows)] = size_results
+
+        if options['output']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Wrote {output}")
+
+    @staticmethod
+    def _time(search, queries, repeat):
+        """
+        Run a search repeat times.
+
+        Returns:
+            tuple: (fastest ms per query, search result)
+        """
+        timings = []
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            result = search()
+            timings.append((time.perf_counter() - start) * 1000 / queries)
+        return min(timings), result
+
+    def _measure(self, references, labels, queries, expected, factor, nprobes, k, brute_ms, options):
+        lists = max(1, int(factor * math.sqrt(len(references))))
+        inserted = int(len(references) * options['insert_fraction'])
+        # Inserted rows are a random sample, as new assignments would be
+        order = np.random.default_rng(options['seed']).permutation(len(references))
+        initial, later = np.sort(order[inserted:]), np.sort(order[:inserted])
+
+        with tempfile.TemporaryDirectory() as directory:
+            index = IVFIndex(directory)
+            start = time.perf_counter()
+            index.build(references[initial], labels[initial], initial, lists=lists, seed=options['seed'])
+            build_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for chunk in np.array_split(later, 10):
+                index.add(references[chunk], labels[chunk], chunk)
+            insert_s = time.perf_counter() - start
+
+            self.stdout.write(
+                f"  {lists} lists (build {build_s:.1f}s, {inserted:,} inserts {insert_s:.1f}s, "
+                f"tail {index.tail_count:,} rows)"
+            )
+            probes = []
+            for nprobe in nprobes:
+                # Reopen so every setting starts from the memory-mapped files
+                index = IVFIndex(directory)
+                ann_ms, (_, found, _) = self._time(
+                    lambda: index.search(queries, k, nprobe), len(queries), options['repeat']
+                )
+                recall = _recall(found, expected)
+                probes.append({
+                    'nprobe': nprobe,
+                    'recall': round(recall, 4),
+                    'ms_per_query': round(ann_ms, 3),
+                    'speedup': round(brute_ms / ann_ms, 2),
+                })
+                self.stdout.write(
+                    f"    nprobe={nprobe:<4} recall@{k}={recall:.3f}  {ann_ms:8.3f} ms/query  "
+                    f"{brute_ms / ann_ms:5.1f}x"
+                )
+
+        return {
+            'lists': lists,
+            'build_s': round(build_s, 2),
+            'inserted': inserted,
+            'insert_s': round(insert_s, 2),
+            'probes': probes,
+        }
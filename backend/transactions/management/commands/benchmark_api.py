@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from transactions.models import Category, Transaction
+from transactions.services.snapshot_service import clear_snapshot
+from transactions.services.synthetic_data_service import SYNTHETIC_PREFIX, generate_synthetic_data
+from transactions.utils.cache import clear_cached_responses
+
+# Fixed so every run benchmarks the same data
+BENCHMARK_END_DATE = date(2025, 6, 30)
+BENCHMARK_SEED = 42
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+# name -> (method, path); {id} is a transaction in the middle of the table
+SCENARIOS = {
+    'list': ('get', '/api/v1/transactions/?page_size=100'),
+    'summary': ('get', '/api/v1/transactions/summary/'),
+    'budget': ('get', f'/api/v1/categories/budget/?year={BENCHMARK_END_DATE.year}&month={BENCHMARK_END_DATE.month}'),
+    'detail_with_raw_data': ('get', '/api/v1/transactions/{id}/detail_with_raw_data/'),
+    'search': ('get', '/api/v1/transactions/?search=rema&page_size=100'),
+    'categorize': ('post', '/api/v1/transactions/{id}/update_category/'),
+}
+
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = 'Measure API latency on synthetic data sets and compare against a stored baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=str, default='10000,100000,1000000',
+                          help='Comma-separated data set sizes (number of transactions)')
+        parser.add_argument('--scenarios', type=str, default=','.join(SCENARIOS),
+                          help='Comma-separated scenarios to run')
+        parser.add_argument('--runs', type=int, default=20,
+                          help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=3,
+                          help='Unmeasured requests per scenario')
+        parser.add_argument('--data-dir', type=str, default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'data'),
+                          help='Directory for the SQLite databases of each size, reused between runs')
+        parser.add_argument('--warm-cache', action='store_true',
+                          help='Keep cached responses between requests instead of clearing the cache')
+        parser.add_argument('--output', type=str, default=None,
+                          help='Write the results as JSON to this file')
+        parser.add_argument('--baseline', type=str, default=None,
+                          help=f'Compare against this results file (e.g. {DEFAULT_BASELINE.relative_to(settings.BASE_DIR)})')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                          help='Allowed p50 slowdown against the baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_api creates SQLite databases per size; the default database must be SQLite')
+
+        sizes = [int(size) for size in options['sizes'].split(',') if size]
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        data_dir = Path(options['data_dir'])
+        data_dir.mkdir(parents=True, exist_ok=True)
+        original_name = connection.settings_dict['NAME']
+
+        results = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'machine': platform.machine(),
+                'cpu_count': os.cpu_count(),
+            },
+            'settings': {
+                'runs': options['runs'],
+                'warm_cache': options['warm_cache'],
+            },
+            'sizes': {},
+        }
+        # A private cache keeps benchmark responses out of the real cache and
+        # stops results of one data set leaking into the next
+        isolated = override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            PERF_SLOW_REQUEST_MS=float('inf'),
+        )
+        try:
+            with isolated:
+                for size in sizes:
+                    self._use_database(data_dir / f'benchmark-{size}.sqlite3', size)
+                    results['sizes'][str(size)] = self._run_size(size, scenarios, options)
+        finally:
+            connections.close_all()
+            connection.settings_dict['NAME'] = original_name
+            clear_snapshot()
+
+        if options['output']:
+            output = Path(options['output'])
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text(json.dumps(results, indent=2) + '\n')
+            self.stdout.write(f"Wrote {output}")
+
+        if options['baseline']:
+            self._compare(results, json.loads(Path(options['baseline']).read_text()), options['tolerance'])
+
+    def _use_database(self, path, size):
+        """
+        Switch the default connection to the database of one data set,
+        creating and filling it the first time.
+        """
+        connections.close_all()
+        connection.settings_dict['NAME'] = str(path)
+        clear_snapshot()
+
+        call_command('migrate', verbosity=0, interactive=False)
+        existing = Transaction.objects.filter(tripletex_id__startswith=SYNTHETIC_PREFIX).count()
+        if existing > size:
+            raise CommandError(f"{path} holds {existing} transactions, more than {size}; delete it to regenerate")
+        if existing < size:
+            self.stdout.write(f"Generating {size - existing:,} transactions in {path} ...")
+            start = time.perf_counter()
+            generate_synthetic_data(size - existing, end_date=BENCHMARK_END_DATE, seed=BENCHMARK_SEED + existing)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.stdout.write(f"  done in {time.perf_counter() - start:.0f}s")
+
+    def _run_size(self, size, scenarios, options):
+        client = Client()
+        tracked_models = list(apps.get_app_config('transactions').get_models())
+        transaction_id = Transaction.objects.order_by('id').values_list('id', flat=True)[size // 2]
+        category_ids = list(Category.objects.order_by('id').values_list('id', flat=True)[:2])
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{size:,} transactions"))
+        results = {}
+        for name in scenarios:
+            method, path = SCENARIOS[name]
+            path = path.format(id=transaction_id)
+
+            durations = []
+            queries = []
+            for run in range(options['warmup'] + options['runs']):
+                if not options['warm_cache']:
+                    clear_cached_responses(*tracked_models)
+                kwargs = {}
+                if name == 'categorize':
+                    kwargs = {
+                        'data': {'category_id': category_ids[run % len(category_ids)]},
+                        'content_type': 'application/json',
+                    }
+                # A full query log makes CaptureQueriesContext count nothing
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = getattr(client, method)(path, **kwargs)
+                    elapsed = (time.perf_counter() - start) * 1000
+                if response.status_code >= 400:
+                    raise CommandError(f"{name}: {method.upper()} {path} returned {response.status_code}")
+                if run >= options['warmup']:
+                    durations.append(elapsed)
+                    queries.append(len(captured))
+
+            results[name] = {
+                'p50_ms': round(_percentile(durations, 50), 2),
+                'p95_ms': round(_percentile(durations, 95), 2),
+                'mean_ms': round(statistics.fmean(durations), 2),
+                'min_ms': round(min(durations), 2),
+                'queries': _percentile(queries, 50),
+            }
+            self.stdout.write(
+                f"  {name:<22} p50={results[name]['p50_ms']:>8.1f} ms  p95={results[name]['p95_ms']:>8.1f} ms  "
+                f"queries={results[name]['queries']}"
+            )
+        return results
+
+    def _compare(self, results, baseline, tolerance):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Against baseline from {baseline.get('created_at', '?')}"))
+        regressions = []
+        for size, scenarios in results['sizes'].items():
+            for name, current in scenarios.items():
+                previous = baseline.get('sizes', {}).get(size, {}).get(name)
+                if not previous:
+                    continue
+                ratio = current['p50_ms'] / previous['p50_ms'] if previous['p50_ms'] else 1.0
+                line = f"  {int(size):>9,} {name:<22} {previous['p50_ms']:>8.1f} -> {current['p50_ms']:>8.1f} ms ({ratio:.2f}x)"
+                if ratio > 1 + tolerance:
+                    regressions.append(line)
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} scenarios are more than {tolerance:.0%} slower than the baseline")
+        self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction, OperationalError
+
+from transactions.api.row_builders import TransactionRowBuilder
+from transactions.models import Transaction
+from transactions.services.transaction_service import get_transaction_summary
+
+BENCH_PREFIX = 'bench-concurrency-'
+
+
+def _percentile(values, percentile):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percentile / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class Command(BaseCommand):
+    help = 'Measure dashboard read latency while an import-like writer is running'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4,
+                          help='Number of concurrent reader threads')
+        parser.add_argument('--rows', type=int, default=5000,
+                          help='Number of transactions the writer inserts')
+        parser.add_argument('--batch-size', type=int, default=50,
+                          help='Rows written per transaction')
+        parser.add_argument('--long-transaction', action='store_true',
+                          help='Write every row in one transaction, like the old import path')
+        parser.add_argument('--page-size', type=int, default=100,
+                          help='Rows read per list page')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal_mode = cursor.fetchone()[0]
+                cursor.execute('PRAGMA busy_timeout')
+                busy_timeout = cursor.fetchone()[0]
+            self.stdout.write(f"journal_mode={journal_mode} busy_timeout={busy_timeout}ms")
+
+        rows = options['rows']
+        batch_size = rows if options['long_transaction'] else options['batch_size']
+        page_size = options['page_size']
+
+        writer_done = threading.Event()
+        lock = threading.Lock()
+        latencies = {'list': [], 'summary': []}
+        errors = []
+
+        def writer():
+            try:
+                start_date = date.today() - timedelta(days=365)
+                for offset in range(0, rows, batch_size):
+                    with transaction.atomic():
+                        Transaction.objects.bulk_create([
+                            Transaction(
+                                tripletex_id=f'{BENCH_PREFIX}{i}',
+                                description=f'BENCHMARK PURCHASE {i}',
+                                amount=Decimal(-(i % 500) - 1),
+                                date=start_date + timedelta(days=i % 365),
+                            )
+                            for i in range(offset, min(offset + batch_size, rows))
+                        ])
+            except OperationalError as e:
+                with lock:
+                    errors.append(f"writer: {e}")
+            finally:
+                writer_done.set()
+                connections.close_all()
+
+        def reader():
+            fields = ['id', 'date', 'description', 'amount', 'category_name']
+            builder = TransactionRowBuilder(fields)
+            try:
+                while not writer_done.is_set():
+                    for name, query in (
+                        ('list', lambda: builder.build(list(
+                            builder.project(Transaction.objects.list_shape(fields).order_by('-date'))[:page_size]
+                        ))),
+                        ('summary', lambda: get_transaction_summary({})),
+                    ):
+                        start = time.perf_counter()
+                        try:
+                            query()
+                        except OperationalError as e:
+                            with lock:
+                                errors.append(f"{name}: {e}")
+                            continue
+                        elapsed = (time.perf_counter() - start) * 1000
+                        with lock:
+                            latencies[name].append(elapsed)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+        writer_thread = threading.Thread(target=writer)
+
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            writer_thread.start()
+            writer_thread.join()
+            for thread in threads:
+                thread.join()
+        finally:
+            Transaction.objects.filter(tripletex_id__startswith=BENCH_PREFIX).delete()
+        elapsed = time.perf_counter() - started
+
+        mode = 'one transaction' if options['long_transaction'] else f'batches of {batch_size}'
+        self.stdout.write(f"Writer: {rows} rows in {mode}, {elapsed:.2f} s")
+        for name, values in latencies.items():
+            self.stdout.write(
+                f"{name:<8} reads={len(values):<6} p50={_percentile(values, 50):.1f} ms "
+                f"p95={_percentile(values, 95):.1f} ms max={max(values, default=0):.1f} ms"
+            )
+
+        if errors:
+            self.stdout.write(self.style.ERROR(f"{len(errors)} errors, first: {errors[0]}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No lock errors"))
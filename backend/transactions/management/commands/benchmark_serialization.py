@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from transactions.api.renderers import FastJSONRenderer
+from transactions.api.row_builders import TransactionRowBuilder
+from transactions.api.serializers import TransactionSerializer
+from transactions.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/second of TransactionSerializer against the fast row builder path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=5000,
+                          help='Number of transactions to render per run')
+        parser.add_argument('--runs', type=int, default=3,
+                          help='Number of runs per method (best run is reported)')
+        parser.add_argument('--fields', type=str, default=None,
+                          help='Comma-separated sparse fieldset, e.g. date,amount,category_name')
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        runs = options['runs']
+        fields = sorted(options['fields'].split(',')) if options['fields'] else None
+
+        base_queryset = Transaction.objects.list_shape(fields).order_by('-date')
+        if fields is None or 'related_accounts' in fields:
+            base_queryset = base_queryset.prefetch_related('transaction_accounts__account')
+
+        def serializer_path():
+            rows = list(base_queryset[:limit])
+            data = TransactionSerializer(rows, many=True, fields=fields).data
+            return len(rows), JSONRenderer().render(data)
+
+        def fast_path():
+            builder = TransactionRowBuilder(fields)
+            rows = list(builder.project(base_queryset)[:limit])
+            return len(rows), FastJSONRenderer().render(builder.build(rows))
+
+        results = {}
+        for name, method in (('serializer', serializer_path), ('row builder', fast_path)):
+            best = None
+            for _ in range(runs):
+                start = time.perf_counter()
+                count, payload = method()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            rows_per_second = count / best if best else 0
+            results[name] = rows_per_second
+            self.stdout.write(
+                f"{name:<12} {count} rows in {best * 1000:.1f} ms "
+                f"({rows_per_second:,.0f} rows/s, {len(payload):,} bytes)"
+            )
+
+        if results['serializer']:
+            speedup = results['row builder'] / results['serializer']
+            self.stdout.write(self.style.SUCCESS(f"Speedup: {speedup:.1f}x"))
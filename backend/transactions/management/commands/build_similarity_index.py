@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.models import Transaction
+from transactions.services.similarity_service import index_transactions, index_missing_transactions
+
+
+class Command(BaseCommand):
+    help = 'Build the n-gram index used by the similar transactions endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                          help='Re-index every transaction instead of only those missing from the index')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if options['rebuild']:
+            indexed = index_transactions(Transaction.objects.all())
+        else:
+            indexed = index_missing_transactions()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} transactions in {elapsed:.1f}s"))
@@ -29,8 +29,11 @@ django.setup()
 
 # Import models after Django setup
 from transactions.models import Transaction, Supplier
+from transactions.utils.embedding_store import EmbeddingStore
+from transactions.utils.vector_search import group_starts, top_k_groups
 
 # Constants
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 MIN_TRANSACTIONS_PER_SUPPLIER = 2  # Minimum transactions per supplier for training
 SIMILARITY_THRESHOLD = 0.7  # Default threshold for similarity matching
 MAX_TEST_SIZE = 100  # Maximum test set size
@@ -91,7 +94,7 @@ def method1_embedding_nn(training_set, test_transactions):
     Uses sentence embeddings to find similar transactions
     """
     try:
-        from sentence_transformers import SentenceTransformer, util
+        from sentence_transformers import SentenceTransformer
         import torch
     except ImportError:
         logger.error("Required packages not installed. Please run: pip install sentence-transformers torch")
@@ -103,7 +106,7 @@ def method1_embedding_nn(training_set, test_transactions):
     logger.info("Running Method 1: Text Embedding + Nearest Neighbor Search")
     
     # Load model
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
     logger.info(f"Using device: {device}")
     model = model.to(device)
@@ -130,26 +133,22 @@ def method1_embedding_nn(training_set, test_transactions):
     
     start_time = time.time()
     
-    # Encode training descriptions
+    # Encode training descriptions (only those missing from the embedding store)
+    store = EmbeddingStore(EMBEDDING_MODEL_NAME)
+    encode = lambda texts: model.encode(texts, convert_to_numpy=True)
     logger.info(f"Encoding {len(all_descriptions)} training descriptions...")
-    train_embeddings = model.encode(all_descriptions, convert_to_tensor=True)
+    train_embeddings = store.embed(all_descriptions, encode)
     
     # Encode test descriptions
     test_descriptions = [tx['description'] for tx in test_transactions]
     logger.info(f"Encoding {len(test_descriptions)} test descriptions...")
-    test_embeddings = model.encode(test_descriptions, convert_to_tensor=True)
+    test_embeddings = store.embed(test_descriptions, encode)
     
-    # Match each test transaction
+    # Match all test transactions in one matrix multiply
     results = []
-    for i, embedding in enumerate(test_embeddings):
-        # Compute cosine similarity
-        cosine_scores = util.cos_sim(embedding, train_embeddings)[0]
-        
-        # Get best match
-        best_score, best_idx = torch.max(cosine_scores, dim=0)
-        best_score = best_score.item()
-        best_idx = best_idx.item()
-        
+    starts, _ = group_starts([info['supplier_id'] for info in supplier_info])
+    best_scores, _, best_rows = top_k_groups(test_embeddings, train_embeddings, starts, 1)
+    for i, (best_score, best_idx) in enumerate(zip(best_scores[:, 0], best_rows)):
         match_info = supplier_info[best_idx]
         
         # Add to results
@@ -329,7 +328,7 @@ def method4_embedding_reference_db(training_set, test_transactions):
     Uses embedding reference database for faster matching
     """
     try:
-        from sentence_transformers import SentenceTransformer, util
+        from sentence_transformers import SentenceTransformer
         import torch
     except ImportError:
         logger.error("Required packages not installed. Please run: pip install sentence-transformers torch")
@@ -341,13 +340,12 @@ def method4_embedding_reference_db(training_set, test_transactions):
     logger.info("Running Method 4: Embedding Reference Database")
     
     # Load model
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
     logger.info(f"Using device: {device}")
     model = model.to(device)
     
-    # Globals to store embeddings and related data
-    supplier_embeddings = []
+    # Reference descriptions and their suppliers
     supplier_info = []
     
     start_time = time.time()
@@ -362,23 +360,18 @@ def method4_embedding_reference_db(training_set, test_transactions):
         # Extract supplier name
         supplier_name = transactions[0]['supplier__name']
         
-        # Get all descriptions
-        descriptions = [tx['description'] for tx in transactions]
-        
-        # Encode descriptions
-        embeddings = model.encode(descriptions, convert_to_tensor=True)
-        
         # Add to reference database
-        for i, embedding in enumerate(embeddings):
-            supplier_embeddings.append(embedding)
+        for tx in transactions:
             supplier_info.append({
                 'supplier_id': supplier_id,
                 'supplier_name': supplier_name,
-                'description': descriptions[i]
+                'description': tx['description']
             })
     
-    # Convert list to tensor for faster processing
-    supplier_embeddings = torch.stack(supplier_embeddings)
+    # Encode all reference descriptions at once (only those missing from the embedding store)
+    store = EmbeddingStore(EMBEDDING_MODEL_NAME)
+    encode = lambda texts: model.encode(texts, convert_to_numpy=True)
+    supplier_embeddings = store.embed([info['description'] for info in supplier_info], encode)
     
     # Process test transactions
     results = []
@@ -387,18 +380,12 @@ def method4_embedding_reference_db(training_set, test_transactions):
     test_descriptions = [tx['description'] for tx in test_transactions]
     
     # Encode descriptions
-    test_embeddings = model.encode(test_descriptions, convert_to_tensor=True)
+    test_embeddings = store.embed(test_descriptions, encode)
     
-    # Match against supplier embeddings
-    for i, embedding in enumerate(test_embeddings):
-        # Compute cosine similarity
-        cosine_scores = util.cos_sim(embedding, supplier_embeddings)[0]
-        
-        # Get best match
-        best_score, best_idx = torch.max(cosine_scores, dim=0)
-        best_score = best_score.item()
-        best_idx = best_idx.item()
-        
+    # Match all test transactions against supplier embeddings in one matrix multiply
+    starts, _ = group_starts([info['supplier_id'] for info in supplier_info])
+    best_scores, _, best_rows = top_k_groups(test_embeddings, supplier_embeddings, starts, 1)
+    for i, (best_score, best_idx) in enumerate(zip(best_scores[:, 0], best_rows)):
         match_info = supplier_info[best_idx]
         
         # Add to results
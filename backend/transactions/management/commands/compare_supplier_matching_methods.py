@@ -667,13 +667,7 @@ def apply_to_unmatched_transactions(threshold=SIMILARITY_THRESHOLD, use_best_mat
     Only updates transactions if confidence is above threshold.
     """
     # Get all transactions without suppliers
-    unmatched_txs = Transaction.objects.filter(
-        supplier__isnull=True,
-        is_internal_transfer=False,  # Skip internal transfers
-        is_wage_transfer=False,      # Skip wage transfers
-        is_tax_transfer=False,       # Skip tax transfers
-        is_forbidden=False,          # Skip forbidden transactions
-    )
+    unmatched_txs = Transaction.objects.needs_supplier()
     
     logger.info(f"Found {unmatched_txs.count()} transactions without suppliers")
     
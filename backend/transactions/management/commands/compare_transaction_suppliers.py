@@ -35,13 +35,7 @@ def calculate_similarity(text1, text2):
 
 def get_unmatched_transactions():
     """Retrieves all transactions without a supplier."""
-    return Transaction.objects.filter(
-        supplier__isnull=True,
-        is_internal_transfer=False,  # Skip internal transfers
-        is_wage_transfer=False,      # Skip wage transfers
-        is_tax_transfer=False,       # Skip tax transfers
-        is_forbidden=False,          # Skip forbidden transactions
-    ).order_by('-date', '-id').values('id', 'description')
+    return Transaction.objects.needs_supplier().order_by('-date', '-id').values('id', 'description')
 
 def get_matched_transactions():
     """Retrieves all transactions with a supplier for reference."""
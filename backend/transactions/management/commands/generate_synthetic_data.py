@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.services.synthetic_data_service import (
+    MAX_SYNTHETIC_TRANSACTIONS, clear_synthetic_data, generate_synthetic_data
+)
+
+
+class Command(BaseCommand):
+    help = 'Create realistic synthetic transactions for benchmarks and load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000,
+                          help=f'Number of transactions to create (at most {MAX_SYNTHETIC_TRANSACTIONS:,})')
+        parser.add_argument('--suppliers', type=int, default=300,
+                          help='Number of suppliers to spread purchases over')
+        parser.add_argument('--years', type=int, default=3,
+                          help='Number of years the transaction dates are spread over')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                          help='Last transaction date (YYYY-MM-DD, default today)')
+        parser.add_argument('--seed', type=int, default=42,
+                          help='Random seed; the same options always produce the same data')
+        parser.add_argument('--clear', action='store_true',
+                          help='Delete previously generated transactions first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = clear_synthetic_data()
+            self.stdout.write(f"Deleted {deleted} synthetic transactions")
+
+        count = options['count']
+        start = time.perf_counter()
+
+        def progress(created):
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"  {created:,}/{count:,} ({created / elapsed:,.0f} rows/s)")
+
+        try:
+            created = generate_synthetic_data(
+                count,
+                suppliers=options['suppliers'],
+                years=options['years'],
+                end_date=options['end_date'],
+                seed=options['seed'],
+                progress=progress if options['verbosity'] > 1 else None,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Created {created:,} synthetic transactions in {elapsed:.1f}s"))
@@ -2,6 +2,7 @@
 import os
 import sys
 import numpy as np
+import json
 import logging
 import torch
 from tqdm import tqdm
@@ -27,11 +28,21 @@ import django
 django.setup()
 
 # Import models after Django setup
-from transactions.models import Transaction, Supplier
+from transactions.models import Transaction
+from transactions.utils.ann_index import DEFAULT_NPROBE, IVFIndex
+from transactions.utils.embedding_store import EmbeddingStore
+from transactions.utils.vector_search import group_starts, top_k_groups
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+# ANN index over the reference embeddings, next to the model's embedding store
+INDEX_DIRECTORY = 'supplier-index'
 
 # Globals to store embeddings and related data
 supplier_embeddings = []
 supplier_info = []
+# First reference row and details of each supplier; rows are ordered by supplier
+supplier_starts = []
+supplier_groups = []
 
 class Command(BaseCommand):
     help = 'Match transactions without suppliers to similar transactions with suppliers using embeddings'
@@ -46,7 +57,7 @@ class Command(BaseCommand):
         parser.add_argument(
             '--batch',
             type=int,
-            default=25,
+            default=256,
             help='Batch size for processing'
         )
         parser.add_argument(
@@ -61,6 +72,34 @@ class Command(BaseCommand):
             default=2,
             help='Minimum number of examples needed per supplier'
         )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=3,
+            help='Number of candidate suppliers to keep per transaction for review'
+        )
+        parser.add_argument(
+            '--review-output',
+            type=str,
+            default=None,
+            help='Write every transaction with its top-k candidate suppliers as JSON to this file'
+        )
+        parser.add_argument(
+            '--exact',
+            action='store_true',
+            help='Score every reference embedding instead of searching the ANN index'
+        )
+        parser.add_argument(
+            '--nprobe',
+            type=int,
+            default=DEFAULT_NPROBE,
+            help='Index lists searched per transaction; more is slower and closer to --exact'
+        )
+        parser.add_argument(
+            '--rebuild-index',
+            action='store_true',
+            help='Retrain the ANN index from scratch'
+        )
         parser.add_argument(
             '--dry-run',
             action='store_true',
@@ -84,18 +123,21 @@ class Command(BaseCommand):
             threshold = options['threshold']
             min_examples = options['min_examples']
             dry_run = options['dry_run']
+            top_k = options['top_k']
+            self.nprobe = options['nprobe']
             
             logger.info(f"Starting supplier matching with embeddings (limit={limit}, threshold={threshold})")
             
             # Load model
             logger.info("Loading sentence transformer model...")
-            model = SentenceTransformer('all-MiniLM-L6-v2')
+            model = SentenceTransformer(MODEL_NAME)
             device = 'cuda' if torch.cuda.is_available() else 'cpu'
             logger.info(f"Using device: {device}")
             model = model.to(device)
+            self.embedding_store = EmbeddingStore(MODEL_NAME)
             
             # Create reference database from transactions with suppliers
-            self._build_reference_db(model, min_examples)
+            self._build_reference_db(model, min_examples, options['exact'], options['rebuild_index'])
             
             # Get transactions without suppliers
             unmatched_txs = self._get_unmatched_transactions(limit)
@@ -108,21 +150,35 @@ class Command(BaseCommand):
             
             # Process in batches
             total_matched = 0
+            review = []
             
             for i in range(0, len(unmatched_txs), batch_size):
                 batch = unmatched_txs[i:i+batch_size]
-                matched = self._process_batch(model, batch, threshold, dry_run)
+                matched, results = self._process_batch(model, batch, threshold, dry_run, top_k)
                 total_matched += matched
+                review.extend(results)
                 
             logger.info(f"Processing complete. {total_matched} transactions matched to suppliers.")
+            
+            if options['review_output']:
+                with open(options['review_output'], 'w') as file:
+                    json.dump(review, file, indent=2, default=str)
+                logger.info(f"Wrote {len(review)} transactions with candidate suppliers to {options['review_output']}")
                 
         except Exception as e:
             logger.exception(f"Error in supplier matching: {e}")
             self.stderr.write(f"Error: {e}")
             
-    def _build_reference_db(self, model, min_examples):
-        """Build a reference database of embeddings from transactions with known suppliers."""
-        global supplier_embeddings, supplier_info
+    def _build_reference_db(self, model, min_examples, exact=False, rebuild_index=False):
+        """
+        Build a reference database of embeddings from transactions with known suppliers.
+        
+        Unless exact is set, the embeddings go into the persisted ANN index,
+        which only needs the references added since the last run.
+        """
+        global supplier_embeddings, supplier_info, supplier_starts, supplier_groups
+        
+        self.index = None
         
         # Get suppliers with at least min_examples transactions
         suppliers_with_min_txs = Transaction.objects.values('supplier_id')\
@@ -140,98 +196,174 @@ class Command(BaseCommand):
         supplier_embeddings = []
         supplier_info = []
         
-        # Process each supplier
-        for supplier_id in tqdm(suppliers_with_min_txs, desc="Building reference database"):
-            # Get supplier info
-            supplier = Supplier.objects.get(id=supplier_id)
-            
-            # Get this supplier's transactions
-            txs = Transaction.objects.filter(supplier_id=supplier_id)\
-                .values_list('description', flat=True)
-                
-            # Convert to list and get embeddings
-            descriptions = list(txs)
-            embeddings = model.encode(descriptions, convert_to_tensor=True)
-            
-            # Add to our reference database
-            for i, embedding in enumerate(embeddings):
-                supplier_embeddings.append(embedding)
-                supplier_info.append({
-                    'supplier_id': supplier_id,
-                    'supplier_name': supplier.name,
-                    'description': descriptions[i]
-                })
+        # Every reference transaction in one query
+        rows = Transaction.objects.filter(supplier_id__in=suppliers_with_min_txs)\
+            .order_by('supplier_id', 'id')\
+            .values_list('id', 'supplier_id', 'supplier__name', 'description')
+        for transaction_id, supplier_id, supplier_name, description in tqdm(rows, desc="Building reference database"):
+            supplier_info.append({
+                'transaction_id': transaction_id,
+                'supplier_id': supplier_id,
+                'supplier_name': supplier_name,
+                'description': description
+            })
+        self.supplier_names = {info['supplier_id']: info['supplier_name'] for info in supplier_info}
+        
+        # Only descriptions missing from the embedding store are encoded
+        encode = lambda texts: model.encode(texts, convert_to_numpy=True)
+        
+        if not exact:
+            self._sync_index(encode, rebuild_index)
+            return
+        
+        supplier_embeddings = self.embedding_store.embed([info['description'] for info in supplier_info], encode)
+        supplier_starts, supplier_ids = group_starts([info['supplier_id'] for info in supplier_info])
+        supplier_groups = [
+            {'supplier_id': int(supplier_id), 'supplier_name': supplier_info[start]['supplier_name']}
+            for start, supplier_id in zip(supplier_starts, supplier_ids)
+        ]
                 
         logger.info(f"Reference database built with {len(supplier_embeddings)} transaction embeddings")
+    
+    def _sync_index(self, encode, rebuild):
+        """
+        Bring the ANN index up to date with the reference transactions.
+        
+        New references are inserted. If a reference was removed or moved to
+        another supplier, the index is rebuilt, which is cheap for rows
+        already in the embedding store.
+        """
+        global supplier_info
+        
+        if not supplier_info:
+            # Nothing to compare the index with; leave it for the next run,
+            # which rebuilds it if its references are gone
+            logger.warning("No reference transactions found. Cannot match transactions.")
+            return
+        
+        index = IVFIndex(os.path.join(self.embedding_store.directory, INDEX_DIRECTORY))
+        ids = np.array([info['transaction_id'] for info in supplier_info], dtype=np.int64)
+        labels = np.array([info['supplier_id'] for info in supplier_info], dtype=np.int64)
+        
+        # Compare what the index holds with the current references
+        indexed_ids, indexed_labels = index.ids, index.labels
+        order = np.argsort(ids)
+        current = order[np.minimum(np.searchsorted(ids[order], indexed_ids), len(ids) - 1)]
+        stale = (ids[current] != indexed_ids) | (labels[current] != indexed_labels)
+        
+        if rebuild or stale.any():
+            logger.info(f"Rebuilding ANN index ({int(stale.sum())} indexed references removed or changed supplier)")
+            embeddings = self.embedding_store.embed([info['description'] for info in supplier_info], encode)
+            index.build(embeddings, labels, ids)
+        else:
+            new = np.flatnonzero(~np.isin(ids, indexed_ids))
+            if len(new):
+                embeddings = self.embedding_store.embed([supplier_info[i]['description'] for i in new], encode)
+                index.add(embeddings, labels[new], ids[new])
+            logger.info(f"ANN index holds {len(index)} reference embeddings, {len(new)} added this run")
         
-        # Convert list to tensor for faster processing
-        supplier_embeddings = torch.stack(supplier_embeddings)
+        self.index = index
+    
+    def _find_candidates(self, batch_embeddings, top_k):
+        """
+        Find the top_k suppliers of every transaction in a batch.
+        
+        Returns:
+            tuple: (scores, supplier_ids, best_descriptions) - (n, top_k)
+                scores and supplier ids, best first and -1 where fewer
+                suppliers were found, and the description of the closest
+                reference transaction
+        """
+        global supplier_embeddings, supplier_info, supplier_starts, supplier_groups
+        
+        if self.index is not None:
+            scores, supplier_ids, reference_ids = self.index.search(batch_embeddings, top_k, self.nprobe)
+            descriptions = dict(
+                Transaction.objects.filter(id__in=reference_ids[:, 0].tolist()).values_list('id', 'description')
+            )
+            return scores, supplier_ids, [descriptions.get(int(i)) for i in reference_ids[:, 0]]
+        
+        scores, groups, best_rows = top_k_groups(batch_embeddings, supplier_embeddings, supplier_starts, top_k)
+        supplier_ids = np.array([group['supplier_id'] for group in supplier_groups])[groups]
+        return scores, supplier_ids, [supplier_info[row]['description'] for row in best_rows]
     
     def _get_unmatched_transactions(self, limit):
         """Get transactions without suppliers."""
-        return list(Transaction.objects.filter(
-            supplier__isnull=True,
-            is_internal_transfer=False,  # Skip internal transfers
-            is_wage_transfer=False,      # Skip wage transfers
-            is_tax_transfer=False,       # Skip tax transfers
-            is_forbidden=False,          # Skip forbidden transactions
-        ).order_by('-date')[:limit].values('id', 'description', 'amount', 'date'))
+        return list(Transaction.objects.needs_supplier().order_by('-date')[:limit].values('id', 'description', 'amount', 'date'))
     
-    def _process_batch(self, model, batch, threshold, dry_run):
-        """Process a batch of unmatched transactions."""
-        global supplier_embeddings, supplier_info
+    def _process_batch(self, model, batch, threshold, dry_run, top_k=3):
+        """
+        Process a batch of unmatched transactions.
+        
+        The batch is scored against the reference database at once, through
+        the ANN index or in one matrix multiply, and all matches are written
+        with one bulk update.
         
-        # Import required libraries for this method
-        from sentence_transformers import util
+        Returns:
+            tuple: (matched_count, results) - results holds every transaction
+                with its top_k candidate suppliers, best first, for review
+        """
+        global supplier_embeddings
         
-        if len(supplier_embeddings) == 0:
+        if self.index is None and len(supplier_embeddings) == 0:
             logger.warning("Reference database is empty. Cannot match transactions.")
-            return 0
+            return 0, []
             
         # Get descriptions for the batch
         descriptions = [tx['description'] for tx in batch]
         
         # Encode descriptions
-        batch_embeddings = model.encode(descriptions, convert_to_tensor=True)
+        batch_embeddings = self.embedding_store.embed(
+            descriptions, lambda texts: model.encode(texts, convert_to_numpy=True)
+        )
         
-        # Match against supplier embeddings
-        matched_count = 0
+        # Best suppliers of every transaction at once
+        scores, supplier_ids, best_descriptions = self._find_candidates(batch_embeddings, top_k)
         
-        for i, embedding in enumerate(batch_embeddings):
-            # Compute cosine similarity
-            cosine_scores = util.cos_sim(embedding, supplier_embeddings)[0]
-            
-            # Get best match
-            best_score, best_idx = torch.max(cosine_scores, dim=0)
-            best_score = best_score.item()
-            best_idx = best_idx.item()
-            
-            tx = batch[i]
+        matches = []
+        results = []
+        
+        for tx, tx_scores, tx_suppliers, best_description in zip(batch, scores, supplier_ids, best_descriptions):
+            candidates = [
+                {
+                    'supplier_id': int(supplier_id),
+                    'supplier_name': self.supplier_names[supplier_id],
+                    'score': round(float(score), 4),
+                }
+                for score, supplier_id in zip(tx_scores, tx_suppliers)
+                if supplier_id >= 0
+            ]
+            best_score = candidates[0]['score'] if candidates else 0.0
+            matched = best_score >= threshold
+            results.append({
+                'transaction_id': tx['id'],
+                'description': tx['description'],
+                'matched': matched,
+                'candidates': candidates,
+            })
             
-            if best_score >= threshold:
-                match_info = supplier_info[best_idx]
+            if matched:
+                match_info = candidates[0]
                 
                 # Log the match
                 logger.info(f"Match found (score: {best_score:.4f}):")
                 logger.info(f"  Transaction: {tx['description']}")
-                logger.info(f"  Best match: {match_info['description']}")
+                logger.info(f"  Best match: {best_description}")
                 logger.info(f"  Supplier: {match_info['supplier_name']}")
                 
-                if not dry_run:
-                    # Update the transaction with the matched supplier
-                    Transaction.objects.filter(id=tx['id']).update(
-                        supplier_id=match_info['supplier_id']
-                    )
-                    matched_count += 1
+                matches.append(Transaction(id=tx['id'], supplier_id=match_info['supplier_id']))
             else:
                 logger.debug(f"No good match for: {tx['description']} (best score: {best_score:.4f})")
                 
         if dry_run:
-            logger.info(f"Dry run - would have updated {matched_count} transactions")
-        else:
-            logger.info(f"Updated {matched_count} transactions with supplier matches")
+            logger.info(f"Dry run - would have updated {len(matches)} transactions")
+            return 0, results
+        
+        # One UPDATE for the whole batch
+        Transaction.objects.bulk_update(matches, ['supplier'])
+        logger.info(f"Updated {len(matches)} transactions with supplier matches")
             
-        return matched_count
+        return len(matches), results
 
 if __name__ == "__main__":
     pass 
\ No newline at end of file
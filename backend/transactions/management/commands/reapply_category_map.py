@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.models import Category
+from transactions.services.category_service import reapply_supplier_category_map
+
+
+class Command(BaseCommand):
+    help = "Categorize existing transactions from each supplier's category mapping"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true',
+                            help='Also replace categories other than Uncategorized')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many transactions would change')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        updated = reapply_supplier_category_map(overwrite=options['overwrite'], dry_run=options['dry_run'])
+        elapsed = time.perf_counter() - start
+
+        names = dict(Category.objects.filter(id__in=updated).values_list('id', 'name'))
+        for category_id, count in sorted(updated.items(), key=lambda item: -item[1]):
+            if count:
+                self.stdout.write(f"  {names.get(category_id, category_id)}: {count}")
+
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {sum(updated.values())} transactions in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.services.facts_service import rebuild_spending_facts
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the spending facts used by the analytics endpoints'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        written = rebuild_spending_facts()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} spending facts in {elapsed:.1f}s"))
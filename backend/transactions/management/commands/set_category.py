@@ -20,7 +20,8 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finance_visualizer.settings')
 django.setup()
 
 # Import models after setting up Django
-from transactions.models import Transaction, Category, CategorySupplierMap
+from transactions.models import Transaction, Category
+from transactions.services.transaction_service import set_supplier_categories
 
 def set_wage_transfer_categories():
     """
@@ -48,56 +49,39 @@ def set_wage_transfer_categories():
     print(f"Found {wage_transfers.count()} wage transfer and tax transfer transactions.")
     
     # Track counts for reporting
-    updated_count = 0
-    already_categorized_count = 0
-    supplier_mappings_created = 0
-    supplier_mappings_updated = 0
+    total_processed = wage_transfers.count()
+    already_categorized_count = wage_transfers.filter(category=salary_category).count()
     
     # Use a transaction to ensure atomicity
     with transaction.atomic():
-        # Process each transaction
-        for tx in wage_transfers:
-            if tx.category == salary_category:
-                already_categorized_count += 1
-                continue
-            
-            # Update the transaction category
-            tx.category = salary_category
-            tx.save()
-            updated_count += 1
-            
-            # Update or create supplier mapping if this transaction has a supplier
-            if tx.supplier:
-                try:
-                    # Try to get existing mapping
-                    mapping, created = CategorySupplierMap.objects.update_or_create(
-                        supplier=tx.supplier,
-                        defaults={'category': salary_category}
-                    )
-                    
-                    if created:
-                        supplier_mappings_created += 1
-                    else:
-                        supplier_mappings_updated += 1
-                except Exception as e:
-                    print(f"Error updating supplier mapping for supplier '{tx.supplier.name}': {e}")
+        # Update the transaction categories in one statement
+        updated_count = Transaction.objects.filter(
+            id__in=wage_transfers.exclude(category=salary_category).values('id')
+        ).update(category=salary_category)
+        
+        # Map every supplier of these transactions to Salary only; mappings
+        # are unique per (supplier, category), not per supplier
+        supplier_ids = wage_transfers.filter(supplier__isnull=False).values_list('supplier_id', flat=True).distinct()
+        supplier_mappings_saved, supplier_mappings_removed = set_supplier_categories(
+            {supplier_id: salary_category.id for supplier_id in supplier_ids}
+        )
     
     # Print summary
     print("\nOperation completed successfully!")
     print("-" * 40)
     print(f"Transactions already categorized as 'Salary': {already_categorized_count}")
     print(f"Transactions updated to 'Salary' category: {updated_count}")
-    print(f"New supplier-category mappings created: {supplier_mappings_created}")
-    print(f"Existing supplier-category mappings updated: {supplier_mappings_updated}")
+    print(f"Supplier-category mappings saved: {supplier_mappings_saved}")
+    print(f"Mappings to other categories removed: {supplier_mappings_removed}")
     print("-" * 40)
-    print(f"Total transactions processed: {wage_transfers.count()}")
+    print(f"Total transactions processed: {total_processed}")
     
     return {
         "already_categorized": already_categorized_count,
         "updated": updated_count,
-        "supplier_mappings_created": supplier_mappings_created,
-        "supplier_mappings_updated": supplier_mappings_updated,
-        "total_processed": wage_transfers.count()
+        "supplier_mappings_saved": supplier_mappings_saved,
+        "supplier_mappings_removed": supplier_mappings_removed,
+        "total_processed": total_processed
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+"""
+Middleware for the transactions app.
+"""
+import logging
+
+from django.conf import settings
+
+from .utils import perf
+from .utils.cache import request_generations
+from .utils.timing import server_timing_entry
+
+logger = logging.getLogger('transactions')
+
+SLOW_QUERY_SQL_LENGTH = 500
+
+
+class RequestGenerationsMiddleware:
+    """
+    Read each cache generation counter at most once per request.
+
+    The ETag of a conditional GET and the cache key of the response embed
+    the same generations; without this, each is a separate round trip to
+    the shared cache tier.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_generations():
+            return self.get_response(request)
+
+
+class PerformanceMiddleware:
+    """
+    Record what each request spends its time on.
+
+    Per request it counts SQL queries and their time, cache hits and misses,
+    serializer and render time and the total time, and sends them in a
+    Server-Timing header after any metrics the view added itself. Requests
+    slower than PERF_SLOW_REQUEST_MS are logged with their slowest queries,
+    and every request is added to the per-endpoint histograms served by
+    /api/v1/_perf/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERF_INSTRUMENTATION_ENABLED', True)
+        self.slow_request_ms = getattr(settings, 'PERF_SLOW_REQUEST_MS', 500)
+        self.top_queries = getattr(settings, 'PERF_TOP_QUERIES', 5)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        metrics = perf.RequestMetrics(top_queries=self.top_queries)
+        request._perf_metrics = metrics
+        token = perf.activate(metrics)
+        try:
+            with perf.instrument_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            perf.deactivate(token)
+
+        total_ms = metrics.elapsed_ms()
+        render_started = getattr(request, '_perf_render_started', None)
+        if render_started is not None:
+            metrics.spans['render'] = total_ms - render_started
+
+        self._add_server_timing(response, metrics, total_ms)
+        endpoint = self._endpoint_name(request)
+        perf.registry.record(endpoint, metrics, total_ms, response.status_code)
+        if total_ms >= self.slow_request_ms:
+            self._log_slow_request(request, endpoint, metrics, total_ms)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called after the view returns and before the response is rendered
+        metrics = getattr(request, '_perf_metrics', None)
+        if metrics is not None:
+            request._perf_render_started = metrics.elapsed_ms()
+        return response
+
+    @staticmethod
+    def _endpoint_name(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return f"{request.method} <unresolved>"
+        return f"{request.method} {match.view_name}"
+
+    @staticmethod
+    def _add_server_timing(response, metrics, total_ms):
+        entries = [
+            server_timing_entry('sql', metrics.sql_ms, f"{metrics.query_count} queries"),
+            server_timing_entry(
+                'cache-reads', description=f"{metrics.cache_hits} hits / {metrics.cache_misses} misses"
+            ),
+        ]
+        entries.extend(server_timing_entry(name, duration) for name, duration in metrics.spans.items())
+        entries.append(server_timing_entry('total', total_ms))
+
+        existing = response.get('Server-Timing')
+        if existing:
+            entries.insert(0, existing)
+        response['Server-Timing'] = ', '.join(entries)
+
+    def _log_slow_request(self, request, endpoint, metrics, total_ms):
+        queries = '\n'.join(
+            f"  [{duration:.1f} ms] {sql[:SLOW_QUERY_SQL_LENGTH]}"
+            for duration, sql in metrics.top_queries()
+        )
+        logger.warning(
+            f"Slow request {request.method} {request.get_full_path()} ({endpoint}): {total_ms:.0f} ms, "
+            f"{metrics.query_count} queries in {metrics.sql_ms:.0f} ms, "
+            f"cache {metrics.cache_hits} hits / {metrics.cache_misses} misses"
+            + (f"\nSlowest queries:\n{queries}" if queries else "")
+        )
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.3 on 2026-10-18 23:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    # 0005 and 0008 create tables that 0004 and 0006 already created, so they
+    # can't run on a new database. Databases that applied them keep their
+    # history; new databases run this instead. LedgerPosting already has its
+    # final state and indexes from 0004.
+
+    replaces = [
+        ('transactions', '0005_add_ledger_posting_model'),
+        ('transactions', '0006_categorysuppliermap_and_more'),
+        ('transactions', '0007_fix_missing_indexes'),
+        ('transactions', '0008_create_category_supplier_map_table'),
+    ]
+
+    dependencies = [
+        ('transactions', '0004_alter_bankstatement_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategorySupplierMap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated at')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='supplier_mappings', to='transactions.category', verbose_name='Category')),
+                ('supplier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='category_mapping', to='transactions.supplier', verbose_name='Supplier')),
+            ],
+            options={
+                'verbose_name': 'Category-Supplier Mapping',
+                'verbose_name_plural': 'Category-Supplier Mappings',
+            },
+        ),
+    ]
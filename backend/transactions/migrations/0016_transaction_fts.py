@@ -0,0 +1,92 @@
+from django.db import migrations
+
+# Full-text index over transaction descriptions, ids and the descriptions of
+# the grouped postings in raw_data. Triggers keep it in sync with every write,
+# including QuerySet.update() and bulk_create(). Only SQLite supports FTS5;
+# other databases fall back to LIKE searches.
+
+FTS_TABLE = 'transactions_transaction_fts'
+
+
+def _postings_sql(row):
+    # Imported rows keep postings under value, rows saved by the legacy views under detailed_data
+    paths = ('$.value.groupedPostings', '$.detailed_data.value.groupedPostings')
+    parts = [
+        f"coalesce((SELECT group_concat(json_extract(value, '$.description'), ' ') "
+        f"FROM json_each({row}.raw_data, '{path}') WHERE type = 'object'), '')"
+        for path in paths
+    ]
+    concatenated = " || ' ' || ".join(parts)
+    return f"CASE WHEN json_valid({row}.raw_data) THEN {concatenated} ELSE '' END"
+
+
+def _insert_sql(row):
+    return (
+        f"INSERT INTO {FTS_TABLE}(rowid, description, postings, tripletex_id) "
+        f"VALUES ({row}.id, {row}.description, {_postings_sql(row)}, {row}.tripletex_id);"
+    )
+
+
+FORWARD_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        description, postings, tripletex_id,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, description, postings, tripletex_id)
+    SELECT t.id, t.description, {_postings_sql('t')}, t.tripletex_id
+    FROM transactions_transaction t
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON transactions_transaction BEGIN
+        {_insert_sql('NEW')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON transactions_transaction BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF description, raw_data, tripletex_id
+    ON transactions_transaction BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+        {_insert_sql('NEW')}
+    END
+    """,
+]
+
+REVERSE_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def create_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in FORWARD_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in REVERSE_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0015_alter_category_budget'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
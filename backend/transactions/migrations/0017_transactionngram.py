@@ -0,0 +1,60 @@
+# Generated by Django 4.2.3 on 2026-10-18 21:28
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+NGRAM_SIZE = 3
+BATCH_SIZE = 1000
+
+
+def description_ngrams(text):
+    # Mirrors services.similarity_service.description_ngrams, frozen for this migration
+    text = re.sub(r'[\d\W_]+', ' ', (text or '').lower()).strip()
+    if not text:
+        return set()
+    padded = f' {text} '
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+def backfill_ngrams(apps, schema_editor):
+    Transaction = apps.get_model('transactions', 'Transaction')
+    TransactionNgram = apps.get_model('transactions', 'TransactionNgram')
+    rows = Transaction.objects.order_by().values_list('id', 'description').iterator(chunk_size=BATCH_SIZE)
+
+    postings = []
+    for transaction_id, description in rows:
+        postings.extend(
+            TransactionNgram(transaction_id=transaction_id, gram=gram)
+            for gram in description_ngrams(description)
+        )
+        if len(postings) >= BATCH_SIZE:
+            TransactionNgram.objects.bulk_create(postings)
+            postings = []
+    if postings:
+        TransactionNgram.objects.bulk_create(postings)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0016_transaction_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionNgram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=8, verbose_name='N-gram')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ngrams', to='transactions.transaction', verbose_name='Transaction')),
+            ],
+            options={
+                'verbose_name': 'Transaction N-gram',
+                'verbose_name_plural': 'Transaction N-grams',
+                'indexes': [models.Index(fields=['gram', 'transaction'], name='transaction_gram_e03c4b_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_ngrams, migrations.RunPython.noop),
+    ]
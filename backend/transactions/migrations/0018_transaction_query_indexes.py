@@ -0,0 +1,41 @@
+# Generated by Django 4.2.3 on 2026-10-18 21:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0017_transactionngram'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_should__af73ea_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_categor_e3f163_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_supplie_492ef9_idx',
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['category', 'date'], name='transaction_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['should_process', 'date'], name='transaction_process_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('amount__lt', 0), ('is_internal_transfer', False)), fields=['category', 'date', 'amount'], name='transaction_expense_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['supplier', '-date'], name='transaction_supplier_date_idx'),
+        ),
+    ]
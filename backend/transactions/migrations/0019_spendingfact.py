@@ -0,0 +1,83 @@
+# Generated by Django 4.2.3 on 2026-10-18 21:38
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def backfill_spending_facts(apps, schema_editor):
+    # Mirrors services.facts_service.fact_from_row, frozen for this migration
+    Transaction = apps.get_model('transactions', 'Transaction')
+    SpendingFact = apps.get_model('transactions', 'SpendingFact')
+    rows = Transaction.objects.order_by().values_list(
+        'id', 'date', 'amount', 'category_id', 'supplier_id', 'bank_account_id', 'ledger_account_id',
+        'is_internal_transfer', 'is_wage_transfer', 'is_tax_transfer', 'is_forbidden',
+    ).iterator(chunk_size=BATCH_SIZE)
+
+    facts = []
+    for (transaction_id, date, amount, category_id, supplier_id, bank_account_id, ledger_account_id,
+         is_internal_transfer, is_wage_transfer, is_tax_transfer, is_forbidden) in rows:
+        amount_minor = int((Decimal(str(amount)) * 100).to_integral_value())
+        iso_year, iso_week, _ = date.isocalendar()
+        facts.append(SpendingFact(
+            transaction_id=transaction_id,
+            date=date,
+            year=date.year,
+            month_key=date.year * 100 + date.month,
+            week_key=iso_year * 100 + iso_week,
+            amount_minor=amount_minor,
+            abs_amount_minor=abs(amount_minor),
+            is_spend=amount_minor < 0 and not (
+                is_internal_transfer or is_wage_transfer or is_tax_transfer or is_forbidden
+            ),
+            category_id=category_id,
+            supplier_id=supplier_id,
+            bank_account_id=bank_account_id,
+            ledger_account_id=ledger_account_id,
+        ))
+        if len(facts) >= BATCH_SIZE:
+            SpendingFact.objects.bulk_create(facts)
+            facts = []
+    if facts:
+        SpendingFact.objects.bulk_create(facts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0018_transaction_query_indexes'),
+    ]
+
+    operations = [
+        # The budget reads spending facts now
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_expense_idx',
+        ),
+        migrations.CreateModel(
+            name='SpendingFact',
+            fields=[
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='spending_fact', serialize=False, to='transactions.transaction', verbose_name='Transaction')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='Year')),
+                ('month_key', models.PositiveIntegerField(help_text='Year and month as YYYYMM', verbose_name='Month key')),
+                ('week_key', models.PositiveIntegerField(help_text='ISO year and week as YYYYWW', verbose_name='Week key')),
+                ('amount_minor', models.BigIntegerField(verbose_name='Amount (minor units)')),
+                ('abs_amount_minor', models.BigIntegerField(verbose_name='Absolute amount (minor units)')),
+                ('is_spend', models.BooleanField(help_text='Negative amount that is not a transfer or forbidden', verbose_name='Is spend')),
+                ('bank_account', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='transactions.bankaccount', verbose_name='Bank account')),
+                ('category', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='transactions.category', verbose_name='Category')),
+                ('ledger_account', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='transactions.account', verbose_name='Ledger account')),
+                ('supplier', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='transactions.supplier', verbose_name='Supplier')),
+            ],
+            options={
+                'verbose_name': 'Spending fact',
+                'verbose_name_plural': 'Spending facts',
+                'indexes': [models.Index(condition=models.Q(('is_spend', True)), fields=['month_key', 'category', 'abs_amount_minor', 'is_spend'], name='spendingfact_spend_month_idx'), models.Index(fields=['date', 'category', 'bank_account', 'amount_minor'], name='spendingfact_date_idx'), models.Index(fields=['category', 'date', 'amount_minor'], name='spendingfact_category_idx'), models.Index(fields=['supplier'], name='spendingfact_supplier_idx'), models.Index(fields=['bank_account'], name='spendingfact_bank_account_idx'), models.Index(fields=['ledger_account'], name='spendingfact_ledger_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_spending_facts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+def backfill_is_expense(apps, schema_editor):
+    # Mirrors services.facts_service.fact_from_row, frozen for this migration
+    SpendingFact = apps.get_model('transactions', 'SpendingFact')
+    SpendingFact.objects.filter(
+        amount_minor__lt=0,
+        transaction__is_internal_transfer=False
+    ).update(is_expense=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0019_spendingfact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='spendingfact',
+            name='is_expense',
+            field=models.BooleanField(default=False, help_text='Negative amount that is not an internal transfer', verbose_name='Is expense'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_is_expense, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='spendingfact',
+            name='spendingfact_spend_month_idx',
+        ),
+        migrations.AddIndex(
+            model_name='spendingfact',
+            index=models.Index(condition=models.Q(('is_expense', True)), fields=['month_key', 'category', 'abs_amount_minor', 'is_expense'], name='spendingfact_expense_month_idx'),
+        ),
+    ]
@@ -1,11 +1,17 @@
 """
 Models for the transactions application.
 """
-from django.db import models
+from django.db import models, transaction
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.sql.where import WhereNode
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 
+from .utils.cache import GenerationTrackingQuerySet
+from .utils.search import search_transactions
+
 class TimeStampedModel(models.Model):
     """
     Abstract base model that provides created_at and updated_at fields.
@@ -13,6 +19,8 @@ class TimeStampedModel(models.Model):
     created_at = models.DateTimeField(_("Created at"), default=timezone.now)
     updated_at = models.DateTimeField(_("Updated at"), auto_now=True)
 
+    objects = GenerationTrackingQuerySet.as_manager()
+
     class Meta:
         abstract = True
 
@@ -91,6 +99,14 @@ class BankStatement(TimeStampedModel):
     
     def __str__(self):
         return f"{self.date} - {self.description} ({self.amount})"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save receiver re-index the description only when it changed
+        if 'description' in field_names:
+            instance._indexed_description = instance.description
+        return instance
 
 class Supplier(TimeStampedModel):
     """
@@ -210,6 +226,182 @@ class Account(TimeStampedModel):
         else:
             return f"Account {self.tripletex_id}"
 
+class TransactionQuerySet(GenerationTrackingQuerySet):
+    """
+    QuerySet with explicit query shapes for the transaction read paths.
+    
+    raw_data can be large and is only needed when a single transaction is
+    inspected, so the list and analytics shapes never select it.
+    """
+    # Columns rendered by the list serializer
+    LIST_FIELDS = (
+        'id', 'tripletex_id', 'description', 'amount', 'date',
+        'bank_account', 'account_id', 'category', 'supplier',
+        'is_internal_transfer', 'is_wage_transfer', 'is_tax_transfer',
+        'is_forbidden', 'should_process', 'imported_at', 'updated_at',
+    )
+    # Columns needed to filter and aggregate spending
+    ANALYTICS_FIELDS = (
+        'id', 'amount', 'date', 'category', 'bank_account', 'supplier', 'ledger_account',
+        'is_internal_transfer', 'is_wage_transfer', 'is_tax_transfer',
+        'is_forbidden', 'should_process',
+    )
+    
+    # Related columns behind the name fields of the list serializer
+    RELATED_LIST_FIELDS = {
+        'category_name': 'category__name',
+        'bank_account_name': 'bank_account__name',
+        'supplier_name': 'supplier__name',
+        'ledger_account_detail': ('ledger_account__name', 'ledger_account__account_number'),
+    }
+    # Serializer fields that read a column under a different name
+    FIELD_COLUMNS = {
+        'bank_account_id': 'bank_account',
+    }
+    
+    def list_shape(self, fields=None):
+        """
+        Shape for paginated lists: row columns plus related names, no raw_data.
+        
+        Args:
+            fields (iterable, optional): Serializer fields that will be rendered.
+                Defaults to every list field; only the relations these fields
+                need are joined.
+        """
+        if fields is None:
+            fields = self.LIST_FIELDS + ('category_name', 'bank_account_name', 'supplier_name')
+        
+        columns = {'id'}
+        related_columns = []
+        for field in fields:
+            field = self.FIELD_COLUMNS.get(field, field)
+            if field in self.LIST_FIELDS:
+                columns.add(field)
+            elif field in self.RELATED_LIST_FIELDS:
+                related = self.RELATED_LIST_FIELDS[field]
+                related_columns.extend((related,) if isinstance(related, str) else related)
+        
+        relations = sorted({column.split('__')[0] for column in related_columns})
+        queryset = self.select_related(*relations) if relations else self
+        return queryset.only(*columns, *relations, *related_columns)
+    
+    def detail_shape(self):
+        """
+        Shape for a single transaction, including raw_data.
+        """
+        return self.select_related(
+            'category', 'bank_account', 'supplier', 'ledger_account'
+        )
+    
+    def analytics_shape(self):
+        """
+        Shape for aggregations: only the columns used in filters and group-bys.
+        """
+        return self.only(*self.ANALYTICS_FIELDS)
+    
+    def update(self, **kwargs):
+        # Local import: the services import this module
+        from .services.facts_service import (
+            SOURCE_FIELD_NAMES, COPIED_FIELD_NAMES, copy_to_spending_facts, sync_spending_facts
+        )
+        from .services.similarity_service import index_transactions
+        # auto_now only applies to save(); the snapshot service relies on
+        # updated_at to find changed rows
+        kwargs.setdefault('updated_at', timezone.now())
+        changed = SOURCE_FIELD_NAMES.intersection(kwargs)
+        reindex = 'description' in kwargs
+        if not changed and not reindex:
+            return super().update(**kwargs)
+        
+        # Derived rows are written with subqueries over this filter, so no ids
+        # are loaded. Plain foreign key values are copied to the facts before
+        # the UPDATE, while the filter still matches the same rows; facts are
+        # otherwise recomputed, and n-grams rebuilt, after it.
+        with transaction.atomic(using=self.db):
+            if changed and changed <= COPIED_FIELD_NAMES and not any(
+                hasattr(kwargs[field], 'resolve_expression') for field in changed
+            ):
+                copy_to_spending_facts(self, {field: kwargs[field] for field in changed})
+                changed = set()
+            if not changed and not reindex:
+                return super().update(**kwargs)
+            
+            if not self._filter_reads(changed | ({'description'} if reindex else set())):
+                rows = super().update(**kwargs)
+                if changed:
+                    sync_spending_facts(self)
+                if reindex:
+                    index_transactions(self)
+                return rows
+            
+            # The filter may match other rows once the update ran
+            transaction_ids = list(self.values_list('id', flat=True))
+            rows = super().update(**kwargs)
+            if changed:
+                sync_spending_facts(transaction_ids)
+            if reindex:
+                for start in range(0, len(transaction_ids), 1000):
+                    index_transactions(self.model.objects.filter(id__in=transaction_ids[start:start + 1000]))
+            return rows
+    
+    update.alters_data = True
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        from .services.facts_service import sync_spending_facts
+        created = super().bulk_create(objs, *args, **kwargs)
+        sync_spending_facts(obj.pk for obj in created if obj.pk is not None)
+        return created
+    
+    def _filter_reads(self, fields):
+        """
+        Check whether the filter may depend on any of the given fields.
+        
+        Conservative: joins, expressions and subqueries count as reads.
+        
+        Args:
+            fields (iterable): Field names, e.g. the keys passed to update()
+            
+        Returns:
+            bool: True unless the filter only compares other columns of
+                this table with plain values
+        """
+        if len(self.query.alias_map) > 1:
+            return True
+        columns = {self.model._meta.get_field(name).column for name in fields}
+        
+        def reads(node):
+            if isinstance(node, WhereNode):
+                return any(reads(child) for child in node.children)
+            if not isinstance(node, Lookup) or hasattr(node.rhs, 'resolve_expression'):
+                return True
+            return not isinstance(node.lhs, Col) or node.lhs.target.column in columns
+        
+        return reads(self.query.where)
+    
+    def needs_supplier(self):
+        """
+        Transactions the supplier matchers should look at: no supplier yet,
+        and not a transfer or forbidden. Served newest first by
+        transaction_supplier_date_idx.
+        """
+        return self.filter(
+            supplier__isnull=True,
+            is_internal_transfer=False,
+            is_wage_transfer=False,
+            is_tax_transfer=False,
+            is_forbidden=False,
+        )
+    
+    def search(self, term, rank=False):
+        """
+        Full-text search over description, posting descriptions and Tripletex id.
+        
+        Args:
+            term (str): The search input; every word is matched as a prefix
+            rank (bool): Order by relevance instead of keeping the current ordering
+        """
+        return search_transactions(self, term, rank=rank)
+
 class Transaction(TimeStampedModel):
     """
     Model to store financial transactions.
@@ -283,6 +475,8 @@ class Transaction(TimeStampedModel):
     # Import metadata
     imported_at = models.DateTimeField(_("Imported at"), default=timezone.now)
     
+    objects = TransactionQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _("Transaction")
         verbose_name_plural = _("Transactions")
@@ -292,17 +486,30 @@ class Transaction(TimeStampedModel):
             models.Index(fields=['date']),
             models.Index(fields=['legacy_bank_account_id']),
             models.Index(fields=['account_id']),
-            models.Index(fields=['should_process']),
             models.Index(fields=['is_internal_transfer']),
             models.Index(fields=['is_wage_transfer']),
             models.Index(fields=['is_tax_transfer']),
-            models.Index(fields=['category']),
-            models.Index(fields=['supplier']),
             models.Index(fields=['ledger_account']),
+            # Composite and partial indexes for the hot query shapes. The
+            # plans are checked by QueryPlanTests in tests.py.
+            # Summaries and lists filtered on category and a date range
+            models.Index(fields=['category', 'date'], name='transaction_category_date_idx'),
+            # Lists and analytics restricted to processable transactions
+            models.Index(fields=['should_process', 'date'], name='transaction_process_date_idx'),
+            # Supplier matchers: supplier IS NULL, newest first, without a sort step
+            models.Index(fields=['supplier', '-date'], name='transaction_supplier_date_idx'),
         ]
     
     def __str__(self):
         return f"{self.date} - {self.description} ({self.amount})"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the post_save receiver re-index the description only when it changed
+        if 'description' in field_names:
+            instance._indexed_description = instance.description
+        return instance
 
 class TransactionAccount(TimeStampedModel):
     """
@@ -398,6 +605,24 @@ class LedgerPosting(TimeStampedModel):
     def __str__(self):
         return f"Posting {self.posting_id} ({self.date}): {self.description or 'No description'} - {self.amount}"
 
+class CategorySupplierMapQuerySet(GenerationTrackingQuerySet):
+    """
+    QuerySet for supplier-category mappings.
+    """
+    
+    def current(self):
+        """
+        Each supplier's most recently saved mapping.
+        
+        Mappings are unique per (supplier, category), so older tools can
+        leave several per supplier; the latest one decides the category.
+        """
+        newer = CategorySupplierMap.objects.filter(supplier=models.OuterRef('supplier')).filter(
+            models.Q(updated_at__gt=models.OuterRef('updated_at'))
+            | models.Q(updated_at=models.OuterRef('updated_at'), id__gt=models.OuterRef('id'))
+        )
+        return self.filter(~models.Exists(newer))
+
 class CategorySupplierMap(TimeStampedModel):
     """
     Model to map suppliers to categories.
@@ -416,6 +641,8 @@ class CategorySupplierMap(TimeStampedModel):
         verbose_name=_("Category")
     )
     
+    objects = CategorySupplierMapQuerySet.as_manager()
+    
     class Meta:
         verbose_name = _("Category-Supplier Mapping")
         verbose_name_plural = _("Category-Supplier Mappings")
@@ -423,3 +650,104 @@ class CategorySupplierMap(TimeStampedModel):
         
     def __str__(self):
         return f"{self.supplier.name} -> {self.category.name}"
+
+class TransactionNgram(models.Model):
+    """
+    Inverted index posting for transaction similarity search.
+    One row per distinct character n-gram of a transaction's normalized description.
+    """
+    gram = models.CharField(_("N-gram"), max_length=8)
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name='ngrams',
+        verbose_name=_("Transaction")
+    )
+    
+    class Meta:
+        verbose_name = _("Transaction N-gram")
+        verbose_name_plural = _("Transaction N-grams")
+        indexes = [
+            # Postings lookup: all transactions containing a gram
+            models.Index(fields=['gram', 'transaction']),
+        ]
+    
+    def __str__(self):
+        return f"{self.gram!r} -> {self.transaction_id}"
+
+class SpendingFact(models.Model):
+    """
+    Narrow, denormalized copy of a transaction for analytics.
+    
+    One row per transaction, kept in sync by services.facts_service. Amounts
+    are integer minor units (øre), period keys are precomputed and is_spend
+    and is_expense mark outgoing money, so analytics never re-derive them
+    per query.
+    """
+    transaction = models.OneToOneField(
+        Transaction,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='spending_fact',
+        verbose_name=_("Transaction")
+    )
+    date = models.DateField(_("Date"))
+    year = models.PositiveSmallIntegerField(_("Year"))
+    month_key = models.PositiveIntegerField(_("Month key"), help_text=_("Year and month as YYYYMM"))
+    week_key = models.PositiveIntegerField(_("Week key"), help_text=_("ISO year and week as YYYYWW"))
+    amount_minor = models.BigIntegerField(_("Amount (minor units)"))
+    abs_amount_minor = models.BigIntegerField(_("Absolute amount (minor units)"))
+    is_spend = models.BooleanField(
+        _("Is spend"),
+        help_text=_("Negative amount that is not a transfer or forbidden")
+    )
+    is_expense = models.BooleanField(
+        _("Is expense"),
+        help_text=_("Negative amount that is not an internal transfer")
+    )
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', db_index=False, verbose_name=_("Category")
+    )
+    supplier = models.ForeignKey(
+        Supplier, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', db_index=False, verbose_name=_("Supplier")
+    )
+    bank_account = models.ForeignKey(
+        BankAccount, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', db_index=False, verbose_name=_("Bank account")
+    )
+    ledger_account = models.ForeignKey(
+        Account, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', db_index=False, verbose_name=_("Ledger account")
+    )
+    
+    class Meta:
+        verbose_name = _("Spending fact")
+        verbose_name_plural = _("Spending facts")
+        indexes = [
+            # Covering indexes, so the hot aggregates never read the table
+            # Budget and monthly reports: expenses per category and month
+            # Partial, since SQLite can't seek on a bare boolean column;
+            # is_expense is repeated as a column to keep the index covering
+            models.Index(
+                fields=['month_key', 'category', 'abs_amount_minor', 'is_expense'],
+                condition=models.Q(is_expense=True),
+                name='spendingfact_expense_month_idx'
+            ),
+            # Summaries over a date range, per category and bank account
+            models.Index(
+                fields=['date', 'category', 'bank_account', 'amount_minor'],
+                name='spendingfact_date_idx'
+            ),
+            models.Index(
+                fields=['category', 'date', 'amount_minor'],
+                name='spendingfact_category_idx'
+            ),
+            models.Index(fields=['supplier'], name='spendingfact_supplier_idx'),
+            models.Index(fields=['bank_account'], name='spendingfact_bank_account_idx'),
+            models.Index(fields=['ledger_account'], name='spendingfact_ledger_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.month_key} - {self.amount_minor} ({self.transaction_id})"
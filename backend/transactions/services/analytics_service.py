@@ -0,0 +1,326 @@
+"""
+Service layer for dashboard analytics.
+Aggregates transactions in the database so charts receive small, pre-shaped payloads.
+"""
+import logging
+from datetime import date, timedelta
+
+from django.db.models import Sum, Count
+from django.db.models.functions import Abs, Trunc
+
+from .snapshot_service import get_snapshot, UnsupportedFilter
+from .transaction_service import get_all_transactions
+from ..constants import (
+    TIMESERIES_GRANULARITIES, TIMESERIES_MAX_PERIODS, ANALYTICS_GROUP_BY_FIELDS, TREEMAP_LEVELS, TREEMAP_DEFAULT_TOP
+)
+
+logger = logging.getLogger('transactions')
+
+# Label used for rows whose group is not set, per group-by field
+UNASSIGNED_LABELS = {
+    'category': 'Uncategorized',
+    'bank_account': 'Unknown',
+    'supplier': 'Unknown supplier',
+    'ledger_account': 'Unknown account',
+}
+
+OTHER_KEY = 'other'
+OTHER_LABEL = 'Other'
+
+
+def _add_months(value, months):
+    month_index = value.month - 1 + months
+    return value.replace(year=value.year + month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def _period_start(value, granularity):
+    """
+    Truncate a date to the start of its period, matching the database Trunc().
+    """
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    if granularity == 'month':
+        return value.replace(day=1)
+    if granularity == 'quarter':
+        return value.replace(month=3 * ((value.month - 1) // 3) + 1, day=1)
+    return value
+
+
+def _next_period(value, granularity):
+    if granularity == 'week':
+        return value + timedelta(days=7)
+    if granularity == 'month':
+        return _add_months(value, 1)
+    if granularity == 'quarter':
+        return _add_months(value, 3)
+    return value + timedelta(days=1)
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value))
+
+
+def _period_axis(first, last, granularity):
+    """
+    Build the list of period starts from first to last, inclusive.
+
+    Raises:
+        ValueError: If the axis would have more than TIMESERIES_MAX_PERIODS periods
+    """
+    periods = []
+    current = _period_start(first, granularity)
+    last = _period_start(last, granularity)
+    while current <= last:
+        if len(periods) >= TIMESERIES_MAX_PERIODS:
+            raise ValueError(
+                f"More than {TIMESERIES_MAX_PERIODS} {granularity} periods; "
+                f"use a coarser granularity or a shorter date range"
+            )
+        periods.append(current)
+        current = _next_period(current, granularity)
+    return periods
+
+
+def _group_label(group_by, group_id, name):
+    if group_id is None:
+        return UNASSIGNED_LABELS[group_by]
+    return name or f"{group_by.replace('_', ' ').title()} {group_id}"
+
+
+def _timeseries_rows(filters, granularity, group_by):
+    """
+    Get (period, group id, group name, total, count) rows from one grouped query.
+    """
+    transactions = get_all_transactions(filters).order_by()
+
+    group_columns = []
+    if group_by:
+        group_columns = [f'{group_by}_id', f'{group_by}__name']
+
+    rows = transactions.annotate(
+        period=Trunc('date', granularity)
+    ).values('period', *group_columns).annotate(
+        total=Sum('amount'),
+        count=Count('id')
+    ).order_by('period')
+
+    return [
+        (
+            row['period'],
+            row[f'{group_by}_id'] if group_by else None,
+            row[f'{group_by}__name'] if group_by else None,
+            float(row['total'] or 0),
+            row['count'],
+        )
+        for row in rows
+    ]
+
+
+def get_transaction_timeseries(filters=None, granularity='month', group_by=None, top=None):
+    """
+    Get zero-filled transaction totals per period, optionally split into series.
+
+    All totals come from one GROUP BY over the truncated date (and the group
+    column), so the cost does not depend on how many transactions each
+    period holds. The in-memory snapshot answers it when enabled.
+
+    Args:
+        filters (dict): Optional filters, as accepted by get_all_transactions
+        granularity (str): One of 'day', 'week', 'month' or 'quarter'
+        group_by (str): Optional 'category', 'bank_account', 'supplier' or 'ledger_account'
+        top (int): Keep only the top N series by absolute total and merge the rest into 'Other'
+
+    Returns:
+        dict: Period starts and aligned series of totals and counts
+    """
+    if granularity not in TIMESERIES_GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+    if group_by is not None and group_by not in ANALYTICS_GROUP_BY_FIELDS:
+        raise ValueError(f"Unsupported group_by: {group_by}")
+
+    filters = filters or {}
+    date_from, date_to = _parse_date(filters.get('date_from')), _parse_date(filters.get('date_to'))
+    if date_from and date_to:
+        # Reject an oversized axis before running the query
+        _period_axis(date_from, date_to, granularity)
+
+    rows = None
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        try:
+            rows = snapshot.timeseries_rows(filters, granularity, group_by)
+        except UnsupportedFilter:
+            pass
+    if rows is None:
+        rows = _timeseries_rows(filters, granularity, group_by)
+
+    # Collect totals per series and period
+    series = {}
+    seen_periods = set()
+    for period, key, name, total, count in rows:
+        seen_periods.add(period)
+        if group_by:
+            name = _group_label(group_by, key, name)
+        else:
+            key, name = 'all', 'All transactions'
+
+        entry = series.setdefault(key, {'key': key, 'name': name, 'values': {}})
+        entry['values'][period] = (total, count)
+
+    # Align every series on the same axis; filter bounds win over data bounds
+    first = date_from or (min(seen_periods) if seen_periods else None)
+    last = date_to or (max(seen_periods) if seen_periods else None)
+    periods = _period_axis(first, last, granularity) if first and last else []
+
+    series_list = sorted(
+        series.values(),
+        key=lambda entry: abs(sum(total for total, _ in entry['values'].values())),
+        reverse=True
+    )
+    if top is not None and len(series_list) > top:
+        other = {'key': OTHER_KEY, 'name': OTHER_LABEL, 'values': {}}
+        for entry in series_list[top:]:
+            for period, (total, count) in entry['values'].items():
+                other_total, other_count = other['values'].get(period, (0.0, 0))
+                other['values'][period] = (other_total + total, other_count + count)
+        series_list = series_list[:top] + [other]
+
+    result_series = []
+    for entry in series_list:
+        totals = []
+        counts = []
+        for period in periods:
+            total, count = entry['values'].get(period, (0.0, 0))
+            totals.append(round(total, 2))
+            counts.append(count)
+        result_series.append({
+            'key': entry['key'],
+            'name': entry['name'],
+            'total': round(sum(totals), 2),
+            'totals': totals,
+            'counts': counts
+        })
+
+    return {
+        'granularity': granularity,
+        'group_by': group_by,
+        'periods': [period.isoformat() for period in periods],
+        'series': result_series
+    }
+
+
+def _prune_nodes(nodes, top):
+    """
+    Sort nodes by value and merge everything after the first `top` into 'Other'.
+    """
+    nodes = sorted(nodes, key=lambda node: node['value'], reverse=True)
+    if top is None or len(nodes) <= top:
+        return nodes
+
+    other = {'key': OTHER_KEY, 'name': OTHER_LABEL, 'value': 0.0, 'count': 0, 'children': []}
+    for node in nodes[top:]:
+        other['value'] += node['value']
+        other['count'] += node['count']
+    other['value'] = round(other['value'], 2)
+    return nodes[:top] + [other]
+
+
+def _build_tree(tree, top):
+    """
+    Convert the nested accumulation dicts into sorted, pruned node lists.
+    """
+    nodes = []
+    for node in tree.values():
+        children = node.pop('children')
+        node['value'] = round(node['value'], 2)
+        node['children'] = _build_tree(children, top) if children else []
+        nodes.append(node)
+    return _prune_nodes(nodes, top)
+
+
+def get_transaction_treemap(filters=None, depth=3, top=TREEMAP_DEFAULT_TOP, include_transfers=False, direction='expense'):
+    """
+    Get nested spending sums for category -> supplier -> ledger account.
+
+    The sums come from one grouped query over the three columns. Each level
+    keeps its `top` largest children and merges the rest into an 'Other'
+    node, so the payload is bounded by top ** depth nodes no matter how many
+    transactions match.
+
+    Args:
+        filters (dict): Optional filters, as accepted by get_all_transactions
+        depth (int): Number of levels to return (1-3)
+        top (int): Maximum number of children kept per node, or None for all
+        include_transfers (bool): Include internal, wage and tax transfers and
+            transactions marked as not to be processed
+        direction (str): 'expense' for negative amounts, 'income' for positive
+            amounts or 'all'. Values are always absolute amounts.
+
+    Returns:
+        dict: Total value and count, and the nested children
+    """
+    if depth < 1 or depth > len(TREEMAP_LEVELS):
+        raise ValueError(f"depth must be between 1 and {len(TREEMAP_LEVELS)}")
+    if direction not in ('expense', 'income', 'all'):
+        raise ValueError(f"Unsupported direction: {direction}")
+
+    transactions = get_all_transactions(filters).order_by()
+    if not include_transfers:
+        transactions = transactions.filter(
+            is_internal_transfer=False,
+            is_wage_transfer=False,
+            is_tax_transfer=False,
+            should_process=True
+        )
+    if direction == 'expense':
+        transactions = transactions.filter(amount__lt=0)
+    elif direction == 'income':
+        transactions = transactions.filter(amount__gt=0)
+
+    levels = TREEMAP_LEVELS[:depth]
+    columns = []
+    for level in levels:
+        columns += [f'{level}_id', f'{level}__name']
+    if 'ledger_account' in levels:
+        columns.append('ledger_account__account_number')
+
+    rows = transactions.values(*columns).annotate(
+        value=Sum(Abs('amount')),
+        count=Count('id')
+    )
+
+    tree = {}
+    total_value = 0.0
+    total_count = 0
+    for row in rows:
+        value = float(row['value'] or 0)
+        total_value += value
+        total_count += row['count']
+
+        children = tree
+        for level in levels:
+            key = row[f'{level}_id']
+            name = row[f'{level}__name']
+            if level == 'ledger_account' and key is not None:
+                name = name or row['ledger_account__account_number']
+            node = children.setdefault(key, {
+                'key': key,
+                'name': _group_label(level, key, name),
+                'value': 0.0,
+                'count': 0,
+                'children': {}
+            })
+            node['value'] += value
+            node['count'] += row['count']
+            children = node['children']
+
+    return {
+        'levels': levels,
+        'value': round(total_value, 2),
+        'count': total_count,
+        'children': _build_tree(tree, top)
+    }
@@ -3,8 +3,10 @@ Service layer for category-related operations.
 Handles business logic for categories.
 """
 import logging
-from django.db.models import Count
-from ..models import Category, Transaction
+from django.db import transaction
+from django.db.models import Count, Q
+from ..models import Category, Transaction, CategorySupplierMap
+from ..constants import UNCATEGORIZED_CATEGORY_NAME
 
 logger = logging.getLogger('transactions')
 
@@ -216,4 +218,71 @@ def initialize_default_categories():
             created_count += 1
     
     logger.info(f"Initialized {created_count} default categories")
-    return created_count 
\ No newline at end of file
+    return created_count 
+
+def get_supplier_category_map():
+    """
+    Load the supplier -> category map, e.g. once per import run.
+    
+    Returns:
+        dict: Supplier id -> category id of the supplier's current mapping
+    """
+    return dict(CategorySupplierMap.objects.current().values_list('supplier_id', 'category_id'))
+
+def mapped_category_id(category_map, supplier_id, category_id, default_category_id=None):
+    """
+    Pick the category of a transaction being imported.
+    
+    The supplier's mapping replaces a missing or default category, but
+    never a category someone has chosen.
+    
+    Args:
+        category_map (dict): From get_supplier_category_map()
+        supplier_id (int): The transaction's supplier, or None
+        category_id (int): The transaction's current category, or None
+        default_category_id (int, optional): Category imports start in
+        
+    Returns:
+        int: The category id to store
+    """
+    if category_id is not None and category_id != default_category_id:
+        return category_id
+    return category_map.get(supplier_id, category_id if category_id is not None else default_category_id)
+
+def reapply_supplier_category_map(queryset=None, overwrite=False, dry_run=False):
+    """
+    Assign every mapped supplier's category to its transactions.
+    
+    Runs one UPDATE per category, with the mapped suppliers in a subquery.
+    
+    Args:
+        queryset (QuerySet, optional): Transactions to consider; defaults to all
+        overwrite (bool): Also replace categories other than the default one
+        dry_run (bool): Count the transactions without changing them
+        
+    Returns:
+        dict: Category id -> number of transactions (to be) updated
+    """
+    if queryset is None:
+        queryset = Transaction.objects.all()
+    
+    if not overwrite:
+        default_ids = Category.objects.filter(name=UNCATEGORIZED_CATEGORY_NAME).values('id')
+        queryset = queryset.filter(Q(category__isnull=True) | Q(category_id__in=default_ids))
+    
+    current = CategorySupplierMap.objects.current()
+    category_ids = current.values_list('category_id', flat=True).distinct().order_by()
+    
+    updated = {}
+    with transaction.atomic():
+        for category_id in category_ids:
+            targets = queryset.filter(
+                supplier_id__in=current.filter(category_id=category_id).values('supplier_id')
+            ).exclude(category_id=category_id)
+            updated[category_id] = targets.count() if dry_run else targets.update(category_id=category_id)
+    
+    logger.info(
+        f"{'Would reapply' if dry_run else 'Reapplied'} supplier category map to "
+        f"{sum(updated.values())} transactions"
+    )
+    return updated
@@ -0,0 +1,180 @@
+"""
+Service layer for the denormalized spending facts used by analytics.
+
+Every transaction has one SpendingFact row holding its amount in minor
+units, precomputed period keys, its foreign keys and the is_spend and
+is_expense flags. The
+facts are rewritten whenever a transaction is saved, updated in bulk or
+bulk-created (see signals.py and TransactionQuerySet).
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.db.models import QuerySet
+
+from ..models import Transaction, SpendingFact
+
+logger = logging.getLogger('transactions')
+
+MINOR_UNITS = 100
+SYNC_BATCH_SIZE = 1000
+
+# Transaction columns a fact is derived from, in the order fact_from_row expects
+SOURCE_FIELDS = (
+    'id', 'date', 'amount', 'category_id', 'supplier_id', 'bank_account_id', 'ledger_account_id',
+    'is_internal_transfer', 'is_wage_transfer', 'is_tax_transfer', 'is_forbidden',
+)
+# Writes to any other field leave the facts unchanged
+SOURCE_FIELD_NAMES = frozenset(
+    field.removesuffix('_id') for field in SOURCE_FIELDS
+) | frozenset(SOURCE_FIELDS)
+# Foreign keys copied to the facts as they are, under the same names
+COPIED_FIELD_NAMES = frozenset(
+    name for field in ('category', 'supplier', 'bank_account', 'ledger_account')
+    for name in (field, f'{field}_id')
+)
+
+
+def to_minor_units(amount):
+    """
+    Convert an amount to integer minor units.
+
+    Args:
+        amount (Decimal, float, int or str): Amount in major units
+
+    Returns:
+        int: Amount in minor units, e.g. -100.50 -> -10050
+    """
+    return int((Decimal(str(amount)) * MINOR_UNITS).to_integral_value())
+
+
+def fact_from_row(row):
+    """
+    Build an unsaved SpendingFact from a row of SOURCE_FIELDS values.
+    """
+    (transaction_id, date, amount, category_id, supplier_id, bank_account_id, ledger_account_id,
+     is_internal_transfer, is_wage_transfer, is_tax_transfer, is_forbidden) = row
+    amount_minor = to_minor_units(amount)
+    iso_year, iso_week, _ = date.isocalendar()
+    return SpendingFact(
+        transaction_id=transaction_id,
+        date=date,
+        year=date.year,
+        month_key=date.year * 100 + date.month,
+        week_key=iso_year * 100 + iso_week,
+        amount_minor=amount_minor,
+        abs_amount_minor=abs(amount_minor),
+        is_spend=amount_minor < 0 and not (
+            is_internal_transfer or is_wage_transfer or is_tax_transfer or is_forbidden
+        ),
+        # Wage and tax transfers and forbidden transactions are still expenses
+        is_expense=amount_minor < 0 and not is_internal_transfer,
+        category_id=category_id,
+        supplier_id=supplier_id,
+        bank_account_id=bank_account_id,
+        ledger_account_id=ledger_account_id,
+    )
+
+
+def _delete_facts(queryset):
+    # A plain DELETE. QuerySet.delete() would load every fact to send
+    # post_delete, and bump the cache generation once per row; facts are
+    # derived data that no cached response is keyed on.
+    return queryset._raw_delete(queryset.db)
+
+
+def _sync_batch(transaction_ids):
+    rows = Transaction.objects.filter(id__in=transaction_ids).order_by().values_list(*SOURCE_FIELDS)
+    facts = [fact_from_row(row) for row in rows]
+    with db_transaction.atomic():
+        _delete_facts(SpendingFact.objects.filter(transaction_id__in=transaction_ids))
+        SpendingFact.objects.bulk_create(facts, batch_size=SYNC_BATCH_SIZE)
+    return len(facts)
+
+
+def sync_spending_facts(transactions):
+    """
+    Rewrite the facts of the given transactions.
+
+    Ids of deleted transactions are ignored; their facts are removed by the
+    cascade.
+
+    Args:
+        transactions (QuerySet or iterable): Transaction queryset, whose
+            facts are rewritten with a subquery over its filter, or ids
+
+    Returns:
+        int: Number of facts written
+    """
+    if isinstance(transactions, QuerySet):
+        return _sync_queryset(transactions)
+    transaction_ids = list(transactions)
+    written = 0
+    for start in range(0, len(transaction_ids), SYNC_BATCH_SIZE):
+        written += _sync_batch(transaction_ids[start:start + SYNC_BATCH_SIZE])
+    return written
+
+
+def _sync_queryset(transactions):
+    rows = transactions.order_by().values_list(*SOURCE_FIELDS).iterator(chunk_size=SYNC_BATCH_SIZE)
+    written = 0
+    facts = []
+    with db_transaction.atomic():
+        _delete_facts(SpendingFact.objects.filter(transaction_id__in=transactions.order_by().values('id')))
+        for row in rows:
+            facts.append(fact_from_row(row))
+            if len(facts) >= SYNC_BATCH_SIZE:
+                written += len(SpendingFact.objects.bulk_create(facts))
+                facts = []
+        if facts:
+            written += len(SpendingFact.objects.bulk_create(facts))
+    return written
+
+
+def copy_to_spending_facts(transactions, values):
+    """
+    Apply a write of COPIED_FIELD_NAMES to the facts of the given transactions.
+    
+    Cheaper than sync_spending_facts for bulk recategorization: one UPDATE
+    instead of reading and rewriting every fact.
+    
+    Args:
+        transactions (QuerySet or iterable): Transaction queryset, matched
+            with a subquery, or ids
+        values (dict): Field -> new value, as passed to QuerySet.update()
+    """
+    if isinstance(transactions, QuerySet):
+        SpendingFact.objects.filter(
+            transaction_id__in=transactions.order_by().values('id')
+        ).update(**values)
+        return
+    transaction_ids = list(transactions)
+    for start in range(0, len(transaction_ids), SYNC_BATCH_SIZE):
+        SpendingFact.objects.filter(
+            transaction_id__in=transaction_ids[start:start + SYNC_BATCH_SIZE]
+        ).update(**values)
+
+
+def rebuild_spending_facts():
+    """
+    Rebuild the facts of every transaction.
+
+    Returns:
+        int: Number of facts written
+    """
+    written = 0
+    batch = []
+    for transaction_id in Transaction.objects.order_by().values_list('id', flat=True).iterator(chunk_size=SYNC_BATCH_SIZE):
+        batch.append(transaction_id)
+        if len(batch) >= SYNC_BATCH_SIZE:
+            written += _sync_batch(batch)
+            batch = []
+    if batch:
+        written += _sync_batch(batch)
+
+    # Facts of transactions removed outside the ORM
+    _delete_facts(SpendingFact.objects.exclude(transaction_id__in=Transaction.objects.values('id')))
+
+    logger.info(f"Rebuilt {written} spending facts")
+    return written
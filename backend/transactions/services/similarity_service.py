@@ -0,0 +1,202 @@
+"""
+Service layer for finding similar transactions.
+
+Descriptions are normalized and split into character n-grams, which are
+stored in an inverted index (TransactionNgram). A lookup reads the postings
+of the query's rarest grams, scores the candidates by their IDF-weighted
+overlap and re-ranks the best of them by cosine similarity.
+"""
+import logging
+import math
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Count
+
+from ..models import Transaction, TransactionNgram
+from ..utils.cache import versioned_cache_key
+from ..utils.text import normalize_description
+
+logger = logging.getLogger('transactions')
+
+NGRAM_SIZE = 3
+# Only the rarest grams of a query are looked up, which bounds the postings read
+MAX_QUERY_GRAMS = 24
+# Grams present in more than this share of transactions carry no signal.
+# Small indexes keep every gram, since the postings are cheap to read anyway.
+MAX_DOCUMENT_FREQUENCY = 0.1
+MIN_DOCUMENT_FREQUENCY_CUTOFF = 1000
+# Candidates re-ranked with the exact cosine similarity, per requested neighbour
+CANDIDATES_PER_RESULT = 10
+INDEX_BATCH_SIZE = 1000
+
+
+def description_ngrams(text):
+    """
+    Get the set of character n-grams of a description.
+
+    Words are padded with spaces so grams at word boundaries are distinct.
+
+    Args:
+        text (str): The raw description
+
+    Returns:
+        set: Distinct n-grams
+    """
+    text = normalize_description(text)
+    if not text:
+        return set()
+    padded = f' {text} '
+    if len(padded) < NGRAM_SIZE:
+        return {padded}
+    return {padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1)}
+
+
+def index_transactions(queryset=None):
+    """
+    (Re)build the n-gram postings for the given transactions.
+
+    Args:
+        queryset (QuerySet, optional): Transactions to index; all when omitted
+
+    Returns:
+        int: Number of transactions indexed
+    """
+    if queryset is None:
+        queryset = Transaction.objects.all()
+
+    rows = queryset.order_by().values_list('id', 'description').iterator(chunk_size=INDEX_BATCH_SIZE)
+    indexed = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= INDEX_BATCH_SIZE:
+            indexed += _index_batch(batch)
+            batch = []
+    if batch:
+        indexed += _index_batch(batch)
+
+    logger.info(f"Indexed {indexed} transactions for similarity search")
+    return indexed
+
+
+def index_description(transaction_id, description):
+    """
+    Rewrite the n-gram postings of one transaction.
+
+    Args:
+        transaction_id (int): The transaction's id
+        description (str): Its current description
+    """
+    _index_batch([(transaction_id, description)])
+
+
+def _delete_postings(queryset):
+    # A plain DELETE, like facts_service._delete_facts: postings are derived
+    # data, so there are no signals to send or generations to bump per row.
+    return queryset._raw_delete(queryset.db)
+
+
+def _index_batch(rows):
+    ids = [transaction_id for transaction_id, _ in rows]
+    postings = [
+        TransactionNgram(transaction_id=transaction_id, gram=gram)
+        for transaction_id, description in rows
+        for gram in description_ngrams(description)
+    ]
+    with db_transaction.atomic():
+        _delete_postings(TransactionNgram.objects.filter(transaction_id__in=ids))
+        TransactionNgram.objects.bulk_create(postings, batch_size=INDEX_BATCH_SIZE)
+    return len(rows)
+
+
+def index_missing_transactions():
+    """
+    Index transactions that have no postings yet.
+
+    Returns:
+        int: Number of transactions indexed
+    """
+    return index_transactions(Transaction.objects.filter(ngrams__isnull=True))
+
+
+def _document_count():
+    # Only used for IDF, so a slightly stale count is fine
+    cache_key = versioned_cache_key('similarity:documents', [Transaction])
+    count = cache.get(cache_key)
+    if count is None:
+        count = Transaction.objects.count()
+        cache.set(cache_key, count, timeout=None)
+    return count
+
+
+def _document_frequencies(grams):
+    rows = TransactionNgram.objects.filter(gram__in=list(grams)).values('gram').annotate(df=Count('id'))
+    return {row['gram']: row['df'] for row in rows}
+
+
+def find_similar_transactions(transaction_obj, limit=10):
+    """
+    Find the transactions whose descriptions are most similar to a transaction.
+
+    Args:
+        transaction_obj (Transaction): The transaction to compare against
+        limit (int): Number of neighbours to return
+
+    Returns:
+        list: (transaction id, similarity) tuples, most similar first
+    """
+    query_grams = description_ngrams(transaction_obj.description)
+    if not query_grams:
+        return []
+
+    documents = max(_document_count(), 1)
+    max_df = max(int(documents * MAX_DOCUMENT_FREQUENCY), MIN_DOCUMENT_FREQUENCY_CUTOFF)
+
+    def idf(df):
+        return math.log((documents + 1) / (df + 1)) + 1
+
+    frequencies = _document_frequencies(query_grams)
+    lookup_grams = sorted(
+        (gram for gram in query_grams if 0 < frequencies.get(gram, 0) <= max_df),
+        key=lambda gram: frequencies[gram]
+    )[:MAX_QUERY_GRAMS]
+    if not lookup_grams:
+        return []
+    weights = {gram: idf(frequencies[gram]) for gram in lookup_grams}
+
+    # Score candidates by the IDF mass of the grams they share with the query
+    overlap = defaultdict(float)
+    postings = TransactionNgram.objects.filter(gram__in=lookup_grams).exclude(
+        transaction_id=transaction_obj.id
+    ).values_list('transaction_id', 'gram')
+    for transaction_id, gram in postings:
+        overlap[transaction_id] += weights[gram]
+
+    candidates = sorted(overlap, key=overlap.get, reverse=True)[:limit * CANDIDATES_PER_RESULT]
+    if not candidates:
+        return []
+
+    # Re-rank the candidates by IDF-weighted cosine similarity on all their grams
+    candidate_grams = {
+        transaction_id: description_ngrams(description)
+        for transaction_id, description in Transaction.objects.filter(
+            id__in=candidates
+        ).values_list('id', 'description')
+    }
+    all_grams = set(query_grams).union(*candidate_grams.values())
+    frequencies.update(_document_frequencies(all_grams - set(frequencies)))
+    gram_weights = {gram: idf(frequencies.get(gram, 0)) for gram in all_grams}
+
+    query_norm = math.sqrt(sum(gram_weights[gram] ** 2 for gram in query_grams))
+    scored = []
+    for transaction_id, grams in candidate_grams.items():
+        if not grams:
+            continue
+        shared = sum(gram_weights[gram] ** 2 for gram in grams & query_grams)
+        norm = math.sqrt(sum(gram_weights[gram] ** 2 for gram in grams))
+        scored.append((transaction_id, round(shared / (query_norm * norm), 4)))
+
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:limit]
@@ -0,0 +1,447 @@
+"""
+In-memory columnar snapshot of transactions for dashboard aggregations.
+
+The analytic columns of every transaction are held in NumPy arrays (date
+ordinal, amount in cents, foreign keys and a flags bitmask), together with
+the related account postings and the names of categories, bank accounts,
+suppliers and ledger accounts. Summary, budget and timeseries queries are
+answered with masks and np.bincount, without touching the database.
+
+Each process keeps one snapshot. It records the cache generations of the
+models it was built from; when a generation moves, only the changed
+transactions are re-read (by updated_at, from the earliest write recorded
+with the new generations), and the smaller tables are reloaded whole. NumPy is optional: without it, or with
+TRANSACTION_SNAPSHOT_ENABLED = False, get_snapshot() returns None and
+callers query the database.
+"""
+import copy
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.conf import settings
+
+from ..models import Transaction, TransactionAccount, Category, BankAccount, Supplier, Account
+from ..utils.cache import get_generations, get_write_times
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+logger = logging.getLogger('transactions')
+
+# Bits of the flags column
+FLAG_INTERNAL_TRANSFER = 1
+FLAG_WAGE_TRANSFER = 2
+FLAG_TAX_TRANSFER = 4
+FLAG_FORBIDDEN = 8
+FLAG_NOT_PROCESSED = 16
+# Transactions with any of these flags are not expenses (see SpendingFact.is_expense)
+NOT_EXPENSE_FLAGS = FLAG_INTERNAL_TRANSFER
+
+NAME_MODELS = {
+    'category': Category,
+    'bank_account': BankAccount,
+    'supplier': Supplier,
+    'ledger_account': Account,
+}
+SNAPSHOT_MODELS = (Transaction, TransactionAccount) + tuple(NAME_MODELS.values())
+
+# Re-read rows updated this long before the earliest recorded write: a
+# write time is taken after its statement ran, updated_at before it
+REFRESH_OVERLAP = timedelta(seconds=5)
+# Rebuild from scratch at least this often, in seconds
+MAX_SNAPSHOT_AGE = 15 * 60
+
+TRANSACTION_COLUMNS = (
+    'id', 'date', 'amount', 'category_id', 'bank_account_id', 'supplier_id', 'ledger_account_id',
+    'is_internal_transfer', 'is_wage_transfer', 'is_tax_transfer', 'is_forbidden', 'should_process',
+)
+# Array holding each group-by field
+GROUP_COLUMNS = {
+    'category': 'category',
+    'bank_account': 'bank_account',
+    'supplier': 'supplier',
+    'ledger_account': 'ledger_account',
+}
+
+
+class UnsupportedFilter(Exception):
+    """
+    Raised when a query needs data the snapshot does not hold, e.g. text search.
+    """
+
+
+def _cents(amount):
+    return int((Decimal(str(amount)) * 100).to_integral_value())
+
+
+def _ordinal(value):
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)).toordinal()
+
+
+def _months_from_ordinals(ordinals):
+    # Vectorized date.fromordinal(...).year * 12 + month - 1
+    days = (ordinals - date(1970, 1, 1).toordinal()).astype('datetime64[D]')
+    return days.astype('datetime64[M]').astype(np.int64) + 1970 * 12
+
+
+class TransactionSnapshot:
+    """
+    Columnar copy of the transaction table, sorted by id.
+    """
+
+    def __init__(self):
+        self.generations = None
+        self.loaded_at = None
+        self.names = {}
+
+    # Loading
+
+    def load(self, generations):
+        """
+        Build the whole snapshot from the database.
+        """
+        self._set_rows(self._read_transactions(Transaction.objects.all()))
+        self._load_postings()
+        self._load_names()
+        self.generations = generations
+        self.loaded_at = time.monotonic()
+        logger.info(f"Loaded transaction snapshot with {len(self.ids)} rows")
+
+    def refreshed(self, generations):
+        """
+        Get an up-to-date copy of the snapshot.
+
+        Only transactions updated since the last refresh are re-read. A full
+        reload happens when rows were deleted or the snapshot is too old.
+        The snapshot itself is never modified, so concurrent readers keep a
+        consistent view.
+        """
+        snapshot = copy.copy(self)
+        snapshot._refresh(generations)
+        return snapshot
+
+    def _refresh(self, generations):
+        if time.monotonic() - self.loaded_at > MAX_SNAPSHOT_AGE:
+            self.load(generations)
+            return
+
+        changed = {label for label, value in generations.items() if self.generations.get(label) != value}
+
+        label = Transaction._meta.label_lower
+        if label in changed:
+            # Generations move when writes commit, so every write behind the
+            # new generation is visible now, however long ago it happened
+            write_times = get_write_times(label, self.generations.get(label, 0), generations[label])
+            if not write_times:
+                self.load(generations)
+                return
+            since = datetime.fromtimestamp(min(write_times), tz=timezone.utc) - REFRESH_OVERLAP
+            self._merge_rows(self._read_transactions(Transaction.objects.filter(updated_at__gte=since)))
+            if len(self.ids) != Transaction.objects.count():
+                # Some rows were deleted
+                self.load(generations)
+                return
+
+        if changed & {Transaction._meta.label_lower, TransactionAccount._meta.label_lower}:
+            self._load_postings()
+        if changed & {model._meta.label_lower for model in NAME_MODELS.values()}:
+            self._load_names()
+        self.generations = generations
+
+    def _read_transactions(self, queryset):
+        rows = list(queryset.order_by('id').values_list(*TRANSACTION_COLUMNS))
+        count = len(rows)
+        columns = {
+            'ids': np.empty(count, dtype=np.int64),
+            'dates': np.empty(count, dtype=np.int64),
+            'amounts': np.empty(count, dtype=np.int64),
+            'category': np.empty(count, dtype=np.int64),
+            'bank_account': np.empty(count, dtype=np.int64),
+            'supplier': np.empty(count, dtype=np.int64),
+            'ledger_account': np.empty(count, dtype=np.int64),
+            'flags': np.empty(count, dtype=np.uint8),
+        }
+        for i, (transaction_id, day, amount, category_id, bank_account_id, supplier_id, ledger_account_id,
+                is_internal, is_wage, is_tax, is_forbidden, should_process) in enumerate(rows):
+            columns['ids'][i] = transaction_id
+            columns['dates'][i] = day.toordinal()
+            columns['amounts'][i] = _cents(amount)
+            # 0 stands for NULL; database ids start at 1
+            columns['category'][i] = category_id or 0
+            columns['bank_account'][i] = bank_account_id or 0
+            columns['supplier'][i] = supplier_id or 0
+            columns['ledger_account'][i] = ledger_account_id or 0
+            columns['flags'][i] = (
+                (FLAG_INTERNAL_TRANSFER if is_internal else 0)
+                | (FLAG_WAGE_TRANSFER if is_wage else 0)
+                | (FLAG_TAX_TRANSFER if is_tax else 0)
+                | (FLAG_FORBIDDEN if is_forbidden else 0)
+                | (0 if should_process else FLAG_NOT_PROCESSED)
+            )
+        return columns
+
+    def _set_rows(self, columns):
+        for name, values in columns.items():
+            setattr(self, name, values)
+        self.months = _months_from_ordinals(self.dates)
+
+    def _merge_rows(self, columns):
+        if not len(columns['ids']):
+            return
+        positions = np.searchsorted(self.ids, columns['ids'])
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == columns['ids'][found]
+
+        merged = {}
+        for name, values in columns.items():
+            current = getattr(self, name).copy()
+            current[positions[found]] = values[found]
+            merged[name] = np.concatenate([current, values[~found]])
+        order = np.argsort(merged['ids'], kind='stable')
+        self._set_rows({name: values[order] for name, values in merged.items()})
+
+    def _load_postings(self):
+        rows = list(TransactionAccount.objects.order_by().values_list('transaction_id', 'account_id', 'amount'))
+        self.posting_transactions = np.array([row[0] for row in rows], dtype=np.int64)
+        self.posting_accounts = np.array([row[1] for row in rows], dtype=np.int64)
+        # 0 means "use the transaction amount", as in get_transaction_summary
+        self.posting_amounts = np.array([_cents(row[2]) if row[2] else 0 for row in rows], dtype=np.int64)
+
+    def _load_names(self):
+        self.names = {
+            'category': dict(Category.objects.values_list('id', 'name')),
+            'bank_account': dict(BankAccount.objects.values_list('id', 'name')),
+            'supplier': dict(Supplier.objects.values_list('id', 'name')),
+            'ledger_account': dict(Account.objects.values_list('id', 'name')),
+        }
+        self.account_numbers = dict(Account.objects.values_list('id', 'account_number'))
+
+    # Queries
+
+    def mask(self, filters=None):
+        """
+        Get a boolean row mask for transaction filters.
+
+        Args:
+            filters (dict): Filters, as accepted by get_all_transactions
+
+        Returns:
+            ndarray: True for the matching rows
+
+        Raises:
+            UnsupportedFilter: If a filter needs the database (search)
+        """
+        filters = filters or {}
+        if filters.get('search'):
+            raise UnsupportedFilter('search')
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        try:
+            if filters.get('date_from'):
+                mask &= self.dates >= _ordinal(filters['date_from'])
+            if filters.get('date_to'):
+                mask &= self.dates <= _ordinal(filters['date_to'])
+            if filters.get('category'):
+                mask &= self.category == int(filters['category'])
+            if filters.get('bank_account'):
+                mask &= self.bank_account == int(filters['bank_account'])
+            if filters.get('amount_min'):
+                mask &= self.amounts >= _cents(filters['amount_min'])
+            if filters.get('amount_max'):
+                mask &= self.amounts <= _cents(filters['amount_max'])
+        except (ValueError, ArithmeticError) as e:
+            # Let the database path report invalid input
+            raise UnsupportedFilter(str(e))
+        if 'internal_transfer' in filters:
+            is_internal = (self.flags & FLAG_INTERNAL_TRANSFER) != 0
+            mask &= is_internal if filters['internal_transfer'] else ~is_internal
+        if 'should_process' in filters:
+            not_processed = (self.flags & FLAG_NOT_PROCESSED) != 0
+            mask &= ~not_processed if filters['should_process'] else not_processed
+        return mask
+
+    @staticmethod
+    def _group_sums(keys, amounts):
+        """
+        Sum and count amounts per distinct key.
+
+        Returns:
+            tuple: (keys, sums, counts) arrays
+        """
+        unique, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=amounts, minlength=len(unique))
+        counts = np.bincount(inverse, minlength=len(unique))
+        return unique, sums, counts
+
+    def summary(self, filters=None):
+        """
+        Same result as services.transaction_service.get_transaction_summary.
+        """
+        mask = self.mask(filters)
+        amounts = self.amounts[mask]
+        total_amount = int(amounts.sum()) / 100
+
+        def percentage(total):
+            return round((total / total_amount) * 100, 2) if total_amount else 0
+
+        def breakdown(field, label):
+            groups = []
+            for key, total, count in zip(*self._group_sums(getattr(self, field)[mask], amounts)):
+                groups.append((label(int(key)), int(total) / 100, int(count)))
+            groups.sort(key=lambda group: group[1], reverse=True)
+            return {
+                name: {'total': total, 'count': count, 'percentage': percentage(total)}
+                for name, total, count in groups
+            }
+
+        categories = breakdown(
+            'category', lambda key: self.names['category'].get(key) or 'Uncategorized'
+        )
+        bank_accounts = breakdown(
+            'bank_account', lambda key: self.names['bank_account'].get(key) or key or 'Unknown'
+        )
+
+        # Related account postings of the matching transactions
+        related_accounts = {}
+        if len(self.posting_transactions) and len(self.ids):
+            positions = np.searchsorted(self.ids, self.posting_transactions)
+            positions[positions >= len(self.ids)] = 0
+            selected = (self.ids[positions] == self.posting_transactions) & mask[positions]
+            posting_amounts = np.abs(np.where(
+                self.posting_amounts[selected] != 0,
+                self.posting_amounts[selected],
+                self.amounts[positions[selected]]
+            ))
+            for key, total, count in zip(*self._group_sums(self.posting_accounts[selected], posting_amounts)):
+                key = int(key)
+                name = self.names['ledger_account'].get(key) or self.account_numbers.get(key) or f"Account {key}"
+                entry = related_accounts.setdefault(name, {'total': 0, 'count': 0, 'percentage': 0})
+                entry['total'] += int(total) / 100
+                entry['count'] += int(count)
+
+            total_related_amount = sum(entry['total'] for entry in related_accounts.values())
+            if total_related_amount > 0:
+                for entry in related_accounts.values():
+                    entry['percentage'] = round((entry['total'] / total_related_amount) * 100, 2)
+
+        return {
+            'total_transactions': int(mask.sum()),
+            'total_amount': total_amount,
+            'categories': categories,
+            'bank_accounts': bank_accounts,
+            'related_accounts': related_accounts
+        }
+
+    def expenses_by_category(self, year, month):
+        """
+        Get the expenses per category in a month, as positive amounts.
+
+        Returns:
+            dict: Category id -> Decimal amount
+        """
+        mask = (
+            (self.months == year * 12 + month - 1)
+            & (self.amounts < 0)
+            & ((self.flags & NOT_EXPENSE_FLAGS) == 0)
+            & (self.category != 0)
+        )
+        keys, sums, _ = self._group_sums(self.category[mask], -self.amounts[mask])
+        return {int(key): Decimal(int(total)) / 100 for key, total in zip(keys, sums)}
+
+    def _periods(self, granularity):
+        if granularity == 'day':
+            return self.dates
+        if granularity == 'week':
+            # date.fromordinal(1) is a Monday
+            return self.dates - (self.dates - 1) % 7
+        if granularity == 'month':
+            return self.months
+        if granularity == 'quarter':
+            return self.months - self.months % 3
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+    @staticmethod
+    def _period_date(value, granularity):
+        if granularity in ('day', 'week'):
+            return date.fromordinal(value)
+        return date(value // 12, value % 12 + 1, 1)
+
+    def timeseries_rows(self, filters, granularity, group_by=None):
+        """
+        Get totals per period and group, like the grouped timeseries query.
+
+        Returns:
+            list: (period start, group id, group name, total, count) tuples
+        """
+        mask = self.mask(filters)
+        periods = self._periods(granularity)[mask]
+        amounts = self.amounts[mask]
+        if group_by:
+            groups = getattr(self, GROUP_COLUMNS[group_by])[mask]
+        else:
+            groups = np.zeros(len(periods), dtype=np.int64)
+
+        keys = np.stack([periods, groups], axis=1) if len(periods) else np.empty((0, 2), dtype=np.int64)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        sums = np.bincount(inverse, weights=amounts, minlength=len(unique))
+        counts = np.bincount(inverse, minlength=len(unique))
+
+        rows = []
+        for (period, group), total, count in zip(unique, sums, counts):
+            group = int(group) or None
+            name = self.names[group_by].get(group) if group_by and group else None
+            rows.append((self._period_date(int(period), granularity), group, name, int(total) / 100, int(count)))
+        return rows
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def snapshot_enabled():
+    return HAS_NUMPY and getattr(settings, 'TRANSACTION_SNAPSHOT_ENABLED', True)
+
+
+def get_snapshot():
+    """
+    Get this process's up-to-date transaction snapshot.
+
+    Returns:
+        TransactionSnapshot: The snapshot, or None if snapshots are disabled
+    """
+    global _snapshot
+    if not snapshot_enabled():
+        return None
+
+    generations = get_generations(*SNAPSHOT_MODELS)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.generations == generations:
+        return snapshot
+
+    with _lock:
+        if _snapshot is None:
+            snapshot = TransactionSnapshot()
+            snapshot.load(generations)
+            _snapshot = snapshot
+        elif _snapshot.generations != generations:
+            _snapshot = _snapshot.refreshed(generations)
+        return _snapshot
+
+
+def clear_snapshot():
+    """
+    Drop this process's snapshot; the next get_snapshot() rebuilds it.
+    """
+    global _snapshot
+    with _lock:
+        _snapshot = None
@@ -0,0 +1,414 @@
+"""
+Service layer for generating synthetic transactions.
+
+Builds a realistic, reproducible data set for benchmarks and load tests:
+suppliers with branch names, a small chart of ledger accounts, bank
+accounts, transactions with a Tripletex-shaped raw_data payload, two to
+four TransactionAccount postings per transaction and close groups that
+tie supplier invoices to the payments that settle them.
+
+Every generated row is marked (see SYNTHETIC_PREFIX). clear_synthetic_data()
+removes the generated transactions, postings and close groups without
+touching imported data; the reference rows are kept for the next run.
+"""
+import itertools
+import logging
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+
+from ..models import (
+    Account, BankAccount, Category, CloseGroup, CloseGroupPosting, LedgerPosting, SpendingFact, Supplier,
+    Transaction, TransactionAccount, TransactionNgram
+)
+from ..utils.cache import bump_generation
+
+logger = logging.getLogger('transactions')
+
+SYNTHETIC_PREFIX = 'synthetic-'
+# Numeric Tripletex ids of generated objects start here
+SYNTHETIC_ID_BASE = 900_000_000
+GENERATE_BATCH_SIZE = 5000
+MAX_SYNTHETIC_TRANSACTIONS = 1_000_000
+
+VAT_RATE = Decimal('0.25')
+CENT = Decimal('0.01')
+
+BANK_ACCOUNTS = (
+    ('Brukskonto', '1503.12.34567'),
+    ('Sparekonto', '1503.76.54321'),
+    ('Kredittkort', '4925.00.11223'),
+)
+# (tripletex number, name, account type)
+LEDGER_ACCOUNTS = (
+    ('1920', 'Bankinnskudd', 'ASSETS'),
+    ('2400', 'Leverandørgjeld', 'LIABILITIES'),
+    ('2710', 'Inngående mva', 'LIABILITIES'),
+    ('3000', 'Salgsinntekt', 'OPERATING_REVENUES'),
+    ('4300', 'Varekjøp', 'OPERATING_EXPENSES'),
+    ('6300', 'Leie lokale', 'OPERATING_EXPENSES'),
+    ('6800', 'Kontorrekvisita', 'OPERATING_EXPENSES'),
+    ('6900', 'Telefon og internett', 'OPERATING_EXPENSES'),
+    ('7100', 'Bilgodtgjørelse', 'OPERATING_EXPENSES'),
+    ('7140', 'Reisekostnad', 'OPERATING_EXPENSES'),
+    ('7350', 'Representasjon', 'OPERATING_EXPENSES'),
+    ('7770', 'Bank- og kortgebyr', 'OPERATING_EXPENSES'),
+)
+# (supplier name, category, expense account, typical amount, VAT applies)
+SUPPLIER_PROFILES = (
+    ('REMA 1000', 'Food & Dining', '4300', 350, True),
+    ('KIWI', 'Food & Dining', '4300', 300, True),
+    ('COOP EXTRA', 'Food & Dining', '4300', 420, True),
+    ('MENY', 'Food & Dining', '4300', 520, True),
+    ('ESPRESSO HOUSE', 'Food & Dining', '7350', 95, True),
+    ('PEPPES PIZZA', 'Food & Dining', '7350', 640, True),
+    ('FOODORA', 'Food & Dining', '7350', 280, True),
+    ('CIRCLE K', 'Transportation', '7100', 780, True),
+    ('RUTER', 'Transportation', '7140', 42, True),
+    ('VY', 'Transportation', '7140', 560, True),
+    ('SAS', 'Transportation', '7140', 2400, True),
+    ('NORWEGIAN AIR SHUTTLE', 'Transportation', '7140', 1650, True),
+    ('EASYPARK', 'Transportation', '7100', 65, True),
+    ('ELKJØP', 'Shopping', '6800', 1900, True),
+    ('CLAS OHLSON', 'Shopping', '6800', 310, True),
+    ('IKEA', 'Shopping', '6800', 1250, True),
+    ('XXL', 'Shopping', '6800', 890, True),
+    ('NORLI', 'Shopping', '6800', 260, True),
+    ('ODEON KINO', 'Entertainment', '7350', 190, True),
+    ('TICKETMASTER', 'Entertainment', '7350', 850, True),
+    ('SPOTIFY', 'Entertainment', '6900', 129, True),
+    ('TELENOR', 'Utilities', '6900', 499, True),
+    ('TELIA', 'Utilities', '6900', 449, True),
+    ('FJORDKRAFT', 'Utilities', '6300', 1400, True),
+    ('TIBBER', 'Utilities', '6300', 1100, True),
+    ('OBOS', 'Utilities', '6300', 9500, False),
+    ('DNB', None, '7770', 45, False),
+)
+CITIES = ('OSLO', 'TRONDHEIM', 'BERGEN', 'STAVANGER', 'TROMSØ', 'KRISTIANSAND', 'DRAMMEN', 'BODØ')
+# Descriptions of transactions without a supplier: (text, category, account, amount, sign)
+OTHER_PROFILES = (
+    ('Overføring mellom egne kontoer', None, '1920', 5000, -1),
+    ('Lønn', None, '3000', 42000, 1),
+    ('Innbetaling faktura', None, '3000', 12500, 1),
+    ('Varekjøp VISA', 'Shopping', '4300', 400, -1),
+    ('Kontantuttak minibank', None, '7770', 1000, -1),
+)
+# Share of supplier purchases booked as an invoice that the payment closes
+INVOICE_SHARE = 0.25
+# Share of transactions left without a supplier
+UNMATCHED_SHARE = 0.15
+# Share of supplier purchases left uncategorized
+UNCATEGORIZED_SHARE = 0.1
+
+
+def _money(value):
+    return Decimal(value).quantize(CENT)
+
+
+def _ensure_reference_data(supplier_count, rng):
+    """
+    Create the bank accounts, ledger accounts, categories and suppliers the
+    transactions point at. Existing rows are reused.
+
+    Returns:
+        dict: Lookups used by _build_transaction
+    """
+    bank_accounts = [
+        BankAccount.objects.get_or_create(
+            name=name, defaults={'account_number': number, 'bank_name': 'DNB', 'account_type': 'synthetic'}
+        )[0]
+        for name, number in BANK_ACCOUNTS
+    ]
+
+    ledger_accounts = {}
+    for number, name, account_type in LEDGER_ACCOUNTS:
+        ledger_accounts[number], _ = Account.objects.get_or_create(
+            tripletex_id=f'{SYNTHETIC_PREFIX}account-{number}',
+            defaults={'account_number': number, 'name': name, 'account_type': account_type},
+        )
+
+    category_names = {profile[1] for profile in SUPPLIER_PROFILES + OTHER_PROFILES if profile[1]}
+    categories = {name: Category.objects.get_or_create(name=name)[0] for name in sorted(category_names)}
+
+    existing = {
+        supplier.tripletex_id: supplier
+        for supplier in Supplier.objects.filter(tripletex_id__startswith=SYNTHETIC_PREFIX)
+    }
+    new_suppliers = []
+    profiles = []
+    for index in range(supplier_count):
+        profile = SUPPLIER_PROFILES[index % len(SUPPLIER_PROFILES)]
+        branch = index // len(SUPPLIER_PROFILES)
+        tripletex_id = f'{SYNTHETIC_PREFIX}supplier-{index}'
+        if tripletex_id not in existing:
+            name = profile[0] if branch == 0 else f'{profile[0]} {CITIES[branch % len(CITIES)]} {branch}'
+            new_suppliers.append(Supplier(
+                tripletex_id=tripletex_id,
+                name=name,
+                organization_number=str(910_000_000 + index),
+                email=f"post@{profile[0].split()[0].lower()}.no",
+            ))
+        profiles.append((tripletex_id, profile))
+    Supplier.objects.bulk_create(new_suppliers, batch_size=GENERATE_BATCH_SIZE)
+    existing.update((supplier.tripletex_id, supplier) for supplier in new_suppliers)
+
+    # A few suppliers account for most purchases, like real card statements
+    suppliers = [(existing[tripletex_id], profile) for tripletex_id, profile in profiles]
+    weights = [1 / (rank + 1) for rank in range(len(suppliers))]
+    rng.shuffle(weights)
+    cumulative_weights = list(itertools.accumulate(weights))
+
+    return {
+        'bank_accounts': bank_accounts,
+        'ledger_accounts': ledger_accounts,
+        'categories': categories,
+        'suppliers': suppliers,
+        'supplier_weights': cumulative_weights,
+    }
+
+
+def _posting(posting_id, account, amount, description, voucher_id, close_group_id=None, supplier=None):
+    return {
+        'id': posting_id,
+        'description': description,
+        'account': {'id': account.id, 'number': int(account.account_number), 'name': account.name},
+        'amount': float(amount),
+        'amountCurrency': float(amount),
+        'voucher': {'id': voucher_id},
+        'closeGroup': {'id': close_group_id} if close_group_id else None,
+        'supplier': {'id': supplier.id, 'name': supplier.name} if supplier else None,
+    }
+
+
+def _build_transaction(number, day, reference, rng):
+    """
+    Build one unsaved transaction with its postings.
+
+    Returns:
+        tuple: (Transaction, list of TransactionAccount kwargs, close group dict or None)
+    """
+    ledger_accounts = reference['ledger_accounts']
+    bank_account = rng.choice(reference['bank_accounts'])
+    bank_ledger = ledger_accounts['1920']
+    tripletex_id = SYNTHETIC_ID_BASE + number
+    voucher_id = SYNTHETIC_ID_BASE + number
+    posting_id = SYNTHETIC_ID_BASE + number * 4
+
+    supplier = None
+    close_group = None
+    if rng.random() >= UNMATCHED_SHARE:
+        supplier, (name, category_name, account_number, typical, has_vat) = rng.choices(
+            reference['suppliers'], cum_weights=reference['supplier_weights']
+        )[0]
+        description = f"{supplier.name} {rng.choice(CITIES)}" if rng.random() < 0.5 else supplier.name
+        amount = -_money(rng.lognormvariate(0, 0.6) * typical)
+        if rng.random() < UNCATEGORIZED_SHARE:
+            category_name = None
+    else:
+        description, category_name, account_number, typical, sign = rng.choice(OTHER_PROFILES)
+        amount = sign * _money(rng.lognormvariate(0, 0.4) * typical)
+        has_vat = False
+
+    category = reference['categories'].get(category_name) if category_name else None
+    counter_account = ledger_accounts[account_number]
+    is_internal_transfer = description.startswith('Overføring')
+    is_wage_transfer = description == 'Lønn'
+
+    # Bank side of the voucher
+    postings = [_posting(posting_id, bank_ledger, amount, description, voucher_id)]
+    if supplier is not None and rng.random() < INVOICE_SHARE:
+        # The payment settles an earlier invoice on the supplier ledger
+        close_group_id = f'{SYNTHETIC_PREFIX}close-{number}'
+        postings.append(_posting(
+            posting_id + 1, ledger_accounts['2400'], -amount, f"Betaling {supplier.name}", voucher_id,
+            close_group_id, supplier,
+        ))
+        close_group = {
+            'tripletex_id': close_group_id,
+            'supplier': supplier,
+            'date': day,
+            'amount': amount,
+            'payment_posting_id': posting_id + 1,
+            'invoice_posting_id': posting_id + 2,
+            'voucher_id': voucher_id,
+            'expense_account': counter_account,
+            'payables_account': ledger_accounts['2400'],
+        }
+    elif has_vat:
+        net = _money(-amount / (1 + VAT_RATE))
+        postings.append(_posting(posting_id + 1, counter_account, net, description, voucher_id, supplier=supplier))
+        postings.append(_posting(
+            posting_id + 2, ledger_accounts['2710'], -amount - net, 'Inngående mva 25%', voucher_id
+        ))
+    else:
+        postings.append(_posting(posting_id + 1, counter_account, -amount, description, voucher_id, supplier=supplier))
+
+    raw_data = {
+        'value': {
+            'id': tripletex_id,
+            'version': 1,
+            'url': f'tripletex.no/v2/bank/statement/transaction/{tripletex_id}',
+            'postedDate': day.isoformat(),
+            'description': description,
+            'amountCurrency': float(amount),
+            'account': {'id': bank_account.id, 'name': bank_account.name},
+            'bankStatement': {'id': SYNTHETIC_ID_BASE + day.toordinal()},
+            'matchType': 'SYNTHETIC',
+            'groupedPostings': postings,
+        }
+    }
+    transaction = Transaction(
+        tripletex_id=f'{SYNTHETIC_PREFIX}{number}',
+        description=description[:255],
+        amount=amount,
+        date=day,
+        bank_account=bank_account,
+        account_id=bank_account.account_number,
+        supplier=supplier,
+        ledger_account=counter_account,
+        category=category,
+        is_internal_transfer=is_internal_transfer,
+        is_wage_transfer=is_wage_transfer,
+        raw_data=raw_data,
+    )
+    accounts = [
+        {
+            'account_id': posting['account']['id'],
+            'amount': Decimal(str(posting['amount'])),
+            'is_debit': posting['amount'] >= 0,
+            'posting_id': str(posting['id']),
+            'voucher_id': str(voucher_id),
+            'description': posting['description'],
+        }
+        for posting in postings
+    ]
+    return transaction, accounts, close_group
+
+
+def _save_close_groups(close_groups):
+    """
+    Create the invoice and payment ledger postings of each close group and link them.
+    """
+    if not close_groups:
+        return
+    groups = CloseGroup.objects.bulk_create([
+        CloseGroup(
+            tripletex_id=group['tripletex_id'],
+            name=f"Faktura {group['supplier'].name}",
+            postings_count=2,
+        )
+        for group in close_groups
+    ])
+    postings = []
+    for group in close_groups:
+        for posting_id, amount, account, days_before, voucher_type in (
+            (group['invoice_posting_id'], group['amount'], group['payables_account'], 14, 'Leverandørfaktura'),
+            (group['payment_posting_id'], -group['amount'], group['payables_account'], 0, 'Bankavstemming'),
+        ):
+            postings.append(LedgerPosting(
+                posting_id=posting_id,
+                date=group['date'] - timedelta(days=days_before),
+                description=f"{voucher_type} {group['supplier'].name}",
+                amount=amount,
+                closeGroup=group['tripletex_id'],
+                supplier=group['supplier'],
+                account=account,
+                voucher_id=group['voucher_id'],
+                voucher_number=f"{SYNTHETIC_PREFIX}{group['voucher_id']}",
+                voucher_type=voucher_type,
+            ))
+    postings = LedgerPosting.objects.bulk_create(postings)
+    CloseGroupPosting.objects.bulk_create([
+        CloseGroupPosting(close_group=group, posting=posting)
+        for index, group in enumerate(groups)
+        for posting in postings[index * 2:index * 2 + 2]
+    ])
+
+
+def generate_synthetic_data(count, suppliers=300, years=3, end_date=None, seed=42, progress=None):
+    """
+    Create synthetic transactions.
+
+    The same count, suppliers, years, end_date and seed always produce the
+    same data. Numbering continues after the synthetic transactions that
+    already exist, so repeated calls add to the data set.
+
+    Args:
+        count (int): Number of transactions to create (at most MAX_SYNTHETIC_TRANSACTIONS)
+        suppliers (int): Number of suppliers to spread purchases over
+        years (int): Length of the period the dates are spread over
+        end_date (date, optional): Last transaction date. Defaults to today.
+        seed (int): Random seed
+        progress (callable, optional): Called with the number of transactions created so far
+
+    Returns:
+        int: Number of transactions created
+    """
+    if count > MAX_SYNTHETIC_TRANSACTIONS:
+        raise ValueError(f"At most {MAX_SYNTHETIC_TRANSACTIONS} transactions can be generated")
+
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    days = max(1, int(years * 365))
+    reference = _ensure_reference_data(suppliers, rng)
+    start = Transaction.objects.filter(tripletex_id__startswith=SYNTHETIC_PREFIX).count()
+
+    created = 0
+    for batch_start in range(start, start + count, GENERATE_BATCH_SIZE):
+        batch_end = min(batch_start + GENERATE_BATCH_SIZE, start + count)
+        transactions, postings, close_groups = [], [], []
+        for number in range(batch_start, batch_end):
+            day = end_date - timedelta(days=rng.randrange(days))
+            transaction, accounts, close_group = _build_transaction(number, day, reference, rng)
+            transactions.append(transaction)
+            postings.append(accounts)
+            if close_group:
+                close_groups.append(close_group)
+
+        with db_transaction.atomic():
+            transactions = Transaction.objects.bulk_create(transactions)
+            TransactionAccount.objects.bulk_create([
+                TransactionAccount(transaction=transaction, **kwargs)
+                for transaction, accounts in zip(transactions, postings)
+                for kwargs in accounts
+            ])
+            _save_close_groups(close_groups)
+
+        created += len(transactions)
+        if progress:
+            progress(created)
+
+    bump_generation(TransactionAccount, LedgerPosting, CloseGroup)
+    logger.info(f"Generated {created} synthetic transactions")
+    return created
+
+
+def clear_synthetic_data():
+    """
+    Delete every generated row, leaving imported data alone.
+
+    Rows are deleted with single DELETE statements instead of Django's
+    per-object cascade, which would be far too slow for a million rows.
+
+    Returns:
+        int: Number of transactions deleted
+    """
+    transactions = Transaction.objects.filter(tripletex_id__startswith=SYNTHETIC_PREFIX)
+    with db_transaction.atomic():
+        for model in (SpendingFact, TransactionAccount, TransactionNgram):
+            queryset = model.objects.filter(transaction__in=transactions.values('id'))
+            queryset._raw_delete(queryset.db)
+        deleted = transactions._raw_delete(transactions.db)
+
+        close_groups = CloseGroup.objects.filter(tripletex_id__startswith=SYNTHETIC_PREFIX)
+        links = CloseGroupPosting.objects.filter(close_group__in=close_groups.values('id'))
+        links._raw_delete(links.db)
+        close_groups._raw_delete(close_groups.db)
+        postings = LedgerPosting.objects.filter(voucher_number__startswith=SYNTHETIC_PREFIX)
+        postings._raw_delete(postings.db)
+
+    bump_generation(Transaction, TransactionAccount, TransactionNgram, LedgerPosting, CloseGroup)
+    logger.info(f"Deleted {deleted} synthetic transactions")
+    return deleted
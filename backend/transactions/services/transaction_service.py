@@ -5,14 +5,22 @@ Handles business logic for transactions.
 import logging
 import os
 import json
+import contextvars
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
-from calendar import monthrange
+from decimal import Decimal
 import requests
-from django.db import transaction
-from django.db.models import Sum, Count, Q
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Sum, Count, Q, Value
+from django.db.models.functions import Abs, Coalesce, NullIf
 from django.utils.text import slugify
 
-from ..models import Transaction, Category, BankAccount
+from ..models import (
+    Transaction, Category, BankAccount, TransactionAccount, SpendingFact, Supplier, CategorySupplierMap
+)
 from ..utils.tripletex import (
     get_api_headers, 
     get_date_range, 
@@ -21,10 +29,26 @@ from ..utils.tripletex import (
     save_transaction_cache,
     clean_bank_account_id
 )
-from ..constants import INTERNAL_TRANSFER_KEYWORDS, CATEGORY_KEYWORDS
+from ..utils import perf
+from ..utils.cache import bump_generation
+from ..utils.timing import timed
+from .category_service import get_supplier_category_map, mapped_category_id
+from .facts_service import MINOR_UNITS, to_minor_units
+from .snapshot_service import get_snapshot, UnsupportedFilter
+from ..constants import (
+    INTERNAL_TRANSFER_KEYWORDS, CATEGORY_KEYWORDS, TRIPLETEX_API_BASE_URL, UNCATEGORIZED_CATEGORY_NAME
+)
 
 logger = logging.getLogger('transactions')
 
+# Threads for the independent summary aggregates
+SUMMARY_WORKERS = 4
+_summary_executor = None
+_summary_executor_lock = threading.Lock()
+
+# Ids per UPDATE ... WHERE id IN (...) when categorizing in bulk
+BULK_CATEGORIZE_BATCH_SIZE = 500
+
 def get_all_transactions(filters=None):
     """
     Get all transactions with optional filtering.
@@ -35,7 +59,7 @@ def get_all_transactions(filters=None):
     Returns:
         QuerySet: Filtered transaction queryset
     """
-    queryset = Transaction.objects.all().order_by('-date')
+    queryset = Transaction.objects.analytics_shape().order_by('-date')
     
     if not filters:
         return queryset
@@ -51,7 +75,7 @@ def get_all_transactions(filters=None):
         queryset = queryset.filter(category_id=filters['category'])
     
     if 'search' in filters and filters['search']:
-        queryset = queryset.filter(description__icontains=filters['search'])
+        queryset = queryset.search(filters['search'])
     
     if 'bank_account' in filters and filters['bank_account']:
         queryset = queryset.filter(bank_account_id=filters['bank_account'])
@@ -102,69 +126,202 @@ def get_transaction_by_tripletex_id(tripletex_id):
         logger.debug(f"Transaction with Tripletex ID {tripletex_id} not found")
         return None
 
-def get_transaction_summary(filters=None):
+# Filters that get_spending_facts can answer from the fact table
+SPENDING_FACT_FILTERS = {'date_from', 'date_to', 'category', 'bank_account', 'amount_min', 'amount_max'}
+
+def get_spending_facts(filters=None):
     """
-    Get a summary of transactions including total amount, count, and category breakdown.
+    Get the spending facts matching transaction filters.
     
     Args:
-        filters (dict): Optional filters to apply to the queryset
+        filters (dict): Optional filters, as accepted by get_all_transactions
         
     Returns:
-        dict: Transaction summary data
+        QuerySet: SpendingFact queryset, or None if a filter needs the
+            transaction table (search and flag filters)
     """
-    transactions = get_all_transactions(filters)
+    filters = {key: value for key, value in (filters or {}).items() if value not in (None, '')}
+    if not SPENDING_FACT_FILTERS.issuperset(filters):
+        return None
     
-    # Get total count and amount
-    total_transactions = transactions.count()
-    total_amount = transactions.aggregate(Sum('amount'))['amount__sum'] or 0
+    facts = SpendingFact.objects.all()
+    if filters.get('date_from'):
+        facts = facts.filter(date__gte=filters['date_from'])
+    if filters.get('date_to'):
+        facts = facts.filter(date__lte=filters['date_to'])
+    if filters.get('category'):
+        facts = facts.filter(category_id=filters['category'])
+    if filters.get('bank_account'):
+        facts = facts.filter(bank_account_id=filters['bank_account'])
+    if filters.get('amount_min'):
+        facts = facts.filter(amount_minor__gte=to_minor_units(filters['amount_min']))
+    if filters.get('amount_max'):
+        facts = facts.filter(amount_minor__lte=to_minor_units(filters['amount_max']))
+    return facts
+
+def _can_query_concurrently(using='default'):
+    """
+    Check whether independent queries may run on separate connections.
     
-    # Get category breakdown
-    categories = {}
-    category_breakdown = transactions.values('category__name').annotate(
-        total=Sum('amount'),
-        count=Count('id')
-    ).order_by('-total')
+    Other connections cannot see an open transaction's uncommitted writes,
+    nor a private in-memory SQLite database, so those cases run in sequence.
+    With a single CPU the threads would only add overhead.
+    """
+    if not getattr(settings, 'SUMMARY_CONCURRENT_QUERIES', True) or (os.cpu_count() or 1) < 2:
+        return False
+    connection = connections[using]
+    if connection.in_atomic_block:
+        return False
+    return not (connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+
+def _get_summary_executor():
+    global _summary_executor
+    with _summary_executor_lock:
+        if _summary_executor is None:
+            _summary_executor = ThreadPoolExecutor(
+                max_workers=SUMMARY_WORKERS, thread_name_prefix='summary'
+            )
+        return _summary_executor
+
+
+def _run_in_worker(name, query, timings):
+    # Runs in a copy of the request's context, so the request's metrics are
+    # current here; connections are per thread, so this thread's own
+    # connections are instrumented and closed again after the query.
+    try:
+        with perf.instrument_connections(perf.current_metrics()), timed(timings, name):
+            return query()
+    finally:
+        connections.close_all()
+
+
+def run_summary_queries(queries, timings=None):
+    """
+    Run independent queries, concurrently when it is safe.
     
-    for item in category_breakdown:
-        category_name = item['category__name'] or 'Uncategorized'
-        categories[category_name] = {
-            'total': float(item['total']) if item['total'] else 0,
+    Args:
+        queries (dict): Name -> callable that runs and fully evaluates one query
+        timings (dict, optional): Filled with name -> milliseconds per query
+        
+    Returns:
+        dict: Name -> query result
+    """
+    if len(queries) < 2 or not _can_query_concurrently():
+        results = {}
+        for name, query in queries.items():
+            with timed(timings, name):
+                results[name] = query()
+        return results
+    
+    executor = _get_summary_executor()
+    # One context copy per task; a context can't be entered by two threads
+    futures = {
+        name: executor.submit(contextvars.copy_context().run, _run_in_worker, name, query, timings)
+        for name, query in queries.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+def _breakdown(rows, name_of, to_amount, total_amount):
+    breakdown = {}
+    for item in rows:
+        breakdown[name_of(item)] = {
+            'total': to_amount(item['total']),
             'count': item['count'],
-            'percentage': round((float(item['total'] or 0) / float(total_amount)) * 100, 2) if total_amount else 0
+            'percentage': round((to_amount(item['total']) / total_amount) * 100, 2) if total_amount else 0
         }
+    return breakdown
+
+
+def get_transaction_summary(filters=None, timings=None):
+    """
+    Get a summary of transactions including total amount, count, and category breakdown.
+    
+    Uses the in-memory snapshot when enabled, then the spending facts when
+    the filters allow it, and the transaction table otherwise. On the
+    database paths the totals and the three breakdowns are independent
+    queries and run concurrently (see run_summary_queries).
     
-    # Get bank account breakdown
-    bank_accounts = {}
-    account_breakdown = transactions.values('bank_account__name', 'bank_account_id').annotate(
-        total=Sum('amount'),
+    Args:
+        filters (dict): Optional filters to apply to the queryset
+        timings (dict, optional): Filled with name -> milliseconds for each
+            aggregate, for the Server-Timing header
+        
+    Returns:
+        dict: Transaction summary data
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        try:
+            with timed(timings, 'snapshot'):
+                return snapshot.summary(filters)
+        except UnsupportedFilter:
+            if timings is not None:
+                timings.pop('snapshot', None)
+    
+    transactions = get_spending_facts(filters)
+    if transactions is not None:
+        amount_field, id_field, divisor = 'amount_minor', 'transaction_id', MINOR_UNITS
+    else:
+        transactions = get_all_transactions(filters).order_by()
+        amount_field, id_field, divisor = 'amount', 'id', 1
+    
+    def to_amount(value):
+        return float(value or 0) / divisor
+    
+    # Postings without an amount fall back to the transaction amount
+    related_accounts_query = TransactionAccount.objects.filter(
+        transaction__in=transactions.order_by().values(id_field)
+    ).values(
+        'account_id', 'account__name', 'account__account_number'
+    ).annotate(
+        total=Sum(Abs(Coalesce(NullIf('amount', Value(Decimal('0'))), 'transaction__amount'))),
         count=Count('id')
-    ).order_by('-total')
+    )
     
-    for item in account_breakdown:
-        account_name = item['bank_account__name'] or item['bank_account_id'] or 'Unknown'
-        bank_accounts[account_name] = {
-            'total': float(item['total']) if item['total'] else 0,
-            'count': item['count'],
-            'percentage': round((float(item['total'] or 0) / float(total_amount)) * 100, 2) if total_amount else 0
-        }
+    results = run_summary_queries({
+        'totals': lambda: transactions.aggregate(count=Count('*'), total=Sum(amount_field)),
+        'categories': lambda: list(
+            transactions.values('category__name').annotate(
+                total=Sum(amount_field), count=Count('*')
+            ).order_by('-total')
+        ),
+        'bank_accounts': lambda: list(
+            transactions.values('bank_account__name', 'bank_account_id').annotate(
+                total=Sum(amount_field), count=Count('*')
+            ).order_by('-total')
+        ),
+        'related_accounts': lambda: list(related_accounts_query),
+    }, timings)
+    
+    total_transactions = results['totals']['count']
+    total_amount = to_amount(results['totals']['total'])
+    
+    categories = _breakdown(
+        results['categories'],
+        lambda item: item['category__name'] or 'Uncategorized',
+        to_amount, total_amount
+    )
+    bank_accounts = _breakdown(
+        results['bank_accounts'],
+        lambda item: item['bank_account__name'] or item['bank_account_id'] or 'Unknown',
+        to_amount, total_amount
+    )
     
-    # Get related accounts breakdown
     related_accounts = {}
-    for transaction in transactions.prefetch_related('transaction_accounts__account'):
-        for ta in transaction.transaction_accounts.all():
-            if ta.account:
-                account_name = ta.account.name or ta.account.account_number or f"Account {ta.account.id}"
-                amount = float(ta.amount) if ta.amount else float(transaction.amount)
-                
-                if account_name not in related_accounts:
-                    related_accounts[account_name] = {
-                        'total': 0,
-                        'count': 0,
-                        'percentage': 0
-                    }
-                
-                related_accounts[account_name]['total'] += abs(amount)
-                related_accounts[account_name]['count'] += 1
+    for item in results['related_accounts']:
+        account_name = item['account__name'] or item['account__account_number'] or f"Account {item['account_id']}"
+        
+        if account_name not in related_accounts:
+            related_accounts[account_name] = {
+                'total': 0,
+                'count': 0,
+                'percentage': 0
+            }
+        
+        related_accounts[account_name]['total'] += float(item['total'] or 0)
+        related_accounts[account_name]['count'] += item['count']
     
     # Calculate percentages for related accounts
     total_related_amount = sum(acc['total'] for acc in related_accounts.values())
@@ -174,7 +331,7 @@ def get_transaction_summary(filters=None):
     
     return {
         'total_transactions': total_transactions,
-        'total_amount': float(total_amount),
+        'total_amount': total_amount,
         'categories': categories,
         'bank_accounts': bank_accounts,
         'related_accounts': related_accounts
@@ -208,6 +365,152 @@ def update_transaction_category(transaction_id, category_id):
         logger.error(f"Error updating category for transaction {transaction_id}: {str(e)}")
         return False
 
+def _batches(ids, size=None):
+    ids = list(ids)
+    size = size or BULK_CATEGORIZE_BATCH_SIZE
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+def _existing_ids(model, ids):
+    found = set()
+    for batch in _batches(ids):
+        found.update(model.objects.filter(id__in=batch).values_list('id', flat=True))
+    return found
+
+def set_supplier_categories(supplier_categories):
+    """
+    Make each supplier map to exactly one category, or to none.
+    
+    Mappings of the suppliers to other categories are deleted and the new
+    ones are upserted on the (supplier, category) unique constraint.
+    
+    Args:
+        supplier_categories (dict): Supplier id -> category id, or None to
+            remove the supplier's mappings
+        
+    Returns:
+        tuple: (mappings saved, mappings deleted)
+    """
+    by_category = defaultdict(list)
+    for supplier_id, category_id in supplier_categories.items():
+        by_category[category_id].append(supplier_id)
+    
+    deleted = 0
+    mappings = []
+    with transaction.atomic():
+        for category_id, supplier_ids in by_category.items():
+            for batch in _batches(supplier_ids):
+                stale = CategorySupplierMap.objects.filter(supplier_id__in=batch)
+                if category_id is not None:
+                    stale = stale.exclude(category_id=category_id)
+                deleted += stale.delete()[0]
+            if category_id is not None:
+                mappings.extend(
+                    CategorySupplierMap(supplier_id=supplier_id, category_id=category_id)
+                    for supplier_id in supplier_ids
+                )
+        
+        if mappings:
+            CategorySupplierMap.objects.bulk_create(
+                mappings,
+                batch_size=BULK_CATEGORIZE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['supplier', 'category'],
+                update_fields=['updated_at']
+            )
+    
+    return len(mappings), deleted
+
+def bulk_categorize(assignments, propagate=True):
+    """
+    Apply many category assignments in one database transaction.
+    
+    Assignments are grouped by category and written with one UPDATE per
+    category and batch of ids, instead of one save() per transaction.
+    Supplier assignments are applied before transaction assignments, and
+    a later assignment to the same transaction or supplier replaces an
+    earlier one.
+    
+    Args:
+        assignments (list): Dicts with 'category_id' (None to remove the
+            category) and either 'transaction_id' or 'supplier_id'
+        propagate (bool): Whether a transaction assignment also applies to
+            every transaction of its supplier and to the supplier's mapping,
+            as categorizing a single transaction does
+        
+    Returns:
+        dict: Counts of updated transactions, suppliers and mappings
+        
+    Raises:
+        ValueError: If an assignment refers to an unknown id
+    """
+    transaction_ids = {item['transaction_id'] for item in assignments if 'transaction_id' in item}
+    supplier_ids = {item['supplier_id'] for item in assignments if 'supplier_id' in item}
+    category_ids = {item['category_id'] for item in assignments if item.get('category_id') is not None}
+    
+    transaction_suppliers = {}
+    for batch in _batches(transaction_ids):
+        transaction_suppliers.update(
+            Transaction.objects.filter(id__in=batch).values_list('id', 'supplier_id')
+        )
+    
+    for name, ids, found in (
+        ('transaction', transaction_ids, set(transaction_suppliers)),
+        ('supplier', supplier_ids, _existing_ids(Supplier, supplier_ids)),
+        ('category', category_ids, _existing_ids(Category, category_ids)),
+    ):
+        missing = ids - found
+        if missing:
+            raise ValueError(f"Unknown {name} ids: {', '.join(str(i) for i in sorted(missing))}")
+    
+    supplier_categories = {}
+    transaction_categories = {}
+    for item in assignments:
+        category_id = item.get('category_id')
+        if 'supplier_id' in item:
+            supplier_categories[item['supplier_id']] = category_id
+            continue
+        
+        supplier_id = transaction_suppliers[item['transaction_id']]
+        if propagate and supplier_id is not None:
+            supplier_categories[supplier_id] = category_id
+        else:
+            transaction_categories[item['transaction_id']] = category_id
+    
+    def group_by_category(categories):
+        groups = defaultdict(list)
+        for target_id, category_id in categories.items():
+            groups[category_id].append(target_id)
+        return groups
+    
+    transactions_updated = 0
+    with transaction.atomic():
+        for category_id, ids in group_by_category(supplier_categories).items():
+            for batch in _batches(ids):
+                transactions_updated += Transaction.objects.filter(
+                    supplier_id__in=batch
+                ).update(category_id=category_id)
+        
+        for category_id, ids in group_by_category(transaction_categories).items():
+            for batch in _batches(ids):
+                transactions_updated += Transaction.objects.filter(
+                    id__in=batch
+                ).update(category_id=category_id)
+        
+        mappings_saved, mappings_deleted = set_supplier_categories(supplier_categories)
+    
+    logger.info(
+        f"Bulk categorized {len(assignments)} assignments: {transactions_updated} transactions, "
+        f"{len(supplier_categories)} suppliers"
+    )
+    return {
+        'assignments': len(assignments),
+        'transactions_updated': transactions_updated,
+        'suppliers_updated': len(supplier_categories),
+        'mappings_saved': mappings_saved,
+        'mappings_deleted': mappings_deleted,
+    }
+
 def import_transactions_from_tripletex():
     """
     Import transactions from Tripletex API.
@@ -226,6 +529,13 @@ def import_transactions_from_tripletex():
     updated_count = 0
     error_count = 0
     
+    # Supplier -> category map, loaded once per run. Transactions still in
+    # the default category are remapped like uncategorized ones
+    category_map = get_supplier_category_map()
+    default_category_id = Category.objects.filter(
+        name=UNCATEGORIZED_CATEGORY_NAME
+    ).values_list('id', flat=True).first()
+    
     # Process each date range
     for date_range in date_ranges:
         try:
@@ -243,51 +553,53 @@ def import_transactions_from_tripletex():
             statements = response.json().get('values', [])
             logger.info(f"Retrieved {len(statements)} bank statements for {date_range['from_date']} to {date_range['to_date']}")
             
-            # Process each statement
-            with transaction.atomic():
-                for statement in statements:
-                    try:
-                        # Extract transaction details
-                        transaction_id = statement.get('id')
-                        
-                        # Skip if no transaction ID
-                        if not transaction_id:
-                            continue
-                        
-                        # Get details from API
-                        transaction_details = get_transaction_details(transaction_id)
-                        
-                        # Cache transaction details
-                        transaction_cache[str(transaction_id)] = transaction_details
-                        
-                        # Extract data
-                        description = statement.get('description', '')
-                        date_str = statement.get('accountingDate', '')
-                        date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else None
-                        
-                        # Calculate amount (in - out)
-                        amount_in = float(statement.get('amountIn', 0) or 0)
-                        amount_out = float(statement.get('amountOut', 0) or 0)
-                        amount = amount_in - amount_out
-                        
-                        # Get bank account info
-                        bank_account_name = None
+            # Process each statement. API calls happen outside the database
+            # transaction, and each statement is written in its own short
+            # transaction so dashboard reads are never blocked for long.
+            for statement in statements:
+                try:
+                    # Extract transaction details
+                    transaction_id = statement.get('id')
+                    
+                    # Skip if no transaction ID
+                    if not transaction_id:
+                        continue
+                    
+                    # Get details from API
+                    transaction_details = get_transaction_details(transaction_id)
+                    
+                    # Cache transaction details
+                    transaction_cache[str(transaction_id)] = transaction_details
+                    
+                    # Extract data
+                    description = statement.get('description', '')
+                    date_str = statement.get('accountingDate', '')
+                    date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else None
+                    
+                    # Calculate amount (in - out)
+                    amount_in = float(statement.get('amountIn', 0) or 0)
+                    amount_out = float(statement.get('amountOut', 0) or 0)
+                    amount = amount_in - amount_out
+                    
+                    # Get bank account info
+                    bank_account_name = None
+                    account_id = None
+                    
+                    if 'postings' in statement and statement['postings']:
+                        bank_posting = statement['postings'][0]
+                        account_id = bank_posting.get('account', {}).get('number')
+                        bank_account_name = bank_posting.get('account', {}).get('name')
+                    
+                    with transaction.atomic():
+                        # Create or get bank account
                         bank_account_obj = None
-                        account_id = None
-                        
-                        if 'postings' in statement and statement['postings']:
-                            bank_posting = statement['postings'][0]
-                            account_id = bank_posting.get('account', {}).get('number')
-                            bank_account_name = bank_posting.get('account', {}).get('name')
-                            
-                            # Create or get bank account
-                            if bank_account_name:
-                                bank_account_obj, created = BankAccount.objects.get_or_create(
-                                    name=bank_account_name,
-                                    defaults={
-                                        'account_number': account_id
-                                    }
-                                )
+                        if bank_account_name:
+                            bank_account_obj, created = BankAccount.objects.get_or_create(
+                                name=bank_account_name,
+                                defaults={
+                                    'account_number': account_id
+                                }
+                            )
                         
                         # Check if transaction already exists
                         existing = get_transaction_by_tripletex_id(str(transaction_id))
@@ -301,6 +613,9 @@ def import_transactions_from_tripletex():
                             existing.account_id = account_id
                             existing.raw_data = transaction_details
                             existing.bank_account = bank_account_obj
+                            existing.category_id = mapped_category_id(
+                                category_map, existing.supplier_id, existing.category_id, default_category_id
+                            )
                             existing.save()
                             updated_count += 1
                         else:
@@ -323,10 +638,10 @@ def import_transactions_from_tripletex():
                             
                             # Auto-categorize
                             auto_categorize_transaction(new_transaction)
-                    
-                    except Exception as e:
-                        logger.error(f"Error processing transaction {transaction_id}: {str(e)}")
-                        error_count += 1
+                
+                except Exception as e:
+                    logger.error(f"Error processing transaction {transaction_id}: {str(e)}")
+                    error_count += 1
         
         except Exception as e:
             logger.error(f"Error retrieving transactions for {date_range['from_date']} to {date_range['to_date']}: {str(e)}")
@@ -335,6 +650,9 @@ def import_transactions_from_tripletex():
     # Save cache
     save_transaction_cache(transaction_cache)
     
+    # Invalidate cached responses built from the imported tables
+    bump_generation(Transaction, BankAccount, TransactionAccount)
+    
     # Return summary
     return {
         'new_transactions': new_count,
@@ -342,6 +660,19 @@ def import_transactions_from_tripletex():
         'errors': error_count
     }
 
+def is_internal_transfer_description(description):
+    """
+    Check a description for internal transfer keywords.
+    
+    Args:
+        description (str): The transaction description
+        
+    Returns:
+        bool: True if the description names an internal transfer
+    """
+    description = description.lower() if description else ''
+    return any(keyword in description for keyword in INTERNAL_TRANSFER_KEYWORDS)
+
 def detect_internal_transfer(transaction_obj):
     """
     Detect if a transaction is an internal transfer.
@@ -355,19 +686,14 @@ def detect_internal_transfer(transaction_obj):
     if not transaction_obj:
         return False
     
-    # Check description for keywords
-    description = transaction_obj.description.lower() if transaction_obj.description else ''
-    
-    is_internal = any(keyword in description for keyword in INTERNAL_TRANSFER_KEYWORDS)
-    
-    if is_internal:
+    if is_internal_transfer_description(transaction_obj.description):
         transaction_obj.is_internal_transfer = True
         transaction_obj.save()
         logger.info(f"Detected internal transfer: {transaction_obj.description}")
         return True
     
-    # Check raw data if available
-    if transaction_obj.raw_data:
+    # Check raw data if available (skipped when the caller deferred it)
+    if 'raw_data' not in transaction_obj.get_deferred_fields() and transaction_obj.raw_data:
         try:
             # Add additional checks for raw data if needed
             pass
@@ -413,27 +739,38 @@ def update_all_internal_transfers():
     """
     Update all transactions to identify internal transfers.
     
+    Descriptions are checked in memory and the new matches are marked with
+    batched UPDATEs, which also refresh their spending facts.
+    
     Returns:
         dict: Summary of update operation
     """
-    transactions = Transaction.objects.all()
+    rows = Transaction.objects.order_by().values_list('id', 'description', 'is_internal_transfer')
     
-    updated_count = 0
+    new_transfer_ids = []
     already_marked_count = 0
+    total_processed = 0
     
-    for transaction_obj in transactions:
-        was_internal = transaction_obj.is_internal_transfer
-        
-        if detect_internal_transfer(transaction_obj):
-            if was_internal:
-                already_marked_count += 1
-            else:
-                updated_count += 1
+    for transaction_id, description, is_internal in rows.iterator(chunk_size=2000):
+        total_processed += 1
+        if not is_internal_transfer_description(description):
+            continue
+        if is_internal:
+            already_marked_count += 1
+        else:
+            new_transfer_ids.append(transaction_id)
+    
+    for start in range(0, len(new_transfer_ids), 1000):
+        Transaction.objects.filter(
+            id__in=new_transfer_ids[start:start + 1000]
+        ).update(is_internal_transfer=True)
+    
+    logger.info(f"Marked {len(new_transfer_ids)} new internal transfers")
     
     return {
-        'updated_transactions': updated_count,
+        'updated_transactions': len(new_transfer_ids),
         'already_marked': already_marked_count,
-        'total_processed': transactions.count()
+        'total_processed': total_processed
     }
 
 def get_monthly_budget_data(exclude_salary=True, year=None, month=None):
@@ -455,9 +792,6 @@ def get_monthly_budget_data(exclude_salary=True, year=None, month=None):
     year = int(year) if year is not None else today.year
     month = int(month) if month is not None else today.month
     
-    start_date = date(year, month, 1)
-    end_date = date(year, month, monthrange(year, month)[1])
-    
     # Get all categories with budgets
     categories = Category.objects.all()
     
@@ -469,30 +803,29 @@ def get_monthly_budget_data(exclude_salary=True, year=None, month=None):
             Q(name__icontains='wage')
         )
     
-    # Get transactions for the specified month
-    transactions = Transaction.objects.filter(
-        date__gte=start_date,
-        date__lte=end_date, 
-        is_internal_transfer=False,
-        amount__lt=0  # Only include expenses (negative amounts)
-    )
+    # Sum the month's expenses per category, in memory or in one index-only
+    # query. Only internal transfers are left out.
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        spent_by_category = snapshot.expenses_by_category(year, month)
+    else:
+        spent_by_category = {
+            row['category_id']: Decimal(row['total']) / MINOR_UNITS
+            for row in SpendingFact.objects.filter(
+                is_expense=True,
+                month_key=year * 100 + month
+            ).values('category_id').annotate(total=Sum('abs_amount_minor')).order_by()
+        }
     
     # Calculate totals
     total_budget = sum(category.budget for category in categories)
-    total_spent = abs(transactions.filter(
-        category__in=categories,
-        amount__lt=0  # Only count expenses (negative amounts)
-    ).aggregate(total=Sum('amount'))['total'] or 0)
+    total_spent = sum((spent_by_category.get(category.id, Decimal('0')) for category in categories), Decimal('0'))
     
     # Collect data by category
     category_data = []
     
     for category in categories:
-        # Sum all expenses (negative amounts) for this category
-        spent_amount = abs(transactions.filter(
-            category=category,
-            amount__lt=0  # Only count expenses (negative amounts)
-        ).aggregate(total=Sum('amount'))['total'] or 0)
+        spent_amount = spent_by_category.get(category.id, Decimal('0'))
         
         category_data.append({
             'id': category.id,
@@ -0,0 +1,82 @@
+"""
+Signal handlers for the transactions app.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import (
+    Account, BankAccount, Category, CategorySupplierMap, LedgerPosting, Supplier, Transaction,
+    TransactionAccount,
+)
+from .services.facts_service import sync_spending_facts
+from .services.similarity_service import index_description
+from .utils.cache import bump_generation
+
+# Models whose generations cached responses embed: the API's cache keys and
+# ETags, the transaction snapshot and the admin's cached counts. Receivers
+# are only connected for these, so other models (and cascades into them)
+# keep Django's fast deletes and their writes invalidate nothing.
+CACHED_MODELS = (
+    Transaction, Category, BankAccount, Supplier, Account, TransactionAccount, CategorySupplierMap,
+    LedgerPosting,
+)
+
+
+def bump_generation_on_write(sender, using=None, **kwargs):
+    """
+    Invalidate cached responses that depend on the written model.
+    """
+    bump_generation(sender, using=using)
+
+
+for _model in CACHED_MODELS:
+    post_save.connect(
+        bump_generation_on_write, sender=_model,
+        dispatch_uid=f'transactions_bump_generation_on_save_{_model._meta.model_name}',
+    )
+    post_delete.connect(
+        bump_generation_on_write, sender=_model,
+        dispatch_uid=f'transactions_bump_generation_on_delete_{_model._meta.model_name}',
+    )
+
+
+@receiver(post_save, sender=Transaction, dispatch_uid='transactions_sync_spending_fact')
+def sync_spending_fact(sender, instance, raw=False, **kwargs):
+    """
+    Keep the transaction's spending fact in step with every save.
+    """
+    if raw:
+        return
+    sync_spending_facts([instance.pk])
+
+
+@receiver(post_save, sender=Transaction, dispatch_uid='transactions_index_description')
+def index_transaction_description(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """
+    Re-index the transaction's n-grams when its description changed.
+    """
+    if raw or 'description' in instance.get_deferred_fields():
+        return
+    if update_fields is not None and 'description' not in update_fields:
+        return
+    # Instances loaded from the database remember the indexed description
+    if not created and getattr(instance, '_indexed_description', None) is not None \
+            and instance._indexed_description == instance.description:
+        return
+    index_description(instance.pk, instance.description)
+    instance._indexed_description = instance.description
+
+
+@receiver(connection_created, dispatch_uid='transactions_configure_sqlite_connection')
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    Apply settings.SQLITE_PRAGMAS to new SQLite connections.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -1,3 +1,1572 @@
-from django.test import TestCase
+import csv
+import importlib
+import io
+import json
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.db import connection, transaction as db_transaction
+from django.db.models import F
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .api.renderers import FastJSONRenderer
+from .api.row_builders import TransactionRowBuilder
+from .api.serializers import TransactionSerializer, TransactionSummarySerializer
+from .models import (
+    Transaction, Category, BankAccount, Supplier, Account, TransactionAccount, TransactionNgram, SpendingFact,
+    CategorySupplierMap, CloseGroup, LedgerPosting
+)
+from .services.category_service import get_supplier_category_map, mapped_category_id, reapply_supplier_category_map
+from .services.facts_service import rebuild_spending_facts
+from .services.snapshot_service import clear_snapshot, get_snapshot
+from .services.synthetic_data_service import (
+    MAX_SYNTHETIC_TRANSACTIONS, SYNTHETIC_PREFIX, clear_synthetic_data, generate_synthetic_data
+)
+from .services.similarity_service import index_transactions, description_ngrams
+from .constants import (
+    TIMESERIES_GRANULARITIES, ANALYTICS_GROUP_BY_FIELDS, TIMESERIES_MAX_PERIODS, TIMESERIES_MAX_TOP, TREEMAP_MAX_TOP
+)
+from .services.analytics_service import get_transaction_timeseries
+from .services import transaction_service
+from .services.transaction_service import get_all_transactions, get_monthly_budget_data, get_transaction_summary
+from .utils import perf
+from .utils.ann_index import IVFIndex
+from .utils.embedding_store import HAS_NUMPY, EmbeddingStore, description_key
+from .utils.text import normalize_description
+from .utils.vector_search import group_starts, top_k_groups
+from .utils.cache import get_generations, request_generations, versioned_cache_key
+
+if HAS_NUMPY:
+    import numpy as np
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'transactions.utils.cache_backends.TieredCache',
+        'OPTIONS': {
+            'SHARED_ALIAS': 'shared',
+            'LOCAL_MAX_BYTES': 1024 * 1024,
+        }
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'transactions-tests',
+    },
+}
+
+# The manifest storage needs collectstatic output, which tests don't have
+TEST_STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TransactionAPITestCase(TestCase):
+    """
+    Base test case with a small set of transactions.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.groceries = Category.objects.create(name='Groceries', budget=Decimal('1000.00'))
+        cls.travel = Category.objects.create(name='Travel', budget=Decimal('500.00'))
+        cls.bank_account = BankAccount.objects.create(name='Main account', account_number='1234')
+        cls.supplier = Supplier.objects.create(tripletex_id='S1', name='Rema 1000')
+        cls.transactions = [
+            Transaction.objects.create(
+                tripletex_id=f'T{i}',
+                description=f'REMA 1000 TRONDHEIM {i}',
+                amount=Decimal('-100.50') * (i + 1),
+                date=date(2025, 1, 1 + i),
+                category=cls.groceries,
+                bank_account=cls.bank_account,
+                supplier=cls.supplier,
+                raw_data={'value': {'groupedPostings': [{'description': 'Matvarer'}]}},
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        clear_snapshot()
+        self.client = APIClient()
+
+    def assertConstantQueryCount(self, url, add_rows):
+        """
+        Assert that the number of queries for url does not grow with the data.
+
+        Args:
+            url (str): URL to request
+            add_rows (callable): Creates more rows shown on the page
+        """
+        with CaptureQueriesContext(connection) as before:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        add_rows()
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(after.captured_queries), len(before.captured_queries),
+            f"{url} runs more queries as rows are added"
+        )
+        return response
+
+
+class VersionedCacheTests(TransactionAPITestCase):
+
+    def test_write_changes_generation_and_key(self):
+        key_before = versioned_cache_key('test', [Transaction], {'page': '1'})
+        generation_before = get_generations(Transaction)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.filter(id=self.transactions[0].id).update(category=self.travel)
+
+        self.assertNotEqual(get_generations(Transaction), generation_before)
+        self.assertNotEqual(versioned_cache_key('test', [Transaction], {'page': '1'}), key_before)
+
+    def test_list_is_invalidated_by_category_update(self):
+        transaction = self.transactions[0]
+        response = self.client.get('/api/v1/transactions/')
+        self.assertEqual(response.status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f'/api/v1/transactions/{transaction.id}/update_category/',
+                {'category_id': self.travel.id},
+                format='json',
+            )
+
+        response = self.client.get('/api/v1/transactions/')
+        row = next(r for r in response.data['results'] if r['id'] == transaction.id)
+        self.assertEqual(row['category_name'], 'Travel')
+
+    def test_unrelated_generation_is_untouched(self):
+        budget_generation = get_generations(BankAccount)
+        self.client.post(
+            f'/api/v1/categorize/{self.transactions[0].id}/',
+            {'category_id': self.travel.id},
+            format='json',
+        )
+        self.assertEqual(get_generations(BankAccount), budget_generation)
+
+    def test_generation_is_bumped_on_commit(self):
+        generation = get_generations(Transaction)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Transaction.objects.filter(id=self.transactions[0].id).update(category=self.travel)
+            self.transactions[1].save()
+        # Readers keep the old generation until the write is visible
+        self.assertEqual(get_generations(Transaction), generation)
+        self.assertEqual(len(callbacks), 2)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_generations(Transaction), generation)
+
+    def test_rolled_back_write_keeps_generation(self):
+        generation = get_generations(Transaction)
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), db_transaction.atomic():
+                Transaction.objects.filter(id=self.transactions[0].id).update(category=self.travel)
+                raise RuntimeError
+        self.assertEqual(get_generations(Transaction), generation)
+
+    def test_generations_are_read_once_per_request(self):
+        self.client.get('/api/v1/transactions/')
+        shared = caches['shared']
+        with mock.patch.object(shared, 'get_many', wraps=shared.get_many) as get_many:
+            response = self.client.get('/api/v1/transactions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+        reads = [call for call in get_many.call_args_list if any(key.startswith('generation:') for key in call.args[0])]
+        self.assertEqual(len(reads), 1)
+
+    def test_request_sees_its_own_writes(self):
+        with request_generations():
+            before = get_generations(Transaction)
+            with self.captureOnCommitCallbacks(execute=True):
+                Transaction.objects.filter(id=self.transactions[0].id).update(category=self.travel)
+            self.assertNotEqual(get_generations(Transaction), before)
+
+    def test_untracked_models_keep_fast_deletes(self):
+        generations = get_generations(SpendingFact, TransactionNgram)
+        with CaptureQueriesContext(connection) as queries:
+            self.transactions[0].delete()
+
+        # Cascades into models no cache depends on are single DELETEs
+        selects = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'spendingfact' in sql or 'transactionngram' in sql])
+        self.assertEqual(get_generations(SpendingFact, TransactionNgram), generations)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TieredCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_read_through_populates_local_tier(self):
+        caches['shared'].set('key', {'value': 1})
+
+        self.assertEqual(cache.get('key'), {'value': 1})
+        self.assertEqual(cache.get('key'), {'value': 1})
+
+        stats = cache.stats()
+        self.assertEqual(stats['shared_hits'], 1)
+        self.assertEqual(stats['local_hits'], 1)
+
+    def test_write_through_and_byte_bounded_eviction(self):
+        payload = 'x' * (400 * 1024)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, payload)
+
+        stats = cache.stats()
+        self.assertLessEqual(stats['local_bytes'], stats['local_max_bytes'])
+        self.assertEqual(stats['local_evictions'], 1)
+        # Evicted from memory but still served by the shared tier
+        self.assertEqual(caches['shared'].get('a'), payload)
+        self.assertEqual(cache.get('a'), payload)
+
+
+class ProjectionTests(TransactionAPITestCase):
+    """
+    raw_data must never be selected on list and summary paths.
+    """
+
+    def assertRawDataNotFetched(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in queries.captured_queries:
+            self.assertNotIn('"raw_data"', query['sql'], f"{url} fetched raw_data")
+        return response
+
+    def test_list_does_not_fetch_raw_data(self):
+        self.assertRawDataNotFetched('/api/v1/transactions/')
+
+    def test_summary_does_not_fetch_raw_data(self):
+        account = Account.objects.create(tripletex_id='A1', name='Varekjøp')
+        TransactionAccount.objects.create(transaction=self.transactions[0], account=account, amount=None)
+        response = self.assertRawDataNotFetched('/api/v1/transactions/summary/')
+        self.assertEqual(response.data['related_accounts']['Varekjøp']['total'], 100.5)
+
+    @override_settings(STATICFILES_STORAGE=TEST_STATICFILES_STORAGE)
+    def test_admin_changelist_does_not_fetch_raw_data(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.assertRawDataNotFetched('/admin/transactions/transaction/')
+
+    def test_detail_includes_raw_data(self):
+        response = self.client.get(f'/api/v1/transactions/{self.transactions[0].id}/detail_with_raw_data/')
+        self.assertEqual(response.data['raw_data'], self.transactions[0].raw_data)
+
+
+class SparseFieldsetTests(TransactionAPITestCase):
+
+    def test_fields_limits_output_and_skips_related_accounts(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/transactions/?fields=date,amount,category_name')
+        self.assertEqual(set(response.data['results'][0]), {'date', 'amount', 'category_name'})
+        self.assertFalse(any('transactions_transactionaccount' in q['sql'] for q in queries.captured_queries))
+        self.assertFalse(any('transactions_bankaccount' in q['sql'] for q in queries.captured_queries))
+
+    def test_default_fields_are_unchanged(self):
+        response = self.client.get('/api/v1/transactions/')
+        row = response.data['results'][0]
+        self.assertIn('related_accounts', row)
+        self.assertNotIn('ledger_account_detail', row)
+
+    def test_expand_adds_optional_fields(self):
+        account = Account.objects.create(tripletex_id='A1', account_number='4000', name='Varekjøp')
+        Transaction.objects.filter(id=self.transactions[0].id).update(ledger_account=account)
+
+        response = self.client.get('/api/v1/transactions/?fields=id&expand=ledger_account_detail')
+        row = next(r for r in response.data['results'] if r['id'] == self.transactions[0].id)
+        self.assertEqual(row['ledger_account_detail']['account_number'], '4000')
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/v1/transactions/?fields=date,raw_data')
+        self.assertEqual(response.status_code, 400)
+
+
+class FastRenderingTests(TransactionAPITestCase):
+    """
+    The row builder and orjson renderer must match the serializer output.
+    """
+
+    def serializer_rows(self, fields=None):
+        queryset = Transaction.objects.order_by('-date').prefetch_related('transaction_accounts__account')
+        data = TransactionSerializer(queryset, many=True, fields=fields).data
+        return json.loads(JSONRenderer().render(data))
+
+    def builder_rows(self, fields=None):
+        builder = TransactionRowBuilder(fields)
+        rows = builder.build(list(builder.project(Transaction.objects.order_by('-date'))))
+        return json.loads(FastJSONRenderer().render(rows))
+
+    def test_default_fields_match_serializer(self):
+        account = Account.objects.create(tripletex_id='A1', account_number='4000', name='Varekjøp')
+        TransactionAccount.objects.create(transaction=self.transactions[0], account=account, amount=Decimal('-100.50'))
+        TransactionAccount.objects.create(transaction=self.transactions[0], account=account, amount=None)
+        Transaction.objects.filter(id=self.transactions[1].id).update(category=None, supplier=None)
+
+        self.assertEqual(self.builder_rows(), self.serializer_rows())
+
+    def test_sparse_and_expanded_fields_match_serializer(self):
+        account = Account.objects.create(tripletex_id='A1', account_number='4000', name='Varekjøp')
+        Transaction.objects.filter(id=self.transactions[0].id).update(ledger_account=account)
+        fields = ['amount', 'date', 'ledger_account_detail', 'updated_at']
+
+        self.assertEqual(self.builder_rows(fields), self.serializer_rows(fields))
+
+    def test_renderer_matches_drf_encoder(self):
+        data = {'amount': Decimal('1.10'), 'day': date(2025, 1, 1), 'text': 'a b', 1: None}
+        self.assertEqual(
+            json.loads(FastJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data))
+        )
+        self.assertIn(b'\\u2028', FastJSONRenderer().render(data))
+
+
+class ConditionalGetTests(TransactionAPITestCase):
+
+    def test_matching_etag_returns_304_without_queries(self):
+        response = self.client.get('/api/v1/transactions/summary/')
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/transactions/summary/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(queries.captured_queries), 0)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get('/api/v1/categories/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.filter(id=self.transactions[0].id).update(category=self.travel)
+
+        response = self.client.get('/api/v1/categories/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_query_string(self):
+        first = self.client.get('/api/v1/transactions/?page=1')['ETag']
+        second = self.client.get('/api/v1/transactions/?fields=id')['ETag']
+        self.assertNotEqual(first, second)
+        self.assertTrue(self.client.get('/api/v1/bank-accounts/').has_header('ETag'))
+
+
+class TimeseriesTests(TransactionAPITestCase):
+
+    @override_settings(TRANSACTION_SNAPSHOT_ENABLED=False)
+    def test_monthly_series_is_zero_filled(self):
+        Transaction.objects.create(
+            tripletex_id='T-MARCH', description='Fly', amount=Decimal('-200.00'),
+            date=date(2025, 3, 15), category=self.travel,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/transactions/timeseries/?granularity=month&group_by=category')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in queries.captured_queries if 'GROUP BY' in q['sql']]), 1)
+
+        self.assertEqual(response.data['periods'], ['2025-01-01', '2025-02-01', '2025-03-01'])
+        series = {entry['name']: entry for entry in response.data['series']}
+        self.assertEqual(series['Groceries']['totals'], [-603.0, 0.0, 0.0])
+        self.assertEqual(series['Groceries']['counts'], [3, 0, 0])
+        self.assertEqual(series['Travel']['totals'], [0.0, 0.0, -200.0])
+
+    def test_top_merges_remaining_series(self):
+        Transaction.objects.create(
+            tripletex_id='T-TRAVEL', description='Fly', amount=Decimal('-1.00'),
+            date=date(2025, 1, 2), category=self.travel,
+        )
+        response = self.client.get('/api/v1/transactions/timeseries/?granularity=week&group_by=category&top=1')
+        self.assertEqual([entry['name'] for entry in response.data['series']], ['Groceries', 'Other'])
+        self.assertEqual(response.data['periods'], ['2024-12-30'])
+
+    def test_invalid_granularity_is_rejected(self):
+        response = self.client.get('/api/v1/transactions/timeseries/?granularity=year')
+        self.assertEqual(response.status_code, 400)
+
+    def test_top_is_bounded(self):
+        response = self.client.get(f'/api/v1/transactions/timeseries/?group_by=category&top={TIMESERIES_MAX_TOP + 1}')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('top', response.data)
+
+    def test_invalid_filters_are_rejected(self):
+        for query in ('date_from=foo', 'date_to=2025-02-30', 'category=abc', 'bank_account=0', 'amount_min=NaN',
+                      'date_from=2025-02-01&date_to=2025-01-01'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/v1/transactions/timeseries/?{query}')
+                self.assertEqual(response.status_code, 400)
+
+    def test_period_axis_is_bounded(self):
+        response = self.client.get(
+            '/api/v1/transactions/timeseries/?granularity=day&date_from=1900-01-01&date_to=2100-01-01'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(TIMESERIES_MAX_PERIODS), str(response.data['detail']))
+
+        last_day = date(2025, 1, 1) + timedelta(days=TIMESERIES_MAX_PERIODS - 1)
+        response = self.client.get(
+            f'/api/v1/transactions/timeseries/?granularity=day&date_from=2025-01-01&date_to={last_day.isoformat()}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['periods']), TIMESERIES_MAX_PERIODS)
+
+
+class TreemapTests(TransactionAPITestCase):
+
+    def test_hierarchy_uses_one_grouped_query(self):
+        account = Account.objects.create(tripletex_id='A1', account_number='4000', name='Varekjøp')
+        Transaction.objects.filter(id=self.transactions[0].id).update(ledger_account=account)
+        Transaction.objects.create(
+            tripletex_id='T-TRANSFER', description='Overføring', amount=Decimal('-5000.00'),
+            date=date(2025, 1, 5), category=self.groceries, is_internal_transfer=True,
+        )
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/transactions/treemap/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in queries.captured_queries if 'GROUP BY' in q['sql']]), 1)
+
+        groceries = response.data['children'][0]
+        self.assertEqual(groceries['name'], 'Groceries')
+        self.assertEqual(groceries['value'], 603.0)
+        supplier = groceries['children'][0]
+        self.assertEqual(supplier['name'], 'Rema 1000')
+        self.assertEqual(
+            {node['name']: node['value'] for node in supplier['children']},
+            {'Varekjøp': 100.5, 'Unknown account': 502.5}
+        )
+
+    def test_top_prunes_into_other(self):
+        Transaction.objects.create(
+            tripletex_id='T-TRAVEL', description='Fly', amount=Decimal('-1.00'),
+            date=date(2025, 1, 2), category=self.travel,
+        )
+        response = self.client.get('/api/v1/transactions/treemap/?depth=1&top=1')
+        self.assertEqual([node['name'] for node in response.data['children']], ['Groceries', 'Other'])
+        self.assertEqual(response.data['children'][1]['value'], 1.0)
+        self.assertEqual(response.data['children'][0]['children'], [])
+
+    def test_top_is_bounded(self):
+        response = self.client.get(f'/api/v1/transactions/treemap/?top={TREEMAP_MAX_TOP + 1}')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('top', response.data)
+        response = self.client.get(f'/api/v1/transactions/treemap/?top={TREEMAP_MAX_TOP}')
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_filters_are_rejected(self):
+        for query in ('date_from=foo', 'category=abc', 'amount_max=1e', 'depth=4'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/v1/transactions/treemap/?{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(query.split('=')[0], response.data)
+
+
+class ExportTests(TransactionAPITestCase):
+
+    def test_csv_applies_list_filters_and_ordering(self):
+        Transaction.objects.create(
+            tripletex_id='T-TRAVEL', description='Fly, "Bergen"', amount=Decimal('-1.00'),
+            date=date(2025, 1, 9), category=self.travel,
+        )
+        response = self.client.get(
+            f'/api/v1/transactions/export.csv/?category={self.groceries.id}&ordering=amount',
+            HTTP_ACCEPT='text/csv'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment;', response['Content-Disposition'])
+
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:4], ['ID', 'Date', 'Description', 'Amount'])
+        self.assertEqual([row[3] for row in rows[1:]], ['-301.50', '-201.00', '-100.50'])
+        self.assertEqual(rows[1][4:6], ['Groceries', 'Rema 1000'])
+
+        response = self.client.get('/api/v1/transactions/export.csv/?search=bergen')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual([row[2] for row in rows[1:]], ['Fly, "Bergen"'])
+
+    def test_xlsx_is_a_valid_workbook(self):
+        response = self.client.get('/api/v1/transactions/export.xlsx/?ordering=date')
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+
+        namespace = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = sheet.findall('.//x:row', namespace)
+        self.assertEqual(len(rows), 4)
+        first = rows[1].findall('x:c', namespace)
+        # 2025-01-01 as an Excel serial date, then the description and amount
+        self.assertEqual(first[1].find('x:v', namespace).text, '45658')
+        self.assertEqual(first[2].find('.//x:t', namespace).text, 'REMA 1000 TRONDHEIM 0')
+        self.assertEqual(first[3].find('x:v', namespace).text, '-100.50')
+
+    def test_formula_cells_are_neutralized(self):
+        self.supplier.name = '@SUM(A1:A9)'
+        self.supplier.save()
+        Transaction.objects.filter(id=self.transactions[0].id).update(description='=HYPERLINK("http://evil")')
+        Transaction.objects.filter(id=self.transactions[1].id).update(description='\t+1')
+
+        response = self.client.get('/api/v1/transactions/export.csv/?ordering=date')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual([row[2] for row in rows[1:]], ["'=HYPERLINK(\"http://evil\")", "'\t+1", 'REMA 1000 TRONDHEIM 2'])
+        self.assertEqual(rows[1][5], "'@SUM(A1:A9)")
+        # Amounts are numbers, not text, and keep their sign
+        self.assertEqual(rows[1][3], '-100.50')
+
+        response = self.client.get('/api/v1/transactions/export.xlsx/?ordering=date')
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        namespace = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        first = sheet.findall('.//x:row', namespace)[1].findall('x:c', namespace)
+        self.assertEqual(first[2].find('.//x:t', namespace).text, "'=HYPERLINK(\"http://evil\")")
+
+    def test_rows_are_read_with_an_iterator(self):
+        with mock.patch('transactions.api.exports.EXPORT_CHUNK_SIZE', 2):
+            response = self.client.get('/api/v1/transactions/export.csv/')
+            chunks = list(response.streaming_content)
+        # Header, one chunk per two rows, then the remainder
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b''.join(chunks).count(b'REMA 1000'), 3)
+
+
+class BulkCategorizeTests(TransactionAPITestCase):
+
+    def post(self, assignments, **data):
+        return self.client.post(
+            '/api/v1/transactions/bulk_categorize/',
+            dict(data, assignments=assignments),
+            format='json'
+        )
+
+    def test_supplier_assignment_is_set_based_and_replaces_mappings(self):
+        other = Supplier.objects.create(tripletex_id='S2', name='Kiwi')
+        loose = Transaction.objects.create(
+            tripletex_id='T-LOOSE', description='Kiosk', amount=Decimal('-10.00'), date=date(2025, 1, 4)
+        )
+        # Left behind by the supplier matchers, which key mappings on (supplier, category)
+        CategorySupplierMap.objects.create(supplier=self.supplier, category=self.groceries)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post([
+                {'transaction_id': self.transactions[0].id, 'category_id': self.travel.id},
+                {'supplier_id': other.id, 'category_id': self.groceries.id},
+                {'transaction_id': loose.id, 'category_id': self.travel.id},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['transactions_updated'], 4)
+        self.assertEqual(response.data['suppliers_updated'], 2)
+        self.assertEqual(response.data['mappings_saved'], 2)
+        self.assertEqual(response.data['mappings_deleted'], 1)
+        self.assertEqual(len([q for q in queries.captured_queries if q['sql'].startswith('UPDATE "transactions_transaction"')]), 3)
+
+        self.assertEqual(Transaction.objects.filter(supplier=self.supplier, category=self.travel).count(), 3)
+        self.assertEqual(Transaction.objects.get(id=loose.id).category, self.travel)
+        self.assertEqual(SpendingFact.objects.filter(category=self.travel).count(), 4)
+        self.assertEqual(
+            set(CategorySupplierMap.objects.values_list('supplier_id', 'category_id')),
+            {(self.supplier.id, self.travel.id), (other.id, self.groceries.id)}
+        )
+
+        # Re-applying upserts the same mappings instead of adding duplicates
+        self.post([{'supplier_id': self.supplier.id, 'category_id': self.travel.id}])
+        self.assertEqual(CategorySupplierMap.objects.count(), 2)
+
+    def test_without_propagation_and_uncategorize(self):
+        response = self.post(
+            [{'transaction_id': self.transactions[0].id, 'category_id': None}], propagate=False
+        )
+        self.assertEqual(response.data['transactions_updated'], 1)
+        self.assertEqual(Transaction.objects.filter(category__isnull=True).count(), 1)
+
+    def test_unknown_ids_reject_the_whole_request(self):
+        response = self.post([
+            {'transaction_id': self.transactions[0].id, 'category_id': self.travel.id},
+            {'supplier_id': 999, 'category_id': self.travel.id},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('999', response.data['detail'])
+        self.assertFalse(Transaction.objects.filter(category=self.travel).exists())
+
+        response = self.post([{'transaction_id': 1, 'supplier_id': 1, 'category_id': None}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_legacy_categorize_upserts_mapping(self):
+        CategorySupplierMap.objects.create(supplier=self.supplier, category=self.groceries)
+        CategorySupplierMap.objects.create(supplier=self.supplier, category=self.travel)
+        response = self.client.post(
+            f'/api/v1/categorize/{self.transactions[0].id}/', {'category_id': self.travel.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(CategorySupplierMap.objects.values_list('category_id', flat=True)), [self.travel.id]
+        )
+
+
+class SupplierCategoryMapTests(TransactionAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.uncategorized = Category.objects.create(name='Uncategorized')
+        cls.kiwi = Supplier.objects.create(tripletex_id='S2', name='Kiwi')
+        Transaction.objects.filter(id=cls.transactions[0].id).update(category=cls.uncategorized)
+        Transaction.objects.filter(id=cls.transactions[1].id).update(category=None)
+        cls.kiwi_transaction = Transaction.objects.create(
+            tripletex_id='T-KIWI', description='KIWI', amount=Decimal('-5.00'), date=date(2025, 1, 4),
+            supplier=cls.kiwi, category=cls.groceries,
+        )
+
+    def test_latest_mapping_is_current(self):
+        CategorySupplierMap.objects.create(supplier=self.supplier, category=self.groceries)
+        CategorySupplierMap.objects.create(supplier=self.supplier, category=self.travel)
+        self.assertEqual(get_supplier_category_map(), {self.supplier.id: self.travel.id})
+
+    def test_mapping_replaces_only_missing_or_default_categories(self):
+        category_map = {self.supplier.id: self.travel.id}
+        self.assertEqual(mapped_category_id(category_map, self.supplier.id, None, self.uncategorized.id), self.travel.id)
+        self.assertEqual(
+            mapped_category_id(category_map, self.supplier.id, self.uncategorized.id, self.uncategorized.id),
+            self.travel.id
+        )
+        self.assertEqual(mapped_category_id(category_map, self.supplier.id, self.groceries.id), self.groceries.id)
+        self.assertEqual(mapped_category_id(category_map, None, None, self.uncategorized.id), self.uncategorized.id)
+
+    def test_import_remaps_default_category(self):
+        CategorySupplierMap.objects.create(supplier=self.supplier, category=self.travel)
+        CategorySupplierMap.objects.create(supplier=self.kiwi, category=self.travel)
+        statements = [
+            {'id': tripletex_id, 'description': 'Updated', 'accountingDate': '2025-01-05', 'amountOut': 10}
+            for tripletex_id in ('T0', 'T1', 'T-KIWI')
+        ]
+        response = mock.Mock(**{'json.return_value': {'values': statements}})
+        with mock.patch.multiple(
+            transaction_service,
+            get_api_headers=mock.Mock(return_value={}),
+            get_date_range=mock.Mock(return_value=[{'from_date': '2025-01-01', 'to_date': '2025-01-31'}]),
+            get_transaction_details=mock.Mock(return_value={}),
+            load_transaction_cache=mock.Mock(return_value={}),
+            save_transaction_cache=mock.Mock(),
+        ), mock.patch.object(transaction_service.requests, 'get', return_value=response):
+            result = transaction_service.import_transactions_from_tripletex()
+
+        self.assertEqual(result['updated_transactions'], 3)
+        self.assertEqual(
+            dict(Transaction.objects.filter(tripletex_id__in=['T0', 'T1', 'T-KIWI'])
+                 .values_list('tripletex_id', 'category')),
+            {'T0': self.travel.id, 'T1': self.travel.id, 'T-KIWI': self.groceries.id}
+        )
+
+    def test_reapply_runs_one_update_per_category(self):
+        CategorySupplierMap.objects.create(supplier=self.supplier, category=self.travel)
+        CategorySupplierMap.objects.create(supplier=self.kiwi, category=self.travel)
+
+        self.assertEqual(reapply_supplier_category_map(dry_run=True), {self.travel.id: 2})
+        with CaptureQueriesContext(connection) as queries:
+            updated = reapply_supplier_category_map()
+        self.assertEqual(updated, {self.travel.id: 2})
+        self.assertEqual(
+            len([q for q in queries.captured_queries if q['sql'].startswith('UPDATE "transactions_transaction"')]), 1
+        )
+        # The manually categorized transactions keep their category
+        self.assertEqual(
+            set(Transaction.objects.filter(category=self.travel).values_list('tripletex_id', flat=True)), {'T0', 'T1'}
+        )
+        self.assertEqual(SpendingFact.objects.filter(category=self.travel).count(), 2)
+
+        self.assertEqual(reapply_supplier_category_map(overwrite=True), {self.travel.id: 2})
+        self.assertEqual(Transaction.objects.filter(category=self.travel).count(), 4)
+
+
+class SyntheticDataTests(TransactionAPITestCase):
+    """
+    The synthetic data generator behind the API benchmarks.
+    """
+
+    def generate(self, count=40, **kwargs):
+        kwargs.setdefault('end_date', date(2025, 6, 30))
+        kwargs.setdefault('suppliers', 30)
+        return generate_synthetic_data(count, **kwargs)
+
+    def test_generates_transactions_with_postings_and_facts(self):
+        self.assertEqual(self.generate(), 40)
+
+        synthetic = Transaction.objects.filter(tripletex_id__startswith=SYNTHETIC_PREFIX)
+        self.assertEqual(synthetic.count(), 40)
+        self.assertEqual(SpendingFact.objects.filter(transaction__in=synthetic).count(), 40)
+        for transaction in synthetic.prefetch_related('transaction_accounts'):
+            postings = transaction.raw_data['value']['groupedPostings']
+            self.assertIn(len(postings), (2, 3))
+            self.assertEqual(transaction.transaction_accounts.count(), len(postings))
+            self.assertEqual(sum(Decimal(str(posting['amount'])) for posting in postings[1:]), -transaction.amount)
+            self.assertTrue(date(2022, 6, 30) < transaction.date <= date(2025, 6, 30))
+
+        close_groups = CloseGroup.objects.filter(tripletex_id__startswith=SYNTHETIC_PREFIX)
+        self.assertTrue(close_groups.exists())
+        for close_group in close_groups:
+            self.assertEqual(sum(posting.amount for posting in close_group.postings.all()), 0)
+
+    def test_same_seed_gives_same_data(self):
+        self.generate(seed=7)
+        first = list(Transaction.objects.filter(tripletex_id__startswith=SYNTHETIC_PREFIX)
+                     .order_by('tripletex_id').values_list('description', 'amount', 'date'))
+        clear_synthetic_data()
+        self.generate(seed=7)
+        second = list(Transaction.objects.filter(tripletex_id__startswith=SYNTHETIC_PREFIX)
+                      .order_by('tripletex_id').values_list('description', 'amount', 'date'))
+        self.assertEqual(first, second)
+
+    def test_clear_keeps_imported_transactions(self):
+        self.generate()
+        self.assertEqual(clear_synthetic_data(), 40)
+
+        self.assertEqual(Transaction.objects.count(), len(self.transactions))
+        self.assertEqual(SpendingFact.objects.count(), len(self.transactions))
+        self.assertFalse(LedgerPosting.objects.exists())
+        self.assertFalse(CloseGroup.objects.exists())
+
+    def test_count_is_capped(self):
+        with self.assertRaises(ValueError):
+            self.generate(MAX_SYNTHETIC_TRANSACTIONS + 1)
+
+
+class QueryCountTests(TransactionAPITestCase):
+    """
+    List endpoints and admin changelists must not issue a query per row.
+    """
+
+    def add_related_rows(self):
+        n = Transaction.objects.count()
+        category = Category.objects.create(name=f'Fuel {n}')
+        bank_account = BankAccount.objects.create(name=f'Savings {n}', account_number=f'5678{n}')
+        supplier = Supplier.objects.create(tripletex_id=f'S-FUEL-{n}', name='Circle K')
+        account = Account.objects.create(tripletex_id=f'A-FUEL-{n}', account_number='7000', name='Drivstoff')
+        transaction = Transaction.objects.create(
+            tripletex_id=f'T-FUEL-{n}', description='Circle K', amount=Decimal('-500.00'), date=date(2025, 2, 1),
+            category=category, bank_account=bank_account, supplier=supplier, ledger_account=account,
+        )
+        TransactionAccount.objects.create(transaction=transaction, account=account, amount=Decimal('-500.00'))
+
+    def test_api_lists(self):
+        for url in ('/api/v1/categories/', '/api/v1/bank-accounts/', '/api/v1/transactions/'):
+            with self.subTest(url=url):
+                self.assertConstantQueryCount(url, self.add_related_rows)
+
+    def test_counts_come_from_annotation(self):
+        response = self.client.get('/api/v1/categories/')
+        counts = {row['name']: row['transaction_count'] for row in response.data['results']}
+        self.assertEqual(counts, {'Groceries': 3, 'Travel': 0})
+
+    @override_settings(STATICFILES_STORAGE=TEST_STATICFILES_STORAGE)
+    def test_admin_changelists(self):
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        for model in ('category', 'bankaccount', 'supplier', 'account', 'transaction'):
+            with self.subTest(model=model):
+                self.assertConstantQueryCount(f'/admin/transactions/{model}/', self.add_related_rows)
+
+
+class FullTextSearchTests(TransactionAPITestCase):
+
+    def test_prefix_search_over_description_and_postings(self):
+        self.assertEqual(Transaction.objects.search('rem trond').count(), 3)
+        self.assertEqual(Transaction.objects.search('matvare').count(), 3)
+        self.assertEqual(Transaction.objects.search('T1').get(), self.transactions[1])
+        self.assertFalse(Transaction.objects.search('kiwi').exists())
+
+    def test_index_follows_bulk_updates_and_legacy_raw_data(self):
+        Transaction.objects.filter(id=self.transactions[0].id).update(
+            description='KIWI 123',
+            raw_data={'detailed_data': {'value': {'groupedPostings': [{'description': 'Dagligvare'}]}}}
+        )
+        self.assertEqual(Transaction.objects.search('kiwi').get(), self.transactions[0])
+        self.assertEqual(Transaction.objects.search('dagligvare').get(), self.transactions[0])
+        self.assertEqual(Transaction.objects.search('matvarer').count(), 2)
+
+        self.transactions[1].delete()
+        self.assertEqual(Transaction.objects.search('matvarer').count(), 1)
+
+    def test_api_search_is_ranked_and_uses_index(self):
+        Transaction.objects.create(
+            tripletex_id='T-RANK', description='Kaffe', amount=Decimal('-50.00'), date=date(2025, 2, 1),
+            raw_data={'value': {'groupedPostings': [{'description': 'Rema'}]}},
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/transactions/?search=rema')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('LIKE' in q['sql'] for q in queries.captured_queries))
+
+        results = response.data['results']
+        self.assertEqual(len(results), 4)
+        # Description matches outrank posting-only matches despite being older
+        self.assertEqual(results[-1]['tripletex_id'], 'T-RANK')
+
+    def test_search_input_cannot_inject_fts_syntax(self):
+        response = self.client.get('/api/v1/transactions/', {'search': '"rema OR NEAR( *'})
+        self.assertEqual(response.status_code, 200)
+
+
+class SimilarTransactionsTests(TransactionAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        Transaction.objects.create(
+            tripletex_id='T-KIWI', description='KIWI 505 BAKKLANDET', amount=Decimal('-80.00'), date=date(2025, 1, 9),
+        )
+        Transaction.objects.create(
+            tripletex_id='T-REMA-OSLO', description='REMA 1000 OSLO S', amount=Decimal('-90.00'), date=date(2025, 1, 10),
+        )
+        index_transactions()
+
+    def test_normalization_drops_digits_and_punctuation(self):
+        self.assertEqual(normalize_description('REMA 1000 TRONDHEIM*3 18.01'), 'rema trondheim')
+        self.assertIn(' re', description_ngrams('REMA'))
+
+    def test_neighbours_are_ranked_by_similarity(self):
+        response = self.client.get(f'/api/v1/transactions/{self.transactions[0].id}/similar/?limit=3')
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        ids = [row['tripletex_id'] for row in results]
+        # Same store in the same city first, then the same chain elsewhere; never the transaction itself
+        self.assertEqual(ids[:2], ['T1', 'T2'])
+        self.assertEqual(ids[2], 'T-REMA-OSLO')
+        self.assertNotIn('T0', ids)
+        self.assertGreaterEqual(results[0]['similarity'], results[-1]['similarity'])
+
+    def test_new_transactions_are_indexed_on_demand(self):
+        transaction = Transaction.objects.create(
+            tripletex_id='T-NEW', description='KIWI MIDTBYEN', amount=Decimal('-10.00'), date=date(2025, 1, 11),
+        )
+        response = self.client.get(f'/api/v1/transactions/{transaction.id}/similar/?fields=description')
+        self.assertEqual(response.data['results'][0]['description'], 'KIWI 505 BAKKLANDET')
+        self.assertTrue(TransactionNgram.objects.filter(transaction=transaction).exists())
+
+    def grams(self, transaction):
+        return set(TransactionNgram.objects.filter(transaction=transaction).values_list('gram', flat=True))
+
+    def test_writes_keep_the_index_current(self):
+        transaction = Transaction.objects.create(
+            tripletex_id='T-NEW', description='KIWI MIDTBYEN', amount=Decimal('-10.00'), date=date(2025, 1, 11),
+        )
+        self.assertEqual(self.grams(transaction), description_ngrams('KIWI MIDTBYEN'))
+        response = self.client.get(f'/api/v1/transactions/{transaction.id}/similar/?fields=description')
+        self.assertEqual(response.data['results'][0]['description'], 'KIWI 505 BAKKLANDET')
+
+        transaction = Transaction.objects.get(id=transaction.id)
+        transaction.description = 'COOP EXTRA'
+        transaction.save()
+        self.assertEqual(self.grams(transaction), description_ngrams('COOP EXTRA'))
+
+        # Saves that keep the description leave the postings alone
+        transaction.amount = Decimal('-11.00')
+        with CaptureQueriesContext(connection) as queries:
+            transaction.save()
+        self.assertFalse(any('transactionngram' in q['sql'] for q in queries.captured_queries))
+
+        Transaction.objects.filter(id=transaction.id).update(description='REMA 1000 MOHOLT')
+        self.assertEqual(self.grams(transaction), description_ngrams('REMA 1000 MOHOLT'))
+
+        # The filter reads the updated column
+        Transaction.objects.filter(description='REMA 1000 MOHOLT').update(description='BUNNPRIS')
+        self.assertEqual(self.grams(transaction), description_ngrams('BUNNPRIS'))
+
+    def test_migration_backfills_postings(self):
+        backfill_ngrams = importlib.import_module('transactions.migrations.0017_transactionngram').backfill_ngrams
+        expected = {transaction.id: self.grams(transaction) for transaction in Transaction.objects.all()}
+        TransactionNgram.objects.all().delete()
+        backfill_ngrams(django_apps, None)
+        self.assertEqual({transaction.id: self.grams(transaction) for transaction in Transaction.objects.all()}, expected)
+
+    def test_reindexing_deletes_postings_in_bulk(self):
+        Transaction.objects.bulk_create([
+            Transaction(tripletex_id=f'T-BULK-{i}', description=f'COOP PRIX {i} TRONDHEIM', amount=Decimal('-10.00'),
+                        date=date(2025, 2, 1))
+            for i in range(50)
+        ])
+        index_transactions()
+        with mock.patch('transactions.utils.cache.bump_generation') as tracked_bump, \
+                mock.patch('transactions.signals.bump_generation') as signal_bump, \
+                CaptureQueriesContext(connection) as queries:
+            indexed = index_transactions(Transaction.objects.filter(tripletex_id__startswith='T-BULK-'))
+        self.assertEqual(indexed, 50)
+        self.assertEqual(tracked_bump.call_count + signal_bump.call_count, 0)
+        self.assertLessEqual(len(queries), 8)
+
+
+@skipIf(not HAS_NUMPY, "numpy is not installed")
+class EmbeddingStoreTests(TestCase):
+    """
+    The on-disk embedding store used by the supplier matching commands.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.encoded = []
+
+    def encode(self, texts):
+        # Letter counts: deterministic and distinct enough for lookups
+        self.encoded.extend(texts)
+        return np.array([[text.count(letter) for letter in 'abcdefghijklmnopqrstuvwxyz'] for text in texts])
+
+    def test_encodes_each_normalized_description_once(self):
+        store = EmbeddingStore('all-MiniLM-L6-v2', self.directory)
+        vectors = store.embed(['REMA 1000 OSLO', 'Rema 2000 Oslo', 'KIWI 123'], self.encode)
+
+        self.assertEqual(sorted(self.encoded), ['kiwi', 'rema oslo'])
+        self.assertEqual(vectors.shape, (3, 26))
+        self.assertEqual(vectors.dtype, np.float32)
+        np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1, rtol=1e-3)
+        np.testing.assert_array_equal(vectors[0], vectors[1])
+
+    def test_later_runs_only_encode_new_descriptions(self):
+        first = EmbeddingStore('all-MiniLM-L6-v2', self.directory).embed(['REMA 1000', 'KIWI'], self.encode)
+        self.encoded.clear()
+
+        store = EmbeddingStore('all-MiniLM-L6-v2', self.directory)
+        second = store.embed(['KIWI', 'MENY', 'REMA 1000'], self.encode)
+
+        self.assertEqual(self.encoded, ['meny'])
+        self.assertEqual(len(store), 3)
+        np.testing.assert_array_equal(second[[2, 0]], first)
+        self.assertIsInstance(store.vectors, np.memmap)
+
+    def test_models_are_stored_separately(self):
+        EmbeddingStore('model-a', self.directory).embed(['KIWI'], self.encode)
+        EmbeddingStore('model-b', self.directory).embed(['KIWI'], self.encode)
+        self.assertEqual(self.encoded, ['kiwi', 'kiwi'])
+
+    def test_rejects_embeddings_of_another_dimension(self):
+        store = EmbeddingStore('all-MiniLM-L6-v2', self.directory)
+        store.embed(['KIWI'], self.encode)
+        with self.assertRaises(ValueError):
+            store.add(np.array([description_key('MENY')], dtype=np.uint64), np.ones((1, 3)))
+
+
+
+@skipIf(not HAS_NUMPY, "numpy is not installed")
+class VectorSearchTests(TestCase):
+    """
+    Batched top-k supplier scoring used by the embedding matchers.
+    """
+
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        references = rng.normal(size=(60, 16)).astype(np.float32)
+        self.references = references / np.linalg.norm(references, axis=1, keepdims=True)
+        # Six suppliers with ten reference rows each, plus one with two
+        self.labels = np.repeat([11, 12, 13, 14, 15, 16], 10)
+        self.labels[-2:] = 17
+        queries = self.references[[3, 25, 59]] + rng.normal(scale=0.05, size=(3, 16)).astype(np.float32)
+        self.queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+    def test_group_starts(self):
+        starts, labels = group_starts([5, 5, 7, 9, 9, 9])
+        self.assertEqual(starts.tolist(), [0, 2, 3])
+        self.assertEqual(labels.tolist(), [5, 7, 9])
+
+    def test_matches_per_query_scoring(self):
+        starts, suppliers = group_starts(self.labels)
+        scores, groups, best_rows = top_k_groups(self.queries, self.references, starts, 3)
+
+        for query, query_scores, query_groups, best_row in zip(self.queries, scores, groups, best_rows):
+            similarity = self.references @ query
+            per_supplier = {supplier: similarity[self.labels == supplier].max() for supplier in suppliers}
+            expected = sorted(per_supplier, key=per_supplier.get, reverse=True)[:3]
+
+            self.assertEqual(suppliers[query_groups].tolist(), expected)
+            np.testing.assert_allclose(query_scores, [per_supplier[s] for s in expected], rtol=1e-5)
+            self.assertEqual(best_row, similarity.argmax())
+        self.assertEqual(suppliers[groups[:, 0]].tolist(), [11, 13, 17])
+
+    def test_chunked_scoring_and_small_k(self):
+        starts, _ = group_starts(self.labels)
+        expected = top_k_groups(self.queries, self.references, starts, 10)
+        with mock.patch('transactions.utils.vector_search.MAX_SCORE_MATRIX_CELLS', 60):
+            chunked = top_k_groups(self.queries, self.references, starts, 10)
+
+        self.assertEqual(expected[0].shape, (3, 7))
+        np.testing.assert_allclose(chunked[0], expected[0], rtol=1e-5)
+        np.testing.assert_array_equal(chunked[1], expected[1])
+        np.testing.assert_array_equal(chunked[2], expected[2])
+
+
+
+@skipIf(not HAS_NUMPY, "numpy is not installed")
+class IVFIndexTests(TestCase):
+    """
+    The persisted ANN index over supplier reference embeddings.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        # 50 suppliers with 40 noisy rows each around their own center
+        rng = np.random.default_rng(3)
+        centers = rng.normal(size=(50, 32)).astype(np.float32)
+        self.labels = np.repeat(np.arange(50), 40)
+        vectors = centers[self.labels] + rng.normal(scale=0.6, size=(2000, 32)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.ids = np.arange(1000, 3000)
+        self.queries = self.vectors[::97] + rng.normal(scale=0.05, size=(21, 32)).astype(np.float32)
+
+    def exact(self, k):
+        starts, suppliers = group_starts(self.labels)
+        return suppliers[top_k_groups(self.queries, self.vectors, starts, k)[1]]
+
+    def test_search_finds_the_exact_top_k(self):
+        index = IVFIndex(self.directory)
+        index.build(self.vectors, self.labels, self.ids, lists=20)
+
+        scores, labels, ids = index.search(self.queries, 3, nprobe=20)
+        np.testing.assert_array_equal(labels, self.exact(3))
+        self.assertTrue((np.diff(scores, axis=1) <= 0).all())
+        np.testing.assert_array_equal(self.labels[ids - 1000], labels)
+
+        # Probing a few lists still finds the best supplier
+        _, labels, _ = index.search(self.queries, 1, nprobe=4)
+        np.testing.assert_array_equal(labels[:, 0], self.exact(1)[:, 0])
+
+    def test_reopens_memory_mapped(self):
+        IVFIndex(self.directory).build(self.vectors, self.labels, self.ids, lists=20)
+
+        index = IVFIndex(self.directory)
+        self.assertEqual(len(index), 2000)
+        self.assertEqual(index.list_count, 20)
+        self.assertIsInstance(index.main_vectors, np.memmap)
+        self.assertEqual(sorted(index.ids.tolist()), self.ids.tolist())
+
+    def test_inserts_are_searchable_and_compacted(self):
+        index = IVFIndex(self.directory)
+        index.build(self.vectors[40:], self.labels[40:], self.ids[40:], lists=20)
+        self.assertNotIn(0, index.search(self.queries[:1], 3, nprobe=20)[1][0])
+
+        index.add(self.vectors[:40], self.labels[:40], self.ids[:40])
+        self.assertEqual((index.main_count, index.tail_count), (1960, 40))
+        index = IVFIndex(self.directory)
+        np.testing.assert_array_equal(index.search(self.queries, 3, nprobe=20)[1], self.exact(3))
+
+        # A tail larger than COMPACT_FRACTION of the main rows is merged
+        extra = self.vectors[:300]
+        index.add(extra, self.labels[:300], np.arange(5000, 5300))
+        self.assertEqual((index.main_count, index.tail_count), (2300, 0))
+        self.assertEqual(index.list_count, 20)
+
+    def test_pads_when_fewer_labels_than_k(self):
+        index = IVFIndex(self.directory)
+        index.build(self.vectors[:80], self.labels[:80], self.ids[:80], lists=4)
+
+        scores, labels, ids = index.search(self.queries[:1], 3, nprobe=4)
+        self.assertEqual(labels[0].tolist()[2], -1)
+        self.assertEqual(ids[0].tolist()[2], -1)
+        self.assertEqual(scores[0, 2], -np.inf)
+        self.assertEqual(sorted(labels[0, :2].tolist()), [0, 1])
+
+    def test_rejects_embeddings_of_another_dimension(self):
+        index = IVFIndex(self.directory)
+        index.build(self.vectors, self.labels, self.ids, lists=20)
+        with self.assertRaises(ValueError):
+            index.add(np.ones((1, 3)), [1], [1])
+
+
+@override_settings(STATICFILES_STORAGE=TEST_STATICFILES_STORAGE)
+class AdminChangelistSummaryTests(TransactionAPITestCase):
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+    def test_lazy_summary_is_one_aggregate_query(self):
+        response = self.client.get('/admin/transactions/transaction/?category__id__exact=%d' % self.groceries.id)
+        self.assertEqual(response.context['summary_url'], '/admin/transactions/transaction/summary/')
+        self.assertNotIn('summary_data', response.context)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/transactions/transaction/summary/?category__id__exact=%d' % self.groceries.id)
+        self.assertEqual(response.json(), {'total_amount': -603.0, 'count': 3, 'average': -201.0})
+        aggregates = [q['sql'] for q in queries.captured_queries if 'SUM(' in q['sql']]
+        self.assertEqual(len(aggregates), 1)
+        self.assertIn('AVG(', aggregates[0])
+        self.assertIn('COUNT(', aggregates[0])
+        # No list filter choices or paginator count: the aggregate is the only app query
+        app_queries = [q['sql'] for q in queries.captured_queries if '"transactions_' in q['sql']]
+        self.assertEqual(app_queries, aggregates)
+
+    def test_lazy_summary_applies_filters_search_and_date_hierarchy(self):
+        url = '/admin/transactions/transaction/summary/'
+        Transaction.objects.filter(id=self.transactions[0].id).update(is_internal_transfer=True)
+        cases = {
+            '?is_internal_transfer__exact=0': 2,
+            '?q=trondheim+2': 1,
+            '?date__year=2025&date__month=1&o=2': 3,
+            '?category__isnull=True': 0,
+            '?date__gte=2025-01-02&date__lt=2025-01-03': 1,
+        }
+        for query, count in cases.items():
+            with self.subTest(query=query):
+                response = self.client.get(url + query)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()['count'], count)
+        self.assertEqual(self.client.get(url + '?date__gte=foo').status_code, 400)
+
+    def test_search_matches_identifiers_and_descriptions(self):
+        Transaction.objects.filter(id=self.transactions[1].id).update(legacy_bank_account_id='98765', account_id='ACC-7')
+        url = '/admin/transactions/transaction/?q='
+        cases = {'98765': ['T1'], 'ACC-7': ['T1'], 'T2': ['T2'], 'trondheim 0': ['T0']}
+        for term, expected in cases.items():
+            with self.subTest(term=term):
+                response = self.client.get(url + term)
+                self.assertEqual([obj.tripletex_id for obj in response.context['cl'].result_list], expected)
+
+    def test_cached_count_is_reused(self):
+        url = '/admin/transactions/transaction/'
+        with mock.patch('transactions.utils.pagination.COUNT_CACHE_THRESHOLD', 1):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+        self.assertFalse(any(q['sql'].startswith('SELECT COUNT(') for q in queries.captured_queries))
+
+        # A write starts a fresh count
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.filter(id=self.transactions[0].id).delete()
+        with mock.patch('transactions.utils.pagination.COUNT_CACHE_THRESHOLD', 1):
+            response = self.client.get(url)
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+
+@override_settings(TRANSACTION_SNAPSHOT_ENABLED=False)
+class SpendingFactTests(TransactionAPITestCase):
+    def fact(self, transaction_obj):
+        return SpendingFact.objects.get(transaction=transaction_obj)
+
+    def test_facts_follow_writes(self):
+        first, second, third = self.transactions
+        fact = self.fact(first)
+        self.assertEqual((fact.amount_minor, fact.abs_amount_minor), (-10050, 10050))
+        self.assertEqual((fact.year, fact.month_key, fact.week_key), (2025, 202501, 202501))
+        self.assertTrue(fact.is_spend)
+        self.assertEqual(fact.category_id, self.groceries.id)
+
+        first.is_wage_transfer = True
+        first.save()
+        self.assertEqual((self.fact(first).is_spend, self.fact(first).is_expense), (False, True))
+
+        first.is_internal_transfer = True
+        first.save()
+        self.assertEqual((self.fact(first).is_spend, self.fact(first).is_expense), (False, False))
+
+        Transaction.objects.filter(id=second.id).update(category=self.travel, amount=Decimal('25.00'))
+        fact = self.fact(second)
+        self.assertEqual((fact.category_id, fact.amount_minor, fact.is_spend), (self.travel.id, 2500, False))
+
+        created = Transaction.objects.bulk_create([
+            Transaction(tripletex_id='B1', description='BULK', amount=Decimal('-1.99'), date=date(2025, 2, 3))
+        ])
+        self.assertEqual(self.fact(created[0]).amount_minor, -199)
+
+        third.delete()
+        self.assertEqual(SpendingFact.objects.count(), Transaction.objects.count())
+
+    def assertFactsMatchTransactions(self):
+        expected = {
+            fact.transaction_id: (fact.amount_minor, fact.category_id, fact.is_spend, fact.is_expense)
+            for fact in SpendingFact.objects.all()
+        }
+        rebuild_spending_facts()
+        rebuilt = {
+            fact.transaction_id: (fact.amount_minor, fact.category_id, fact.is_spend, fact.is_expense)
+            for fact in SpendingFact.objects.all()
+        }
+        self.assertEqual(expected, rebuilt)
+
+    def assertNoIdsLoaded(self, queries):
+        id_selects = [
+            q['sql'] for q in queries.captured_queries
+            if q['sql'].startswith('SELECT "transactions_transaction"."id" FROM')
+        ]
+        self.assertEqual(id_selects, [])
+
+    def test_bulk_updates_sync_facts_without_loading_ids(self):
+        with CaptureQueriesContext(connection) as queries:
+            Transaction.objects.filter(category=self.groceries).update(category=self.travel)
+        self.assertNoIdsLoaded(queries)
+        self.assertEqual(SpendingFact.objects.filter(category=self.travel).count(), 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            Transaction.objects.filter(date__gte=date(2025, 1, 2)).update(amount=F('amount') * 2)
+        self.assertNoIdsLoaded(queries)
+        self.assertEqual(self.fact(self.transactions[2]).amount_minor, -60300)
+        self.assertFactsMatchTransactions()
+
+    def test_bulk_update_of_a_filtered_column_syncs_the_matched_rows(self):
+        # The filter stops matching these rows once they are updated
+        Transaction.objects.filter(is_internal_transfer=False, amount__lt=-150).update(is_internal_transfer=True)
+        self.assertEqual(
+            list(SpendingFact.objects.filter(is_expense=True).values_list('transaction_id', flat=True)),
+            [self.transactions[0].id]
+        )
+        self.assertFactsMatchTransactions()
+
+    def test_rebuild(self):
+        SpendingFact.objects.all().delete()
+        self.assertEqual(rebuild_spending_facts(), 3)
+        self.assertEqual(self.fact(self.transactions[2]).amount_minor, -30150)
+
+    def test_summary_matches_transaction_table(self):
+        filters = {'date_from': '2025-01-01', 'date_to': '2025-01-31', 'amount_max': '-150'}
+        from_facts = get_transaction_summary(filters)
+        # A flag filter forces the transaction table path
+        from_transactions = get_transaction_summary({**filters, 'should_process': True})
+        self.assertEqual(from_facts, from_transactions)
+        self.assertEqual(from_facts['total_transactions'], 2)
+        self.assertEqual(from_facts['total_amount'], -502.5)
+
+    def test_budget_leaves_out_internal_transfers_only(self):
+        # Wage and tax transfers count towards the budget
+        self.transactions[0].is_wage_transfer = True
+        self.transactions[0].save()
+        budget = get_monthly_budget_data(year=2025, month=1)
+        groceries = next(item for item in budget['categories'] if item['name'] == 'Groceries')
+        self.assertEqual(groceries['spent'], 603.0)
+
+        self.transactions[0].is_internal_transfer = True
+        self.transactions[0].save()
+        budget = get_monthly_budget_data(year=2025, month=1)
+        groceries = next(item for item in budget['categories'] if item['name'] == 'Groceries')
+        self.assertEqual(groceries['spent'], 502.5)
+        self.assertEqual(budget['total_spent'], 502.5)
+
+
+class TransactionSnapshotTests(TransactionAPITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        account = Account.objects.create(tripletex_id='A1', name='Groceries', account_number='4000')
+        TransactionAccount.objects.create(transaction=cls.transactions[0], account=account, amount=Decimal('80.00'))
+        TransactionAccount.objects.create(transaction=cls.transactions[1], account=account)
+        Transaction.objects.create(
+            tripletex_id='T-WAGE', description='Lønn', amount=Decimal('25000.00'), date=date(2025, 2, 25),
+            bank_account=cls.bank_account, is_wage_transfer=True, should_process=False,
+        )
+        Transaction.objects.create(
+            tripletex_id='T-TRAVEL', description='Fly', amount=Decimal('-1234.56'), date=date(2025, 3, 30),
+            category=cls.travel, ledger_account=account,
+        )
+
+    def assertMatchesDatabase(self, run):
+        from_snapshot = run()
+        with override_settings(TRANSACTION_SNAPSHOT_ENABLED=False):
+            from_database = run()
+        self.assertEqual(from_snapshot, from_database)
+
+    def test_summary_matches_database(self):
+        for filters in (
+            {},
+            {'date_from': '2025-01-02', 'date_to': '2025-02-28'},
+            {'category': str(self.groceries.id), 'amount_max': '-150'},
+            {'bank_account': self.bank_account.id, 'should_process': True},
+            {'internal_transfer': False, 'amount_min': '-1000'},
+        ):
+            with self.subTest(filters=filters):
+                self.assertMatchesDatabase(lambda: get_transaction_summary(filters))
+
+    def test_budget_and_timeseries_match_database(self):
+        self.assertMatchesDatabase(lambda: get_monthly_budget_data(year=2025, month=1))
+        self.assertMatchesDatabase(lambda: get_monthly_budget_data(year=2025, month=3))
+        for granularity in TIMESERIES_GRANULARITIES:
+            for group_by in (None,) + tuple(ANALYTICS_GROUP_BY_FIELDS):
+                with self.subTest(granularity=granularity, group_by=group_by):
+                    self.assertMatchesDatabase(
+                        lambda: get_transaction_timeseries({}, granularity, group_by)
+                    )
+
+    def test_search_falls_back_to_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            summary = get_transaction_summary({'search': 'fly'})
+        self.assertEqual(summary['total_transactions'], 1)
+        self.assertTrue(queries.captured_queries)
+
+    def test_hot_path_does_not_query_and_refreshes_incrementally(self):
+        get_transaction_summary({})
+        with CaptureQueriesContext(connection) as queries:
+            summary = get_transaction_summary({})
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(summary['total_transactions'], 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.filter(id=self.transactions[0].id).update(category=self.travel)
+            self.transactions[1].amount = Decimal('-1.00')
+            self.transactions[1].save()
+            Transaction.objects.create(
+                tripletex_id='T-NEW', description='New', amount=Decimal('-5.00'), date=date(2025, 1, 5)
+            )
+        self.assertMatchesDatabase(lambda: get_transaction_summary({}))
+        self.assertEqual(len(get_snapshot().ids), 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.transactions[2].delete()
+        self.assertMatchesDatabase(lambda: get_transaction_summary({}))
+        self.assertEqual(len(get_snapshot().ids), 5)
+
+
+    def test_refresh_reads_writes_of_long_transactions(self):
+        def snapshot_category(transaction_obj):
+            snapshot = get_snapshot()
+            return int(snapshot.category[np.searchsorted(snapshot.ids, transaction_obj.id)])
+
+        first, second = self.transactions[:2]
+        get_snapshot()
+        # A slow import wrote a row ten minutes ago and has not committed yet
+        written_at = time.time() - 600
+        with mock.patch('transactions.utils.cache.time.time', return_value=written_at):
+            with self.captureOnCommitCallbacks() as import_commit:
+                Transaction.objects.filter(id=first.id).update(
+                    category=self.travel, updated_at=timezone.now() - timedelta(minutes=10)
+                )
+        # Another write commits first and the snapshot catches up with it
+        with self.captureOnCommitCallbacks(execute=True):
+            second.amount = Decimal('-1.00')
+            second.save()
+        self.assertEqual(snapshot_category(first), self.groceries.id)
+
+        for callback in import_commit:
+            callback()
+        self.assertEqual(snapshot_category(first), self.travel.id)
+        self.assertMatchesDatabase(lambda: get_transaction_summary({}))
+
+@override_settings(TRANSACTION_SNAPSHOT_ENABLED=False)
+class ConcurrentSummaryTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_snapshot()
+        groceries = Category.objects.create(name='Groceries')
+        bank_account = BankAccount.objects.create(name='Main account', account_number='1234')
+        account = Account.objects.create(tripletex_id='A1', name='Varekjøp', account_number='4000')
+        for i in range(3):
+            transaction = Transaction.objects.create(
+                tripletex_id=f'T{i}', description=f'REMA 1000 {i}', amount=Decimal('-100.50') * (i + 1),
+                date=date(2025, 1, 1 + i), category=groceries, bank_account=bank_account,
+            )
+            TransactionAccount.objects.create(transaction=transaction, account=account)
+        self.client = APIClient()
+
+    def test_aggregates_run_in_worker_threads(self):
+        threads = set()
+        original = transaction_service._run_in_worker
+
+        def run_in_worker(name, query, timings):
+            threads.add(threading.current_thread().name)
+            return original(name, query, timings)
+
+        with mock.patch.object(transaction_service, '_can_query_concurrently', return_value=True), \
+                mock.patch.object(transaction_service, '_run_in_worker', run_in_worker):
+            response = self.client.get('/api/v1/transactions/summary/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith('summary') for name in threads))
+
+        sequential = get_transaction_summary({})
+        self.assertEqual(response.data, TransactionSummarySerializer(sequential).data)
+        self.assertEqual(response.data['categories']['Groceries']['count'], 3)
+        self.assertEqual(response.data['related_accounts']['Varekjøp']['total'], 603.0)
+
+        metrics = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertLessEqual(
+            {'cache', 'totals', 'categories', 'bank_accounts', 'related_accounts', 'summary'}, set(metrics)
+        )
+
+    @override_settings(SQLITE_PRAGMAS={})
+    def test_worker_queries_are_counted_and_connections_closed(self):
+        # Without the per-connection PRAGMAs, both runs issue the same queries
+        def sql_queries(concurrent):
+            cache.clear()
+            with mock.patch.object(transaction_service, '_can_query_concurrently', return_value=concurrent):
+                response = self.client.get('/api/v1/transactions/summary/')
+            self.assertEqual(response.status_code, 200)
+            return int(re.search(r'\bsql;dur=[\d.]+;desc="(\d+) queries"', response['Server-Timing']).group(1))
+
+        sequential = sql_queries(concurrent=False)
+        with mock.patch.object(transaction_service.connections, 'close_all') as close_all:
+            self.assertEqual(sql_queries(concurrent=True), sequential)
+        self.assertEqual(close_all.call_count, 4)
+
+    def test_open_transaction_runs_in_sequence(self):
+        with db_transaction.atomic():
+            self.assertFalse(transaction_service._can_query_concurrently())
+
+
+class PerformanceMiddlewareTests(TransactionAPITestCase):
+    """
+    Server-Timing metrics and per-endpoint statistics from PerformanceMiddleware.
+    """
+
+    def setUp(self):
+        super().setUp()
+        perf.registry.reset()
+
+    def server_timing(self, response):
+        metrics = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            metrics[name] = dict(param.split('=', 1) for param in params)
+        return metrics
+
+    def test_server_timing_reports_queries_cache_and_serializers(self):
+        response = self.client.get('/api/v1/transactions/?page_size=10')
+        self.assertEqual(response.status_code, 200)
+
+        metrics = self.server_timing(response)
+        self.assertRegex(metrics['sql']['desc'], r'^"[1-9]\d* queries"$')
+        self.assertEqual(metrics['cache-reads']['desc'], '"0 hits / 1 misses"')
+        for name in ('serialize', 'render', 'total'):
+            self.assertGreaterEqual(float(metrics[name]['dur']), 0)
+
+        # The second request is served from the response cache
+        metrics = self.server_timing(self.client.get('/api/v1/transactions/?page_size=10'))
+        self.assertEqual(metrics['cache-reads']['desc'], '"1 hits / 0 misses"')
+        self.assertNotIn('serialize', metrics)
+
+    def test_perf_endpoint_aggregates_per_endpoint(self):
+        for _ in range(3):
+            self.client.get('/api/v1/categories/')
+        self.client.get(f'/api/v1/transactions/{self.transactions[0].id}/')
+
+        stats = self.client.get('/api/v1/_perf/').json()['endpoints']
+        categories = stats['GET category-list']
+        self.assertEqual(categories['count'], 3)
+        self.assertEqual(sum(categories['histogram'].values()), 3)
+        self.assertEqual(categories['status_codes'], {'200': 3})
+        self.assertGreater(categories['mean_queries'], 0)
+        self.assertEqual(stats['GET transaction-detail']['count'], 1)
+
+        self.assertEqual(self.client.delete('/api/v1/_perf/').status_code, 204)
+        stats = self.client.get('/api/v1/_perf/').json()['endpoints']
+        self.assertEqual(list(stats), ['DELETE perf-stats'])
+
+    def test_slow_requests_log_top_queries(self):
+        with override_settings(PERF_SLOW_REQUEST_MS=0):
+            with self.assertLogs('transactions', level='WARNING') as logs:
+                Client().get('/api/v1/categories/')
+        self.assertIn('Slow request GET /api/v1/categories/', logs.output[0])
+        self.assertIn('Slowest queries:', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+
+class SQLiteConnectionTests(TestCase):
+    def test_pragmas_are_applied(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+@override_settings(TRANSACTION_SNAPSHOT_ENABLED=False)
+class QueryPlanTests(TransactionAPITestCase):
+    """
+    Run EXPLAIN QUERY PLAN on the hot analytics queries and check that each
+    one searches its expected index and none scans the transaction or
+    spending fact table, so index changes are backed by plans.
+    """
+
+    tables = (Transaction._meta.db_table, SpendingFact._meta.db_table)
+    PRIMARY_KEY = 'INTEGER PRIMARY KEY'
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plans are SQLite specific')
+
+    def capture_statements(self, run):
+        statements = []
+
+        def wrapper(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT') and any(table in sql for table in self.tables):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(wrapper):
+            run()
+        return statements
+
+    def assertIndexesUsed(self, run, expected):
+        """
+        Assert that every query issued by run() searches the expected index
+        and none scans a whole analytics table.
+
+        Args:
+            run (callable): Executes the queries to check
+            expected (list): One entry per query, in order: the index name
+                its plan must SEARCH with (PRIMARY_KEY for rowid lookups)
+        """
+        statements = self.capture_statements(run)
+        self.assertEqual(len(statements), len(expected), '\n'.join(sql for sql, _ in statements))
+        for (sql, params), index in zip(statements, expected):
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                self.assertFalse(
+                    any(step.startswith(f'SCAN {table}') for table in self.tables) and 'INDEX' not in step,
+                    f"Full table scan:\n{sql}\n" + '\n'.join(plan)
+                )
+            if index == self.PRIMARY_KEY:
+                pattern = r'SEARCH \S+ USING INTEGER PRIMARY KEY '
+            else:
+                pattern = rf'SEARCH \S+ USING (COVERING )?INDEX {re.escape(index)} \('
+            self.assertTrue(
+                any(re.match(pattern, step) for step in plan),
+                f"{index} not searched:\n{sql}\n" + '\n'.join(plan)
+            )
+
+    def test_budget(self):
+        self.assertIndexesUsed(
+            lambda: get_monthly_budget_data(year=2025, month=1), ['spendingfact_expense_month_idx']
+        )
+
+    def test_summary_for_category_and_dates(self):
+        filters = {'category': self.groceries.id, 'date_from': '2025-01-01', 'date_to': '2025-01-31'}
+        # Totals, per category, per bank account, related accounts
+        self.assertIndexesUsed(lambda: get_transaction_summary(filters), ['spendingfact_category_idx'] * 4)
+
+    def test_summary_with_search(self):
+        filters = {'search': 'rema', 'date_from': '2025-01-01', 'date_to': '2025-01-31'}
+        # The full-text matches are looked up by rowid
+        self.assertIndexesUsed(lambda: get_transaction_summary(filters), [self.PRIMARY_KEY] * 4)
+
+    def test_processable_transactions_by_date(self):
+        filters = {'should_process': True, 'date_from': '2025-01-01', 'date_to': '2025-01-31'}
+        date_index = next(index.name for index in Transaction._meta.indexes if index.fields == ['date'])
+        self.assertIndexesUsed(lambda: list(get_all_transactions(filters)[:100]), [date_index])
+
+    def test_unmatched_transactions(self):
+        self.assertIndexesUsed(lambda: list(
+            Transaction.objects.needs_supplier().order_by('-date').values('id', 'description')[:100]
+        ), ['transaction_supplier_date_idx'])
@@ -10,7 +10,8 @@ from .api.views import (
     BankAccountViewSet,
     import_from_tripletex,
     analyze_transfers,
-    clear_cache
+    clear_cache,
+    perf_stats
 )
 from .views import categorize_transaction
 
@@ -35,4 +36,7 @@ urlpatterns = [
     
     # Cache management
     path('clear-cache/', clear_cache, name='clear-cache'),
+    
+    # Request performance metrics
+    path('_perf/', perf_stats, name='perf-stats'),
 ] 
\ No newline at end of file
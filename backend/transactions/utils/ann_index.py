@@ -0,0 +1,391 @@
+"""
+Persistent approximate nearest-neighbour index over reference embeddings.
+
+An inverted-file (IVF) index: spherical k-means splits the reference
+vectors into lists around unit centroids, and a query only scores the rows
+of the nprobe lists whose centroids are closest to it. With the default
+settings that is a few percent of the rows instead of all of them.
+
+    <directory>/meta.json         dimension, list count and row counts
+    <directory>/centroids.npy     (lists, dimension) float32 unit centroids
+    <directory>/main.f32          float32 rows grouped by list
+    <directory>/main_offsets.npy  first row of every list in main.f32, plus the end
+    <directory>/main_ids.npy      id of every row, e.g. a transaction id
+    <directory>/main_labels.npy   label of every row, e.g. a supplier id
+    <directory>/tail.f32          rows inserted since the last compaction
+    <directory>/tail_lists.npy    list of every tail row, and tail_ids.npy,
+                                  tail_labels.npy as for main
+
+Rows are memory-mapped at load, so opening an index reads only its small
+arrays and a search reads only the lists it probes. They are kept as
+float32, twice the size of the embedding store, because converting float16
+rows cost more than scoring them. Inserts are appended to
+the tail and searched along with the main rows of the same list. Once the
+tail grows past COMPACT_FRACTION of the main rows it is merged into main,
+and the centroids are retrained when the index has grown RETRAIN_GROWTH
+times since they were trained.
+
+Like the embedding store, the index assumes one writer at a time. See the
+benchmark_ann_index command for recall and latency at different settings.
+"""
+import json
+import logging
+import math
+import os
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:  # pragma: no cover - numpy is optional
+    HAS_NUMPY = False
+
+logger = logging.getLogger('transactions')
+
+# Lists per sqrt(rows) and lists probed per query, chosen with
+# benchmark_ann_index: recall@3 of 1.0 at 100k and 400k rows, 3-4x faster
+# than brute force (benchmarks/ann_index.json)
+LISTS_PER_SQRT_ROWS = 2
+DEFAULT_NPROBE = 32
+
+KMEANS_ITERATIONS = 10
+TRAIN_ROWS_PER_LIST = 64
+COMPACT_FRACTION = 0.1
+RETRAIN_GROWTH = 4
+
+# Candidates kept per requested result while removing duplicate labels
+DISTINCT_CANDIDATES = 32
+ASSIGN_CHUNK_ROWS = 16384
+
+
+def default_list_count(rows):
+    return max(1, min(rows, int(LISTS_PER_SQRT_ROWS * math.sqrt(rows))))
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _nearest_lists(vectors, centroids):
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        lists[start:start + len(chunk)] = (chunk @ centroids.T).argmax(axis=1)
+    return lists
+
+
+def train_centroids(vectors, list_count, seed=0, iterations=KMEANS_ITERATIONS):
+    """
+    Spherical k-means on a sample of the vectors.
+
+    Args:
+        vectors (np.ndarray): (rows, dimension) unit vectors
+        list_count (int): Number of centroids
+        seed (int): Seed for sampling and initialisation
+        iterations (int): Assignment/update rounds
+
+    Returns:
+        np.ndarray: (list_count, dimension) float32 unit centroids
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), list_count * TRAIN_ROWS_PER_LIST)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), list_count, replace=False)].copy()
+
+    for _ in range(iterations):
+        lists = _nearest_lists(sample, centroids)
+        order = np.argsort(lists, kind='stable')
+        counts = np.bincount(lists, minlength=list_count)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+        # Restart empty lists from random rows
+        empty = np.flatnonzero(counts == 0)
+        centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def top_k_distinct(scores, labels, ids, k):
+    """
+    Pick the k best rows with different labels.
+
+    Args:
+        scores (np.ndarray): Score of every candidate row
+        labels (np.ndarray): Label of every candidate row
+        ids (np.ndarray): Id of every candidate row
+        k (int): Number of results
+
+    Returns:
+        tuple: (scores, labels, ids) of at most k rows, best first
+    """
+    keep = min(len(scores), k * DISTINCT_CANDIDATES)
+    while True:
+        if keep < len(scores):
+            top = np.argpartition(-scores, keep - 1)[:keep]
+        else:
+            top = np.arange(len(scores))
+        order = top[np.argsort(-scores[top], kind='stable')]
+        _, first = np.unique(labels[order], return_index=True)
+        chosen = order[np.sort(first)[:k]]
+        if len(chosen) == k or keep >= len(scores):
+            return scores[chosen], labels[chosen], ids[chosen]
+        keep = len(scores)
+
+
+class IVFIndex:
+    """
+    IVF index stored in one directory, see the module docstring.
+    """
+
+    def __init__(self, directory):
+        if not HAS_NUMPY:
+            raise ImportError("The ANN index requires numpy")
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        meta_path = self._path('meta.json')
+        if not os.path.exists(meta_path):
+            self.dimension = None
+            self.main_count = self.tail_count = self.trained_count = 0
+            self.centroids = None
+            return
+
+        with open(meta_path) as file:
+            meta = json.load(file)
+        self.dimension = meta['dimension']
+        self.main_count = meta['main_count']
+        self.tail_count = meta['tail_count']
+        self.trained_count = meta['trained_count']
+
+        self.centroids = np.load(self._path('centroids.npy'))
+        self.main_offsets = np.load(self._path('main_offsets.npy'))
+        self.main_ids = np.load(self._path('main_ids.npy'), mmap_mode='r')
+        self.main_labels = np.load(self._path('main_labels.npy'), mmap_mode='r')
+        self.main_vectors = self._memmap('main.f32', self.main_count)
+
+        self.tail_lists = np.load(self._path('tail_lists.npy'))
+        self.tail_ids = np.load(self._path('tail_ids.npy'))
+        self.tail_labels = np.load(self._path('tail_labels.npy'))
+        self.tail_vectors = self._memmap('tail.f32', self.tail_count)
+        # Tail rows of each list, found with one searchsorted per probe
+        self.tail_order = np.argsort(self.tail_lists, kind='stable')
+        self.tail_offsets = np.searchsorted(
+            self.tail_lists[self.tail_order], np.arange(len(self.centroids) + 1)
+        )
+
+    def _memmap(self, name, rows):
+        if not rows:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        return np.memmap(self._path(name), dtype=np.float32, mode='r', shape=(rows, self.dimension))
+
+    def __len__(self):
+        return self.main_count + self.tail_count
+
+    @property
+    def list_count(self):
+        return 0 if self.centroids is None else len(self.centroids)
+
+    @property
+    def ids(self):
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.main_ids, self.tail_ids])
+
+    @property
+    def labels(self):
+        if not len(self):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.main_labels, self.tail_labels])
+
+    def build(self, vectors, labels, ids, lists=None, seed=0):
+        """
+        Replace the index with the given rows.
+
+        Args:
+            vectors (np.ndarray): (rows, dimension) embeddings
+            labels (sequence): Label of every row
+            ids (sequence): Id of every row
+            lists (int): Number of lists, default LISTS_PER_SQRT_ROWS * sqrt(rows)
+            seed (int): Seed for training the centroids
+        """
+        vectors = _normalize(vectors)
+        if not len(vectors):
+            raise ValueError("Cannot build an index without rows")
+        centroids = train_centroids(vectors, lists or default_list_count(len(vectors)), seed=seed)
+        self._write_main(centroids, vectors, _nearest_lists(vectors, centroids), labels, ids, len(vectors))
+        logger.info(f"Built ANN index with {len(vectors)} rows in {len(centroids)} lists")
+
+    def add(self, vectors, labels, ids):
+        """
+        Insert rows, building the index if it is empty.
+
+        Args:
+            vectors (np.ndarray): (rows, dimension) embeddings
+            labels (sequence): Label of every row
+            ids (sequence): Id of every row
+        """
+        vectors = _normalize(vectors)
+        if not len(vectors):
+            return
+        if not len(self):
+            self.build(vectors, labels, ids)
+            return
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got {vectors.shape[1]}")
+
+        lists = _nearest_lists(vectors, self.centroids)
+        tail_lists = np.concatenate([self.tail_lists, lists])
+        tail_labels = np.concatenate([self.tail_labels, np.asarray(labels, dtype=np.int64)])
+        tail_ids = np.concatenate([self.tail_ids, np.asarray(ids, dtype=np.int64)])
+        count = self.tail_count
+        self.tail_vectors = None
+
+        tail_path = self._path('tail.f32')
+        with open(tail_path, 'r+b' if os.path.exists(tail_path) else 'wb') as file:
+            file.seek(count * self.dimension * 4)
+            file.write(vectors.tobytes())
+            file.truncate()
+        self._write_tail(tail_lists, tail_labels, tail_ids)
+        self._write_meta(self.main_count, len(tail_ids), self.trained_count)
+        self._load()
+
+        if len(self) >= RETRAIN_GROWTH * self.trained_count:
+            self.rebuild()
+        elif self.tail_count > COMPACT_FRACTION * self.main_count:
+            self.compact()
+
+    def compact(self):
+        """
+        Merge the tail into the main rows, keeping the centroids.
+        """
+        if not self.tail_count:
+            return
+        main_lists = np.repeat(np.arange(self.list_count, dtype=np.int32), np.diff(self.main_offsets))
+        self._write_main(
+            self.centroids,
+            np.concatenate([self.main_vectors, self.tail_vectors]),
+            np.concatenate([main_lists, self.tail_lists]),
+            self.labels,
+            self.ids,
+            self.trained_count,
+        )
+
+    def rebuild(self, lists=None, seed=0):
+        """
+        Retrain the centroids on all rows and rebuild the index.
+        """
+        self.build(np.concatenate([self.main_vectors, self.tail_vectors]), self.labels, self.ids, lists, seed)
+
+    def _write_main(self, centroids, vectors, lists, labels, ids, trained_count):
+        order = np.argsort(lists, kind='stable')
+        offsets = np.searchsorted(lists[order], np.arange(len(centroids) + 1))
+        rows = np.asarray(vectors[order], dtype=np.float32)
+        labels = np.asarray(labels, dtype=np.int64)[order]
+        ids = np.asarray(ids, dtype=np.int64)[order]
+
+        # Drop the memory maps before the files under them change
+        self.main_vectors = self.main_ids = self.main_labels = self.tail_vectors = None
+        temporary = self._path('main.f32.tmp')
+        with open(temporary, 'wb') as file:
+            file.write(rows.tobytes())
+        os.replace(temporary, self._path('main.f32'))
+        self._write('centroids.npy', centroids.astype(np.float32))
+        self._write('main_offsets.npy', offsets)
+        self._write('main_labels.npy', labels)
+        self._write('main_ids.npy', ids)
+        self._write_tail(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        self.centroids = centroids
+        self.dimension = rows.shape[1]
+        self._write_meta(len(rows), 0, trained_count)
+        self._load()
+
+    def _write_tail(self, lists, labels, ids):
+        self._write('tail_lists.npy', lists.astype(np.int32))
+        self._write('tail_labels.npy', labels)
+        self._write('tail_ids.npy', ids)
+
+    def _write(self, name, array):
+        temporary = self._path(f'{name}.tmp')
+        with open(temporary, 'wb') as file:
+            np.save(file, array)
+        os.replace(temporary, self._path(name))
+
+    def _write_meta(self, main_count, tail_count, trained_count):
+        temporary = self._path('meta.json.tmp')
+        with open(temporary, 'w') as file:
+            json.dump({
+                'dimension': self.dimension,
+                'lists': self.list_count,
+                'main_count': main_count,
+                'tail_count': tail_count,
+                'trained_count': trained_count,
+            }, file)
+        os.replace(temporary, self._path('meta.json'))
+
+    def _list_rows(self, list_id):
+        start, end = self.main_offsets[list_id], self.main_offsets[list_id + 1]
+        tail = self.tail_order[self.tail_offsets[list_id]:self.tail_offsets[list_id + 1]]
+        if not len(tail):
+            return self.main_vectors[start:end], self.main_labels[start:end], self.main_ids[start:end]
+        return (
+            np.concatenate([self.main_vectors[start:end], self.tail_vectors[tail]]),
+            np.concatenate([self.main_labels[start:end], self.tail_labels[tail]]),
+            np.concatenate([self.main_ids[start:end], self.tail_ids[tail]]),
+        )
+
+    def search(self, queries, k, nprobe=DEFAULT_NPROBE):
+        """
+        Find the best rows with distinct labels for every query.
+
+        Each probed list is read and converted once per call and scored
+        against all queries that probe it in one matrix multiply.
+
+        Args:
+            queries (np.ndarray): (n, dimension) embeddings
+            k (int): Results per query
+            nprobe (int): Lists to search per query
+
+        Returns:
+            tuple: (scores, labels, ids), each (n, k) and best first. Queries
+                with fewer than k labels in their lists are padded with
+                -inf scores and -1 labels and ids.
+        """
+        queries = _normalize(queries)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        labels = np.full((len(queries), k), -1, dtype=np.int64)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        if not len(self) or not len(queries):
+            return scores, labels, ids
+
+        nprobe = min(nprobe, self.list_count)
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        # Queries grouped by the lists they probe
+        probe_lists = probes.ravel()
+        order = np.argsort(probe_lists, kind='stable')
+        probing = np.repeat(np.arange(len(queries)), nprobe)[order]
+        list_ids_probed, starts = np.unique(probe_lists[order], return_index=True)
+
+        candidates = [[] for _ in range(len(queries))]
+        for list_id, members in zip(list_ids_probed, np.split(probing, starts[1:])):
+            vectors, list_labels, list_ids = self._list_rows(list_id)
+            if not len(list_ids):
+                continue
+            similarity = queries[members] @ vectors.T
+            for row, query in enumerate(members):
+                candidates[query].append((similarity[row], list_labels, list_ids))
+
+        for query, parts in enumerate(candidates):
+            if not parts:
+                continue
+            found = top_k_distinct(*(np.concatenate(column) for column in zip(*parts)), k)
+            count = len(found[0])
+            scores[query, :count], labels[query, :count], ids[query, :count] = found
+        return scores, labels, ids
@@ -0,0 +1,267 @@
+"""
+Utility functions for versioned response caching.
+
+Each model has a generation counter stored in the cache. Cached API responses
+embed the generations of the models they read from in their cache keys, so a
+write only has to bump one counter to make every dependent response miss.
+Old entries are never looked up again and simply age out of the cache.
+"""
+import contextvars
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import models, transaction
+
+logger = logging.getLogger('transactions')
+
+GENERATION_KEY_PREFIX = 'generation'
+WRITE_TIME_KEY_PREFIX = 'generation-written'
+# Write times are kept this long, and at most this many are looked up at once
+WRITE_TIME_TIMEOUT = 60 * 60
+MAX_WRITE_TIMES = 1000
+
+# Generations already read by the current request, see request_generations()
+_request_generations = contextvars.ContextVar('transactions_request_generations', default=None)
+
+
+def _model_label(model):
+    """
+    Return the lower-case label used to identify a model's generation.
+
+    Args:
+        model (Model class or str): A model class or an 'app_label.model_name' string
+
+    Returns:
+        str: The model label, e.g. 'transactions.transaction'
+    """
+    if isinstance(model, str):
+        return model.lower()
+    return model._meta.label_lower
+
+
+def _generation_key(label):
+    return f'{GENERATION_KEY_PREFIX}:{label}'
+
+
+def _generation_cache():
+    # Counters must be coherent across processes, so bypass any in-process
+    # tier and read them from the shared backend.
+    return getattr(cache, 'shared_cache', cache)
+
+
+def _initial_generation():
+    # Seed counters from the clock so a counter that was evicted and recreated
+    # can never collide with a generation embedded in an older cache key.
+    return int(time.time() * 1000)
+
+
+@contextmanager
+def request_generations():
+    """
+    Read each generation at most once inside the block.
+
+    Counters live in the shared cache tier, which is a disk or network
+    round trip. A request that computes an ETag and then a cache key would
+    read them twice; inside this block (one request, see
+    RequestGenerationsMiddleware) the second read is served from memory.
+    Bumps committed inside the block drop the remembered values.
+    """
+    token = _request_generations.set({})
+    try:
+        yield
+    finally:
+        _request_generations.reset(token)
+
+
+def get_generations(*models):
+    """
+    Get the current generation counters for the given models.
+
+    Missing counters are initialized, so the returned value is stable until
+    the model is written to.
+
+    Args:
+        *models: Model classes or labels
+
+    Returns:
+        dict: Mapping of model label to generation number
+    """
+    labels = [_model_label(model) for model in models]
+    remembered = _request_generations.get()
+    if remembered is not None and all(label in remembered for label in labels):
+        return {label: remembered[label] for label in labels}
+
+    counters = _generation_cache()
+    keys = {_generation_key(label): label for label in labels}
+    found = counters.get_many(list(keys))
+
+    generations = {}
+    for key, label in keys.items():
+        if key in found:
+            generations[label] = found[key]
+            continue
+        counters.add(key, _initial_generation(), timeout=None)
+        generations[label] = counters.get(key)
+    if remembered is not None:
+        remembered.update(generations)
+    return generations
+
+
+def bump_generation(*models, using=None):
+    """
+    Increment the generation counters for the given models once the
+    current transaction commits.
+
+    Every cached response that embeds one of these generations becomes
+    unreachable, which invalidates it in O(1) regardless of how many
+    pages or filter combinations were cached. Bumping before the commit
+    would let a concurrent reader cache the old rows under the new
+    generation, so inside a transaction the bump waits for the commit (and
+    is dropped on rollback). Outside one it happens immediately.
+
+    Each new generation also records when the write happened (see
+    get_write_times()), which can be long before a slow transaction
+    commits.
+
+    Args:
+        *models: Model classes or labels
+        using (str, optional): Database alias whose transaction to wait for
+    """
+    labels = [_model_label(model) for model in models]
+    written_at = time.time()
+    transaction.on_commit(lambda: _increment_generations(labels, written_at), using=using)
+
+
+def _increment_generations(labels, written_at):
+    counters = _generation_cache()
+    remembered = _request_generations.get()
+    for label in labels:
+        if remembered is not None:
+            remembered.pop(label, None)
+        key = _generation_key(label)
+        try:
+            try:
+                generation = counters.incr(key)
+            except ValueError:
+                # Counter not initialized yet (or evicted); start a fresh one
+                generation = _initial_generation()
+                if not counters.add(key, generation, timeout=None):
+                    generation = counters.incr(key)
+            counters.set(_write_time_key(label, generation), written_at, timeout=WRITE_TIME_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error bumping cache generation for {key}: {str(e)}")
+
+
+def _write_time_key(label, generation):
+    return f'{WRITE_TIME_KEY_PREFIX}:{label}:{generation}'
+
+
+def get_write_times(model, since_generation, generation):
+    """
+    Get when the writes behind a range of generations happened.
+
+    Args:
+        model: Model class or label
+        since_generation (int): Generation a reader last saw
+        generation (int): Current generation
+
+    Returns:
+        list: Write times (epoch seconds) of generations since_generation + 1
+            to generation, or None if they are not all known (too many
+            bumps, or a counter that was evicted and reseeded)
+    """
+    if not 0 <= generation - since_generation <= MAX_WRITE_TIMES:
+        return None
+    label = _model_label(model)
+    keys = [_write_time_key(label, value) for value in range(since_generation + 1, generation + 1)]
+    found = _generation_cache().get_many(keys)
+    if len(found) != len(keys):
+        return None
+    return list(found.values())
+
+
+def clear_cached_responses(*models):
+    """
+    Delete every cached response while keeping the generations of the given models.
+    
+    Unlike cache.clear(), readers that track generations (such as the
+    transaction snapshot) do not see the models as changed afterwards.
+    
+    Args:
+        *models: Model classes or labels whose generations are kept
+    """
+    counters = _generation_cache()
+    keys = [_generation_key(_model_label(model)) for model in models]
+    generations = counters.get_many(keys)
+    cache.clear()
+    counters.set_many(generations, timeout=None)
+
+
+def versioned_cache_key(namespace, models, params=None):
+    """
+    Build a cache key that embeds the generations of the given models.
+
+    Args:
+        namespace (str): Prefix identifying the cached view, e.g. 'transactions:list'
+        models (iterable): Model classes or labels the cached data depends on
+        params (QueryDict or dict, optional): Request parameters that shape the response
+
+    Returns:
+        str: A cache key that changes whenever one of the models is written
+    """
+    generations = get_generations(*models)
+    version = '.'.join(str(generations[label]) for label in sorted(generations))
+
+    if params:
+        if hasattr(params, 'lists'):
+            items = sorted((key, tuple(values)) for key, values in params.lists())
+        else:
+            items = sorted(params.items())
+        digest = hashlib.md5(repr(items).encode('utf-8')).hexdigest()
+    else:
+        digest = 'all'
+
+    return f'{namespace}:{version}:{digest}'
+
+
+class GenerationTrackingQuerySet(models.QuerySet):
+    """
+    QuerySet that bumps the model's cache generation on bulk writes.
+
+    post_save and post_delete signals cover single-object writes, but
+    QuerySet.update(), bulk_update() and bulk_create() bypass them.
+    """
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        bump_generation(self.model, using=self.db)
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        bump_generation(self.model, using=self.db)
+        return created
+
+
+def versioned_etag(namespace, models, params=None):
+    """
+    Build a strong ETag from the generations of the given models.
+
+    The ETag changes exactly when the versioned cache key does, so it can be
+    computed and compared without touching the database.
+
+    Args:
+        namespace (str): Identifies the resource, e.g. the request path
+        models (iterable): Model classes or labels the response depends on
+        params (QueryDict or dict, optional): Request parameters that shape the response
+
+    Returns:
+        str: A quoted ETag value
+    """
+    key = versioned_cache_key(namespace, models, params)
+    return '"%s"' % hashlib.md5(key.encode('utf-8')).hexdigest()
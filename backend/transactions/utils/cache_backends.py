@@ -0,0 +1,191 @@
+"""
+Cache backends for the finance visualizer.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+from .perf import record_cache_access
+
+DEFAULT_LOCAL_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_LOCAL_TIMEOUT = 300
+
+
+class TieredCache(BaseCache):
+    """
+    Two-tier cache: a bounded in-process LRU in front of a shared backend.
+
+    Reads are served from the local tier when possible and fall through to
+    the shared backend, populating the local tier on the way back. Writes go
+    to both tiers. The local tier is bounded in bytes (measured as the size
+    of the pickled value) and evicts least recently used entries.
+
+    Local entries live at most LOCAL_TIMEOUT seconds, which bounds how stale
+    a value written by another process can be. Values that must be coherent
+    across processes (such as cache generation counters) should be read
+    from `shared_cache` directly.
+
+    Options:
+        SHARED_ALIAS (str): Alias of the shared backend in settings.CACHES
+        LOCAL_MAX_BYTES (int): Size limit of the in-process tier
+        LOCAL_TIMEOUT (int): Maximum lifetime of local entries in seconds
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED_ALIAS', 'shared')
+        self._local_max_bytes = int(options.get('LOCAL_MAX_BYTES', DEFAULT_LOCAL_MAX_BYTES))
+        self._local_timeout = int(options.get('LOCAL_TIMEOUT', DEFAULT_LOCAL_TIMEOUT))
+        self._local = OrderedDict()
+        self._local_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'local_hits': 0,
+            'local_misses': 0,
+            'shared_hits': 0,
+            'shared_misses': 0,
+            'local_evictions': 0,
+        }
+
+    @property
+    def shared_cache(self):
+        return caches[self._shared_alias]
+
+    # Local tier helpers
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            pickled, expiry = entry
+            if expiry is not None and expiry <= time.time():
+                self._local_delete(key)
+                return None
+            self._local.move_to_end(key)
+            return pickled
+
+    def _local_set(self, key, value, timeout):
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        size = len(pickled)
+        if size > self._local_max_bytes:
+            with self._lock:
+                self._local_delete(key)
+            return
+
+        expiry = time.time() + self._local_timeout
+        backend_expiry = self.get_backend_timeout(timeout)
+        if backend_expiry is not None:
+            expiry = min(expiry, backend_expiry)
+
+        with self._lock:
+            self._local_delete(key)
+            self._local[key] = (pickled, expiry)
+            self._local_bytes += size
+            while self._local_bytes > self._local_max_bytes and self._local:
+                _, (evicted, _) = self._local.popitem(last=False)
+                self._local_bytes -= len(evicted)
+                self._stats['local_evictions'] += 1
+
+    def _local_delete(self, key):
+        # Caller must hold the lock
+        entry = self._local.pop(key, None)
+        if entry is not None:
+            self._local_bytes -= len(entry[0])
+            return True
+        return False
+
+    def _record(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        pickled = self._local_get(local_key)
+        if pickled is not None:
+            self._record('local_hits')
+            record_cache_access(hit=True)
+            return pickle.loads(pickled)
+        self._record('local_misses')
+
+        sentinel = object()
+        value = self.shared_cache.get(key, sentinel, version=version)
+        if value is sentinel:
+            self._record('shared_misses')
+            record_cache_access(hit=False)
+            return default
+        self._record('shared_hits')
+        record_cache_access(hit=True)
+        self._local_set(local_key, value, self._local_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        self.shared_cache.set(key, value, timeout=timeout, version=version)
+        if timeout is not None and timeout <= 0:
+            with self._lock:
+                self._local_delete(local_key)
+            return
+        self._local_set(local_key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        added = self.shared_cache.add(key, value, timeout=timeout, version=version)
+        if added:
+            self._local_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+        return self.shared_cache.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            self._local_delete(local_key)
+        return self.shared_cache.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        if self._local_get(local_key) is not None:
+            return True
+        return self.shared_cache.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Counters are owned by the shared tier; drop any local copy
+        local_key = self.make_and_validate_key(key, version=version)
+        with self._lock:
+            self._local_delete(local_key)
+        return self.shared_cache.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+            self._local_bytes = 0
+        self.shared_cache.clear()
+
+    def close(self, **kwargs):
+        self.shared_cache.close(**kwargs)
+
+    def stats(self):
+        """
+        Get hit/miss counters for both tiers and the local tier's size.
+
+        Returns:
+            dict: Per-tier hit metrics
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_entries'] = len(self._local)
+            stats['local_bytes'] = self._local_bytes
+        stats['local_max_bytes'] = self._local_max_bytes
+        stats['shared_backend'] = type(self.shared_cache).__name__
+        return stats
@@ -0,0 +1,199 @@
+"""
+Persistent store of sentence embeddings for supplier matching.
+
+Encoding descriptions is the dominant cost of the embedding matchers, and
+the same descriptions are encoded again on every run. The store keeps each
+embedding once per model, keyed by a 64-bit hash of the normalized
+description:
+
+    <directory>/<model>/vectors.f16   float16 rows, appended in place
+    <directory>/<model>/keys.npy      sorted description hashes
+    <directory>/<model>/rows.npy      row of each hash in vectors.f16
+    <directory>/<model>/meta.json     model name, dimension and row count
+
+Lookups memory-map the files, so a run only reads the rows it needs and
+encodes only descriptions it has not seen before. Vectors are stored
+L2-normalized, which makes a dot product their cosine similarity.
+
+The store assumes one writer at a time, like the matching commands that use
+it. A crash between appending vectors and writing the index leaves unused
+rows behind, which the next write overwrites.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+
+from .paths import get_cache_directory
+from .text import normalize_description
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:  # pragma: no cover - numpy is optional
+    HAS_NUMPY = False
+
+logger = logging.getLogger('transactions')
+
+ENCODE_BATCH_SIZE = 256
+
+
+def description_key(text):
+    """
+    Hash a description the way the store keys it.
+
+    Args:
+        text (str): Raw description
+
+    Returns:
+        int: Unsigned 64-bit hash of the normalized description
+    """
+    digest = hashlib.blake2b(normalize_description(text).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def get_embedding_directory():
+    return os.path.join(get_cache_directory(), 'embeddings')
+
+
+class EmbeddingStore:
+    """
+    Embeddings of one model, see the module docstring for the file layout.
+    """
+
+    def __init__(self, model_name, directory=None):
+        if not HAS_NUMPY:
+            raise ImportError("The embedding store requires numpy")
+        self.model_name = model_name
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '-', model_name).strip('-')
+        self.directory = os.path.join(directory or get_embedding_directory(), slug)
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        meta_path = self._path('meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as file:
+                meta = json.load(file)
+            self.dimension = meta['dimension']
+            self.count = meta['count']
+            self.keys = np.load(self._path('keys.npy'), mmap_mode='r')
+            self.rows = np.load(self._path('rows.npy'), mmap_mode='r')
+        else:
+            self.dimension = None
+            self.count = 0
+            self.keys = np.empty(0, dtype=np.uint64)
+            self.rows = np.empty(0, dtype=np.int64)
+
+        if self.count:
+            self.vectors = np.memmap(
+                self._path('vectors.f16'), dtype=np.float16, mode='r', shape=(self.count, self.dimension)
+            )
+        else:
+            self.vectors = np.empty((0, self.dimension or 0), dtype=np.float16)
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, keys):
+        """
+        Find the rows of the given description hashes.
+
+        Args:
+            keys (np.ndarray): uint64 hashes from description_key()
+
+        Returns:
+            np.ndarray: Row of each key in self.vectors, or -1 when missing
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(self.keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, self.rows[positions], -1)
+
+    def add(self, keys, vectors):
+        """
+        Append embeddings for hashes that are not stored yet.
+
+        Args:
+            keys (np.ndarray): Distinct uint64 hashes missing from the store
+            vectors (np.ndarray): One embedding per key
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(keys):
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.where(norms == 0, 1, norms)).astype(np.float16)
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+        elif vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got {vectors.shape[1]}")
+
+        # Drop the memory maps before the files under them change
+        old_keys, old_rows = np.array(self.keys), np.array(self.rows)
+        self.vectors = self.keys = self.rows = None
+
+        vectors_path = self._path('vectors.f16')
+        mode = 'r+b' if os.path.exists(vectors_path) else 'wb'
+        with open(vectors_path, mode) as file:
+            file.seek(self.count * self.dimension * 2)
+            file.write(vectors.tobytes())
+            file.truncate()
+
+        keys = np.concatenate([old_keys, keys])
+        rows = np.concatenate([old_rows, np.arange(self.count, self.count + len(vectors), dtype=np.int64)])
+        order = np.argsort(keys, kind='stable')
+        self._write(self._path('keys.npy'), keys[order])
+        self._write(self._path('rows.npy'), rows[order])
+        self._write_meta(self.count + len(vectors))
+        self._load()
+
+    def _write(self, path, array):
+        temporary = f'{path}.tmp'
+        with open(temporary, 'wb') as file:
+            np.save(file, array)
+        os.replace(temporary, path)
+
+    def _write_meta(self, count):
+        temporary = self._path('meta.json.tmp')
+        with open(temporary, 'w') as file:
+            json.dump({'model': self.model_name, 'dimension': self.dimension, 'count': count}, file)
+        os.replace(temporary, self._path('meta.json'))
+
+    def embed(self, descriptions, encode, batch_size=ENCODE_BATCH_SIZE):
+        """
+        Get embeddings for descriptions, encoding only those not stored yet.
+
+        Descriptions that normalize to the same text share one embedding, and
+        the normalized text is what gets encoded.
+
+        Args:
+            descriptions (list): Raw descriptions
+            encode (callable): Maps a list of texts to an array of embeddings,
+                e.g. SentenceTransformer.encode
+            batch_size (int): Texts per encode() call
+
+        Returns:
+            np.ndarray: float32 (len(descriptions), dimension) unit vectors
+        """
+        keys = np.fromiter((description_key(text) for text in descriptions), dtype=np.uint64, count=len(descriptions))
+        unique_keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        rows = self.lookup(unique_keys)
+        missing = np.flatnonzero(rows < 0)
+        if len(missing):
+            texts = [normalize_description(descriptions[first_index[i]]) for i in missing]
+            encoded = np.concatenate([
+                np.asarray(encode(texts[start:start + batch_size]), dtype=np.float32)
+                for start in range(0, len(texts), batch_size)
+            ])
+            self.add(unique_keys[missing], encoded)
+            rows = self.lookup(unique_keys)
+            logger.info(f"Encoded {len(missing)} new descriptions, {len(unique_keys) - len(missing)} from the embedding store")
+
+        return np.asarray(self.vectors[rows[inverse]], dtype=np.float32)
@@ -0,0 +1,45 @@
+"""
+Paginators for large transaction tables.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from .cache import versioned_cache_key
+
+# Counts at or above this many rows are cached; smaller counts are cheap to redo
+COUNT_CACHE_THRESHOLD = 10000
+# Cached counts are versioned by the model's generation, the timeout only
+# bounds staleness after writes that bypass the ORM
+COUNT_CACHE_TIMEOUT = 60 * 10
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that caches large COUNT(*) results.
+
+    The cache key embeds the SQL of the filtered query and the generation of
+    the queried model, so a write to the model starts a fresh count. Counts
+    below COUNT_CACHE_THRESHOLD are always computed.
+    """
+
+    def _count_cache_key(self):
+        queryset = self.object_list
+        sql, params = queryset.query.sql_with_params()
+        digest = hashlib.md5(repr((sql, params)).encode('utf-8')).hexdigest()
+        return versioned_cache_key('admin:count', [queryset.model], {'query': digest})
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+
+        cache_key = self._count_cache_key()
+        count = cache.get(cache_key)
+        if count is None:
+            count = self.object_list.count()
+            if count >= COUNT_CACHE_THRESHOLD:
+                cache.set(cache_key, count, timeout=COUNT_CACHE_TIMEOUT)
+        return count
@@ -0,0 +1,269 @@
+"""
+Request-level performance metrics.
+
+PerformanceMiddleware (see transactions.middleware) creates a
+RequestMetrics for every request and makes it current for the request's
+context. Code that does measurable work reports into it:
+
+    record_cache_access(hit=True)        # cache backends
+    with span('serialize'):              # serializers and row builders
+        ...
+
+Queries are counted by instrument_connections(), which the middleware
+enters for the request thread. Worker threads that query on behalf of a
+request run in a copy of its context and enter it themselves.
+
+Finished requests are folded into per-endpoint histograms held in this
+process's memory; `/api/v1/_perf/` reads them.
+"""
+import contextvars
+import heapq
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+# Upper bounds of the latency histogram buckets in milliseconds
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+_current = contextvars.ContextVar('transactions_request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Counters and timings of one request.
+    """
+
+    def __init__(self, top_queries=5):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.spans = {}
+        self._span_depth = {}
+        self._top_queries_size = top_queries
+        # Min-heap of (milliseconds, sequence, sql) holding the slowest queries
+        self._top_queries = []
+        # Worker threads record queries concurrently with the request thread
+        self._query_lock = threading.Lock()
+
+    def record_query(self, sql, duration_ms):
+        with self._query_lock:
+            self.query_count += 1
+            self.sql_ms += duration_ms
+            entry = (duration_ms, self.query_count, sql)
+            if len(self._top_queries) < self._top_queries_size:
+                heapq.heappush(self._top_queries, entry)
+            elif self._top_queries and duration_ms > self._top_queries[0][0]:
+                heapq.heapreplace(self._top_queries, entry)
+
+    def top_queries(self):
+        """
+        Get the slowest queries of the request, slowest first.
+
+        Returns:
+            list: (milliseconds, sql) tuples
+        """
+        return [(duration, sql) for duration, _, sql in sorted(self._top_queries, reverse=True)]
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def current_metrics():
+    """
+    Get the metrics of the request being handled, or None outside a request.
+    """
+    return _current.get()
+
+
+def activate(metrics):
+    """
+    Make metrics current for this context.
+
+    Returns:
+        Token: Pass to deactivate() when the request is done
+    """
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def query_timer(metrics):
+    """
+    Get a connection.execute_wrapper that records each query into metrics.
+    """
+    def timer(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics.record_query(sql, (time.perf_counter() - started) * 1000)
+    return timer
+
+
+@contextmanager
+def instrument_connections(metrics):
+    """
+    Record the queries run on this thread's connections into metrics.
+
+    Connections are per thread, so this only covers queries of the thread
+    that enters it. Does nothing when metrics is None.
+    """
+    if metrics is None:
+        yield
+        return
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(query_timer(metrics)))
+        yield
+
+
+def record_cache_access(hit):
+    """
+    Count a cache read of the current request.
+
+    Args:
+        hit (bool): Whether the key was found
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+@contextmanager
+def span(name):
+    """
+    Add the duration of the block to the current request's named span.
+
+    Nested spans of the same name are counted once, so a serializer that
+    renders nested serializers is not timed twice.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+
+    depth = metrics._span_depth.get(name, 0)
+    metrics._span_depth[name] = depth + 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics._span_depth[name] = depth
+        if depth == 0:
+            duration = (time.perf_counter() - started) * 1000
+            metrics.spans[name] = metrics.spans.get(name, 0.0) + duration
+
+
+class EndpointStats:
+    """
+    Aggregated metrics of one endpoint.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS_MS)
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.spans = {}
+        self.status_codes = {}
+
+    def add(self, metrics, total_ms, status_code):
+        self.count += 1
+        self.total_ms += total_ms
+        self.max_ms = max(self.max_ms, total_ms)
+        for index, upper in enumerate(HISTOGRAM_BUCKETS_MS):
+            if total_ms <= upper:
+                self.buckets[index] += 1
+                break
+        self.queries += metrics.query_count
+        self.sql_ms += metrics.sql_ms
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+        for name, duration in metrics.spans.items():
+            self.spans[name] = self.spans.get(name, 0.0) + duration
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def percentile(self, fraction):
+        """
+        Estimate a latency percentile as the upper bound of its bucket.
+        """
+        threshold = fraction * self.count
+        seen = 0
+        for upper, count in zip(HISTOGRAM_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= threshold:
+                return self.max_ms if upper == float('inf') else min(upper, self.max_ms)
+        return self.max_ms
+
+    def as_dict(self):
+        count = self.count or 1
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / count, 2),
+            'p50_ms': round(self.percentile(0.5), 2),
+            'p95_ms': round(self.percentile(0.95), 2),
+            'p99_ms': round(self.percentile(0.99), 2),
+            'max_ms': round(self.max_ms, 2),
+            'histogram': {
+                ('inf' if upper == float('inf') else str(upper)): bucket
+                for upper, bucket in zip(HISTOGRAM_BUCKETS_MS, self.buckets)
+            },
+            'mean_queries': round(self.queries / count, 2),
+            'mean_sql_ms': round(self.sql_ms / count, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'mean_span_ms': {name: round(total / count, 2) for name, total in self.spans.items()},
+            'status_codes': {str(code): number for code, number in sorted(self.status_codes.items())},
+        }
+
+
+class PerformanceRegistry:
+    """
+    Thread-safe per-endpoint statistics of this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._since = time.time()
+
+    def record(self, endpoint, metrics, total_ms, status_code):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.add(metrics, total_ms, status_code)
+
+    def snapshot(self):
+        """
+        Get the statistics of every endpoint seen since the last reset.
+
+        Returns:
+            dict: 'since' (Unix time) and 'endpoints' (name -> statistics)
+        """
+        with self._lock:
+            endpoints = {name: stats.as_dict() for name, stats in sorted(self._endpoints.items())}
+            since = self._since
+        return {'since': since, 'endpoints': endpoints}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+            self._since = time.time()
+
+
+registry = PerformanceRegistry()
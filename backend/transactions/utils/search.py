@@ -0,0 +1,103 @@
+"""
+Full-text search over transactions.
+
+On SQLite, transactions are indexed in an FTS5 table (created by migration
+0016) covering the description, the grouped-posting descriptions in
+raw_data and the Tripletex id. Database triggers keep the index in sync.
+Other databases, or a database without the index, fall back to
+description__icontains.
+"""
+import logging
+import re
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger('transactions')
+
+TRANSACTION_FTS_TABLE = 'transactions_transaction_fts'
+
+# Column weights for bm25(): description, postings, tripletex_id
+FTS_RANK_WEIGHTS = (2.0, 1.0, 1.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# (alias, database name) -> whether the FTS table exists
+_fts_tables = {}
+
+
+def fts_available(using='default'):
+    """
+    Check whether the transaction full-text index exists on a database.
+
+    Args:
+        using (str): Database alias
+
+    Returns:
+        bool: True if FTS queries can be used
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+
+    key = (using, connection.settings_dict['NAME'])
+    if key not in _fts_tables:
+        with connection.cursor() as cursor:
+            _fts_tables[key] = TRANSACTION_FTS_TABLE in connection.introspection.table_names(cursor)
+    return _fts_tables[key]
+
+
+def build_fts_query(term):
+    """
+    Turn user input into an FTS5 query matching every word as a prefix.
+
+    Only word characters are kept, so user input can never inject FTS5
+    syntax. 'rema tron' becomes '"rema"* "tron"*'.
+
+    Args:
+        term (str): The search input
+
+    Returns:
+        str: An FTS5 MATCH expression, or '' if the input has no words
+    """
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(term or ''))
+
+
+def search_transactions(queryset, term, rank=False):
+    """
+    Filter a transaction queryset to the rows matching a search term.
+
+    Args:
+        queryset (QuerySet): A Transaction queryset
+        term (str): The search input
+        rank (bool): Order the results by bm25 relevance, best first. The
+            ranked queryset joins the index table and can't be used as a
+            subquery.
+
+    Returns:
+        QuerySet: The filtered (and optionally ranked) queryset
+    """
+    term = (term or '').strip()
+    if not term:
+        return queryset
+
+    match = build_fts_query(term)
+    if not match or not fts_available(queryset.db):
+        return queryset.filter(description__icontains=term)
+
+    if rank:
+        table = queryset.model._meta.db_table
+        weights = ', '.join(str(weight) for weight in FTS_RANK_WEIGHTS)
+        return queryset.extra(
+            select={'search_rank': f'bm25({TRANSACTION_FTS_TABLE}, {weights})'},
+            tables=[TRANSACTION_FTS_TABLE],
+            where=[
+                f'{TRANSACTION_FTS_TABLE}.rowid = {table}.id',
+                f'{TRANSACTION_FTS_TABLE} MATCH %s',
+            ],
+            params=[match],
+        ).order_by('search_rank', '-date')
+
+    return queryset.filter(
+        id__in=RawSQL(f'SELECT rowid FROM {TRANSACTION_FTS_TABLE} WHERE {TRANSACTION_FTS_TABLE} MATCH %s', (match,))
+    )
@@ -0,0 +1,24 @@
+"""
+Text normalization shared by the similarity index and the embedding store.
+"""
+import re
+
+
+def normalize_description(text):
+    """
+    Normalize a transaction description for matching.
+
+    Lowercases, drops digits (dates, card and reference numbers) and
+    punctuation, and collapses whitespace.
+
+    Args:
+        text (str): The raw description
+
+    Returns:
+        str: The normalized description
+    """
+    if not text:
+        return ""
+    text = text.lower()
+    text = re.sub(r'[\d\W_]+', ' ', text)
+    return text.strip()
@@ -0,0 +1,68 @@
+"""
+Timing helpers for the Server-Timing response header.
+
+Services record named durations into a plain dict supplied by the view,
+and the view turns it into a header that browser dev tools display:
+
+    timings = {}
+    with timed(timings, 'totals'):
+        ...
+    response['Server-Timing'] = server_timing_header(timings)
+"""
+import re
+import time
+from contextlib import contextmanager
+
+# Server-Timing metric names are HTTP tokens
+_INVALID_TOKEN_CHARS_RE = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+@contextmanager
+def timed(timings, name):
+    """
+    Record the duration of the block in milliseconds.
+
+    Args:
+        timings (dict): Name -> milliseconds, or None to skip timing
+        name (str): Metric name
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings[name] = (time.perf_counter() - started) * 1000
+
+
+def server_timing_entry(name, duration=None, description=None):
+    """
+    Format one Server-Timing metric.
+
+    Args:
+        name (str): Metric name
+        duration (float, optional): Milliseconds
+        description (str, optional): Free text shown next to the metric
+
+    Returns:
+        str: e.g. 'sql;dur=3.10;desc="4 queries"'
+    """
+    entry = _INVALID_TOKEN_CHARS_RE.sub('-', name)
+    if duration is not None:
+        entry += f";dur={duration:.2f}"
+    if description:
+        description = description.replace('\\', '').replace('"', "'")
+        entry += f';desc="{description}"'
+    return entry
+
+
+def server_timing_header(timings):
+    """
+    Format recorded durations as a Server-Timing header value.
+
+    Args:
+        timings (dict): Name -> milliseconds
+
+    Returns:
+        str: e.g. 'totals;dur=1.20, categories;dur=0.85'
+    """
+    return ', '.join(server_timing_entry(name, duration) for name, duration in timings.items())
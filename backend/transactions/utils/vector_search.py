@@ -0,0 +1,84 @@
+"""
+Vectorized nearest-neighbour search over supplier reference embeddings.
+
+The embedding matchers compare every unmatched transaction with every
+reference transaction of a known supplier. Scoring a whole batch is one
+matrix multiply, which numpy hands to BLAS, instead of one similarity call
+and one max() per transaction.
+
+Reference rows are grouped by supplier in contiguous runs, so the best score
+per supplier is a single np.maximum.reduceat() over the score matrix.
+"""
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:  # pragma: no cover - numpy is optional
+    HAS_NUMPY = False
+
+# Bounds the (queries x references) float32 score matrix to ~256 MB
+MAX_SCORE_MATRIX_CELLS = 64 * 1024 * 1024
+
+
+def group_starts(labels):
+    """
+    Find where each run of equal labels starts.
+
+    Args:
+        labels (sequence): Group label of each reference row, with the rows of
+            a group next to each other (e.g. ordered by supplier_id)
+
+    Returns:
+        tuple: (starts, group_labels) - index of the first row of every run
+            and the label of that run
+    """
+    labels = np.asarray(labels)
+    if not len(labels):
+        return np.empty(0, dtype=np.int64), labels
+    starts = np.flatnonzero(np.concatenate([[True], labels[1:] != labels[:-1]]))
+    return starts, labels[starts]
+
+
+def top_k_groups(queries, references, starts, k):
+    """
+    Score queries against all references and rank the best groups per query.
+
+    Both sides are expected to be L2-normalized, so scores are cosine
+    similarities.
+
+    Args:
+        queries (np.ndarray): (n, dimension) query vectors
+        references (np.ndarray): (m, dimension) reference vectors, grouped
+        starts (np.ndarray): First row of every group, from group_starts()
+        k (int): Number of groups to return per query
+
+    Returns:
+        tuple: (scores, groups, best_rows)
+            scores: (n, k) best score within each returned group, descending
+            groups: (n, k) group positions into starts
+            best_rows: (n,) best reference row of each query
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    references = np.ascontiguousarray(references, dtype=np.float32)
+    k = max(1, min(k, len(starts)))
+
+    scores = np.empty((len(queries), k), dtype=np.float32)
+    groups = np.empty((len(queries), k), dtype=np.int64)
+    best_rows = np.empty(len(queries), dtype=np.int64)
+
+    chunk = max(1, MAX_SCORE_MATRIX_CELLS // max(1, len(references)))
+    for begin in range(0, len(queries), chunk):
+        end = begin + chunk
+        similarity = queries[begin:end] @ references.T
+        best_rows[begin:end] = similarity.argmax(axis=1)
+
+        group_scores = np.maximum.reduceat(similarity, starts, axis=1)
+        if k < group_scores.shape[1]:
+            top = np.argpartition(-group_scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(k), (len(group_scores), k))
+        top_scores = np.take_along_axis(group_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        scores[begin:end] = np.take_along_axis(top_scores, order, axis=1)
+        groups[begin:end] = np.take_along_axis(top, order, axis=1)
+
+    return scores, groups, best_rows
@@ -0,0 +1,190 @@
+"""
+Streaming XLSX writer.
+
+An XLSX file is a zip archive of XML parts. The worksheet part is written
+row by row into a zip entry opened for writing on a non-seekable buffer,
+so zipfile emits each compressed block as soon as it is produced. Memory
+use is bounded by the compressor's window, not by the number of rows, and
+the first bytes are available before the last row has been read.
+
+Only what exports need is supported: a single sheet of text, number and
+date cells, with a bold header row.
+"""
+import re
+import zipfile
+from datetime import date
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+# Cell styles, as indexes into cellXfs in STYLES_XML
+STYLE_DEFAULT = 0
+STYLE_DATE = 1
+STYLE_AMOUNT = 2
+STYLE_HEADER = 3
+
+# Excel serial dates count days from 1899-12-30
+_EXCEL_EPOCH = date(1899, 12, 30).toordinal()
+
+# Characters that are not allowed in XML 1.0 documents
+_ILLEGAL_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Built-in number formats: 14 is the locale's short date, 4 is #,##0.00
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="4" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '</cellXfs>'
+    '</styleSheet>'
+)
+
+SHEET_HEADER_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews>'
+    '<sheetData>'
+)
+
+SHEET_FOOTER_XML = '</sheetData></worksheet>'
+
+
+class _ChunkBuffer:
+    """
+    Write-only, non-seekable file object that collects what zipfile writes.
+
+    Without tell() and seek(), zipfile streams entries with data
+    descriptors instead of rewriting their headers afterwards.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _cell(value, style=STYLE_DEFAULT):
+    """
+    Render one cell. None renders as an empty cell.
+    """
+    if value is None:
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, date):
+        return f'<c s="{STYLE_DATE}"><v>{value.toordinal() - _EXCEL_EPOCH}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        style_attribute = f' s="{style}"' if style else ''
+        return f'<c{style_attribute}><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML_RE.sub('', str(value)))
+    style_attribute = f' s="{style}"' if style else ''
+    return f'<c t="inlineStr"{style_attribute}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def stream_xlsx(headers, rows, styles=None, sheet_name='Sheet1', flush_rows=1000):
+    """
+    Generate an XLSX file as a stream of byte chunks.
+
+    Args:
+        headers (list): Column titles for the header row
+        rows (iterable): Row tuples; each value is a str, number, bool, date or None
+        styles (list, optional): Cell style per column for numeric values,
+            e.g. STYLE_AMOUNT. Dates are always date-formatted.
+        sheet_name (str): Worksheet name
+        flush_rows (int): Rows written between yielded chunks
+
+    Yields:
+        bytes: Consecutive parts of the file
+    """
+    styles = styles or [STYLE_DEFAULT] * len(headers)
+    buffer = _ChunkBuffer()
+    archive = zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED)
+
+    archive.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+    archive.writestr('_rels/.rels', ROOT_RELS_XML)
+    archive.writestr('xl/workbook.xml', WORKBOOK_XML.format(sheet_name=escape(sheet_name, {'"': '&quot;'})))
+    archive.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS_XML)
+    archive.writestr('xl/styles.xml', STYLES_XML)
+    # Send the fixed parts right away so the download starts before any row is read
+    yield buffer.drain()
+
+    with archive.open('xl/worksheets/sheet1.xml', mode='w') as sheet:
+        header_cells = ''.join(_cell(header, STYLE_HEADER) for header in headers)
+        sheet.write(f'{SHEET_HEADER_XML}<row>{header_cells}</row>'.encode('utf-8'))
+
+        pending = []
+        for row in rows:
+            pending.append('<row>' + ''.join(_cell(value, style) for value, style in zip(row, styles)) + '</row>')
+            if len(pending) >= flush_rows:
+                sheet.write(''.join(pending).encode('utf-8'))
+                pending = []
+                data = buffer.drain()
+                if data:
+                    yield data
+        sheet.write((''.join(pending) + SHEET_FOOTER_XML).encode('utf-8'))
+
+    archive.close()
+    yield buffer.drain()
@@ -2,13 +2,14 @@ from django.shortcuts import render
 import os
 import json
 from decimal import Decimal
-from django.db.models import Sum, Count
+from django.db.models import Sum, Count, Q
 from django.conf import settings
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from .models import BankStatement, Transaction, Category
 from .serializers import BankStatementSerializer, TransactionSerializer, CategorySerializer, TransactionSummarySerializer
+from .services.transaction_service import set_supplier_categories
 import datetime
 import decimal
 
@@ -266,21 +267,9 @@ def categorize_transaction(request, transaction_id):
             
             # If transaction has a supplier, update all related transactions
             if transaction.supplier:
-                try:
-                    # Try to use CategorySupplierMap if it exists
-                    from .models import CategorySupplierMap
-                    
-                    # Create or update the mapping
-                    try:
-                        mapping, created = CategorySupplierMap.objects.update_or_create(
-                            supplier=transaction.supplier,
-                            defaults={'category': category}
-                        )
-                    except Exception as e:
-                        print(f"Error creating/updating CategorySupplierMap: {e}")
-                except ImportError:
-                    # If CategorySupplierMap doesn't exist yet, just skip it
-                    pass
+                # Map the supplier to this category only; mappings are
+                # unique per (supplier, category), not per supplier
+                set_supplier_categories({transaction.supplier_id: category.id})
                 
                 # Update all transactions from the same supplier
                 # This works even without the CategorySupplierMap model
@@ -306,13 +295,7 @@ def categorize_transaction(request, transaction_id):
         
         # If transaction has a supplier, remove category from all related transactions
         if transaction.supplier:
-            try:
-                # Try to delete the CategorySupplierMap if it exists
-                from .models import CategorySupplierMap
-                CategorySupplierMap.objects.filter(supplier=transaction.supplier).delete()
-            except ImportError:
-                # If CategorySupplierMap doesn't exist yet, just skip it
-                pass
+            set_supplier_categories({transaction.supplier_id: None})
             
             # Remove category from all transactions with this supplier
             # This works even without the CategorySupplierMap model
@@ -357,7 +340,7 @@ def analyze_transfers(request):
     raw_data_analysis = []
     
     # Analyze current internal transfers
-    for transaction in internal_transfers[:100]:  # Limit to 100 for performance
+    for transaction in internal_transfers.only('id', 'description', 'amount', 'raw_data')[:100]:  # Limit to 100 for performance
         description = transaction.description.lower()
         
         # Count description patterns
@@ -404,11 +387,17 @@ def analyze_transfers(request):
         reverse=True
     )[:10]  # Top 10
     
+    # Count both in one query
+    counts = transactions.aggregate(
+        total=Count('id'),
+        internal=Count('id', filter=Q(is_internal_transfer=True))
+    )
+    
     # Return analysis
     return Response({
-        'total_transactions': transactions.count(),
-        'internal_transfers': internal_transfers.count(),
-        'internal_transfer_percentage': round((internal_transfers.count() / transactions.count()) * 100, 2),
+        'total_transactions': counts['total'],
+        'internal_transfers': counts['internal'],
+        'internal_transfer_percentage': round((counts['internal'] / counts['total']) * 100, 2) if counts['total'] else 0,
         'common_description_patterns': dict(sorted_description_patterns),
         'common_posting_patterns': dict(sorted_posting_patterns),
         'raw_data_samples': raw_data_analysis[:10]  # First 10 samples